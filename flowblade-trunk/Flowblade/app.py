@@ -48,6 +48,7 @@ import time
 
 import appconsts
 import audiomonitoring
+import autosave
 import audiowaveform
 import audiowaveformrenderer
 import clipeffectseditor
@@ -65,12 +66,14 @@ import editorstate
 import editorwindow
 import gmic
 import gui
+import headlessworkers
 import jobs
 import keyevents
 import keyframeeditor
 import keyframeeditcanvas
 import kftoolmode
 import medialog
+import memorycache
 import mltenv
 import mltfilters
 import mltplayer
@@ -179,6 +182,9 @@ def main(root_path):
         respaths.apply_dark_theme()
     if editorpersistance.prefs.display_all_audio_levels == False:
         editorstate.display_all_audio_levels = False
+    memorycache.set_budget(editorpersistance.prefs.memory_cache_size * 1000000)
+    editorstate.set_trim_clips_cache_limits(editorpersistance.prefs.trim_clips_cache_entries,
+                                            editorpersistance.prefs.trim_clips_cache_size * 1000000)
 
     editorpersistance.save()
 
@@ -278,6 +284,8 @@ def main(root_path):
     # Check for tools and init tools integration.
     gmic.test_availablity()
     toolsintegration.init()
+    jobs.start_session_messages_server()
+    headlessworkers.start_workers_server()
 
     # Create player object.
     create_player()
@@ -633,7 +641,7 @@ def open_project(new_project):
 
     audiomonitoring.close_audio_monitor()
     audiowaveformrenderer.clear_cache()
-    audiowaveform.frames_cache = {}
+    tlinewidgets.clip_thumbnails.clear()
 
     editorstate.project = new_project
     editorstate.media_view_filter = appconsts.SHOW_ALL_FILES
@@ -653,11 +661,12 @@ def open_project(new_project):
     # For save time message on close
     projectaction.save_time = None
     
-    # Delete autosave file after it has been loaded
+    # Replay edits journaled after autosave snapshot and delete autosave files after they have been loaded
     global loaded_autosave_file
     if loaded_autosave_file != None:
+        autosave.replay_journal(loaded_autosave_file)
         print("Deleting", loaded_autosave_file)
-        os.remove(loaded_autosave_file)
+        autosave.delete_autosave(loaded_autosave_file)
         loaded_autosave_file = None
 
     editorstate.update_current_proxy_paths()
@@ -693,6 +702,13 @@ def _do_window_resized_update():
     updater.window_resized()
     
 def change_current_sequence(index):
+    """
+    Returns False if sequence could not be opened.
+    """
+    # Sequences are built when first activated after project load.
+    if projectaction.build_sequence(editorstate.project.sequences[index]) == False:
+        return False
+
     edit.do_gui_update = False  # This should not be necessery but we are doing this signal intention that GUI updates are disabled
     
     stop_autosave()
@@ -722,6 +738,8 @@ def change_current_sequence(index):
 
     updater.set_timeline_height()
 
+    return True
+
 def display_current_sequence():
     # Get shorter alias.
     player = editorstate.player
@@ -749,7 +767,7 @@ def autosave_dialog_callback(dialog, response):
         projectaction.actually_load_project(autosave_file, True)
     else:
         tlinerender.init_session()  # didn't do this in main and not going to do app-open_project
-        os.remove(autosave_file)
+        autosave.delete_autosave(autosave_file)
         start_autosave()
 
 def autosaves_many_recovery_dialog():
@@ -803,25 +821,26 @@ def start_autosave():
         print("Autosave started...")
         autosave_timeout_id = GObject.timeout_add(autosave_delay_millis, do_autosave)
         autosave_file = userfolders.get_cache_dir() + get_instance_autosave_file()
-        persistance.save_project(editorstate.PROJECT(), autosave_file)
+        autosave.start(autosave_file)
     else:
         print("Autosave disabled...")
         stop_autosave()
 
 def get_autosave_files():
     autosave_dir = userfolders.get_cache_dir() + AUTOSAVE_DIR
-    return os.listdir(autosave_dir)
+    return [f for f in os.listdir(autosave_dir) if not autosave.is_journal_file(f)]
 
 def stop_autosave():
     global autosave_timeout_id
+    autosave.stop()
     if autosave_timeout_id == -1:
         return
     GObject.source_remove(autosave_timeout_id)
     autosave_timeout_id = -1
 
 def do_autosave():
-    autosave_file = userfolders.get_cache_dir() + get_instance_autosave_file()
-    persistance.save_project(editorstate.PROJECT(), autosave_file)
+    # Project is copied here and written in a thread, edits done between snapshots are in autosave journal.
+    autosave.take_snapshot()
     return True
 
 # ------------------------------------------------- splash screen
@@ -1060,7 +1079,8 @@ def _app_destroy():
         pass
     # Delete autosave file
     try:
-        os.remove(userfolders.get_cache_dir() + get_instance_autosave_file())
+        autosave.wait_for_writes()
+        autosave.delete_autosave(userfolders.get_cache_dir() + get_instance_autosave_file())
     except:
         print("Delete autosave file FAILED!")
 
@@ -150,8 +150,10 @@ AUTOSAVE_DIR = "autosave/"
 AUDIO_LEVELS_DIR = "audiolevels/"
 PROXIES_DIR = "proxies/"
 THUMBNAILS_DIR = "thumbnails"
+MEDIA_METADATA_DIR = "media_metadata"
 RENDERED_CLIPS_DIR = "rendered_clips"
 TLINE_RENDERS_DIR = "tlinerenders"
+TLINE_RENDERS_CACHE_DIR = "tlinerenders_cache"
 GMIC_DIR = "gmic"
 PHANTOM_DIR = "phantom2d"
 PHANTOM_DISK_CACHE_DIR = "disk_cache"
@@ -0,0 +1,272 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module computes per-frame audio levels for media files and handles audio levels files.
+
+Decoded audio is read from an ffmpeg process in large sequential blocks and
+levels are computed with numpy. Values match those given by MLT "audiolevel" filter
+for right channel, i.e. peak level scaled to 0.0 - 1.0 range with IEC scale.
+
+If ffmpeg is not available get_frame_levels() returns None and callers
+fall back to seeking the media frame by frame with MLT.
+
+Levels files are binary files that are memory mapped when loaded. Levels are
+stored as uint8 values for every frame, and as min/max values for groups of frames 
+at several decimation levels so that zoomed out timeline can be drawn without
+going through every frame. Files created by earlier versions contain pickled lists of floats,
+these are converted to current format when loaded.
+"""
+
+import pickle
+import shutil
+import struct
+import subprocess
+
+import numpy as np
+
+import atomicfile
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+RIGHT_CHANNEL_INDEX = 1
+
+BLOCK_FRAMES = 500 # Number of video frames worth of audio read and processed at a time.
+
+CMD_FFMPEG = "ffmpeg"
+
+LEVELS_FILE_MAGIC = b"FBAL"
+LEVELS_FILE_VERSION = 1
+LEVELS_FILE_HEADER = "<4sHIH" # magic, version, frame count, number of decimation levels
+LEVELS_FILE_LEVEL_HEADER = "<II" # decimation, number of values
+DECIMATION_FACTOR = 4
+MAX_VALUE = 255.0
+
+
+def extraction_available():
+    return shutil.which(CMD_FFMPEG) != None
+
+def get_frame_levels(media_path, profile, media_length, progress_callback=None, abort_check=None):
+    """
+    Returns list of float levels, one for each frame in 0 - (media_length - 1) range,
+    or None if levels could not be extracted.
+
+    progress_callback is called with fraction of frames done after every block.
+    abort_check is called after every block and extraction is stopped and None returned if it returns True.
+    """
+    if media_length < 1 or extraction_available() == False:
+        return None
+
+    fps_num = profile.frame_rate_num()
+    fps_den = profile.frame_rate_den()
+
+    ffmpeg_call = [CMD_FFMPEG, "-v", "quiet", "-nostdin", "-i", str(media_path), "-vn",
+                   "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), "-f", "s16le", "-acodec", "pcm_s16le", "-"]
+    try:
+        process = subprocess.Popen(ffmpeg_call, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+
+    levels = np.zeros(media_length, dtype=np.float64)
+    bytes_per_sample_frame = 2 * CHANNELS
+
+    try:
+        for block_start in range(0, media_length, BLOCK_FRAMES):
+            block_end = min(block_start + BLOCK_FRAMES, media_length)
+
+            # Audio sample boundaries of video frames, computed from start to not accumulate rounding errors.
+            frames = np.arange(block_start, block_end + 1, dtype=np.int64)
+            sample_bounds = (frames * SAMPLE_RATE * fps_den) // fps_num
+            block_samples = int(sample_bounds[-1] - sample_bounds[0])
+
+            data = process.stdout.read(block_samples * bytes_per_sample_frame)
+            read_samples = len(data) // bytes_per_sample_frame
+            if read_samples < block_samples and process.wait() != 0:
+                return None # ffmpeg failed, e.g. media has no audio stream ffmpeg can decode.
+            if read_samples == 0:
+                if block_start == 0:
+                    return None # No audio data at all, silent levels would only hide failed extraction.
+                break # Media audio ended before video, rest of the frames are silent.
+
+            samples = np.frombuffer(data[:read_samples * bytes_per_sample_frame], dtype=np.int16)
+            right = np.abs(samples[RIGHT_CHANNEL_INDEX::CHANNELS].astype(np.int32))
+
+            # Frames that start after audio data ended in this block are left silent.
+            starts = sample_bounds[:-1] - sample_bounds[0]
+            valid_frames = int(np.count_nonzero(starts < read_samples))
+            peaks = np.maximum.reduceat(right, starts[:valid_frames])
+            # reduceat() gives the element at start index for empty ranges.
+            empty = np.diff(np.append(starts[:valid_frames], read_samples)) == 0
+            peaks[empty] = 0
+
+            levels[block_start:block_start + valid_frames] = _iec_scale(peaks / 32768.0)
+
+            if progress_callback != None:
+                progress_callback(float(block_end) / float(media_length))
+            if abort_check != None and abort_check() == True:
+                return None
+
+            if read_samples < block_samples:
+                break
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+    return levels.tolist()
+
+def _iec_scale(amplitudes):
+    # Vectorized version of IEC_Scale() in MLT filter_audiolevel.c
+    with np.errstate(divide='ignore'):
+        db = 20.0 * np.log10(amplitudes)
+
+    scale = np.ones(len(db))
+    scale = np.where(db < -0.001, (db + 20.0) * 0.025 + 0.5, scale)
+    scale = np.where(db < -20.0, (db + 30.0) * 0.02 + 0.3, scale)
+    scale = np.where(db < -30.0, (db + 40.0) * 0.015 + 0.15, scale)
+    scale = np.where(db < -40.0, (db + 50.0) * 0.0075 + 0.075, scale)
+    scale = np.where(db < -50.0, (db + 60.0) * 0.005 + 0.025, scale)
+    scale = np.where(db < -60.0, (db + 70.0) * 0.0025, scale)
+    scale = np.where(db < -70.0, 0.0, scale)
+    return scale
+
+
+# ------------------------------------------------------------ levels data
+class WaveformData:
+    """
+    Audio levels data for a media file. 
+    
+    Indexing gives level for a single frame in 0.0 - 1.0 range like with lists of floats
+    that were used earlier to store levels.
+    """
+    def __init__(self, frame_count, frame_values, decimated_levels):
+        self.frame_count = frame_count
+        self.frame_values = frame_values # uint8 array
+        self.decimated_levels = decimated_levels # list of (decimation, mins, maxs) tuples, ascending decimation
+
+    def __len__(self):
+        return self.frame_count
+
+    def get_size_bytes(self):
+        size = self.frame_values.nbytes
+        for decimation, mins, maxs in self.decimated_levels:
+            size += mins.nbytes + maxs.nbytes
+        return size
+
+    def __getitem__(self, frame):
+        return self.frame_values[frame] / MAX_VALUE
+
+    def get_draw_levels(self, first_frame, last_frame, step):
+        """
+        Returns (decimation, first_index, levels) tuple for drawing every step'th frame in range.
+        Level for frame f is levels[f // decimation - first_index].
+        Largest decimation not larger then step is used, and max level of group of frames is given for it.
+        """
+        decimation = 1
+        values = self.frame_values
+        for level_decimation, mins, maxs in self.decimated_levels:
+            if level_decimation > step:
+                break
+            decimation = level_decimation
+            values = maxs
+
+        first_index = max(0, first_frame // decimation)
+        last_index = last_frame // decimation + 1
+        levels = [v / MAX_VALUE for v in values[first_index:last_index].tolist()]
+        return (decimation, first_index, levels)
+
+
+def create_waveform_data(frame_levels):
+    frame_values = np.clip(np.rint(np.asarray(frame_levels, dtype=np.float64) * MAX_VALUE), 0, MAX_VALUE).astype(np.uint8)
+    frame_count = len(frame_values)
+
+    decimated_levels = []
+    decimation = DECIMATION_FACTOR
+    while decimation < frame_count:
+        # Pad last group so that padding does not affect min or max values.
+        groups_count = (frame_count + decimation - 1) // decimation
+        pad = groups_count * decimation - frame_count
+        mins = np.append(frame_values, np.full(pad, 255, dtype=np.uint8)).reshape(groups_count, decimation).min(axis=1)
+        maxs = np.append(frame_values, np.zeros(pad, dtype=np.uint8)).reshape(groups_count, decimation).max(axis=1)
+        decimated_levels.append((decimation, mins, maxs))
+        decimation = decimation * DECIMATION_FACTOR
+
+    return WaveformData(frame_count, frame_values, decimated_levels)
+
+def write_levels_file(levels_file_path, frame_levels):
+    waveform_data = create_waveform_data(frame_levels)
+    
+    with atomicfile.AtomicFileWriter(levels_file_path, "wb") as afw:
+        write_file = afw.get_file()
+        write_file.write(struct.pack(LEVELS_FILE_HEADER, LEVELS_FILE_MAGIC, LEVELS_FILE_VERSION, 
+                                     waveform_data.frame_count, len(waveform_data.decimated_levels)))
+        for decimation, mins, maxs in waveform_data.decimated_levels:
+            write_file.write(struct.pack(LEVELS_FILE_LEVEL_HEADER, decimation, len(maxs)))
+        write_file.write(waveform_data.frame_values.tobytes())
+        for decimation, mins, maxs in waveform_data.decimated_levels:
+            write_file.write(mins.tobytes())
+            write_file.write(maxs.tobytes())
+
+    return waveform_data
+
+def load_levels_file(levels_file_path):
+    """
+    Returns WaveformData object or None if file is not a levels file of known version.
+    """
+    with open(levels_file_path, "rb") as f:
+        header = f.read(struct.calcsize(LEVELS_FILE_HEADER))
+
+    if header[0:4] != LEVELS_FILE_MAGIC:
+        return _convert_pickled_levels_file(levels_file_path)
+
+    magic, version, frame_count, levels_count = struct.unpack(LEVELS_FILE_HEADER, header)
+    if version != LEVELS_FILE_VERSION:
+        return None
+
+    data = np.memmap(levels_file_path, dtype=np.uint8, mode="r")
+
+    offset = struct.calcsize(LEVELS_FILE_HEADER)
+    level_headers = []
+    for i in range(0, levels_count):
+        level_headers.append(struct.unpack_from(LEVELS_FILE_LEVEL_HEADER, data, offset))
+        offset += struct.calcsize(LEVELS_FILE_LEVEL_HEADER)
+
+    frame_values = data[offset:offset + frame_count]
+    offset += frame_count
+
+    decimated_levels = []
+    for decimation, values_count in level_headers:
+        mins = data[offset:offset + values_count]
+        offset += values_count
+        maxs = data[offset:offset + values_count]
+        offset += values_count
+        decimated_levels.append((decimation, mins, maxs))
+    
+    return WaveformData(frame_count, frame_values, decimated_levels)
+
+def _convert_pickled_levels_file(levels_file_path):
+    try:
+        with open(levels_file_path, "rb") as f:
+            frame_levels = pickle.load(f)
+    except Exception:
+        return None
+
+    write_levels_file(levels_file_path, frame_levels)
+    return load_levels_file(levels_file_path)
@@ -99,6 +99,8 @@ _master_volume_meter = None
 _update_ticker = None
 _level_filters = [] # 0 master, 1 - (len - 1) editable tracks
 _audio_levels = [] # 0 master, 1 - (len - 1) editable tracks
+
+mltrefhold.add_roots_provider(lambda: [_level_filters])
     
 def init(profile):
     audio_level_filter = mlt.Filter(profile, "audiolevel")
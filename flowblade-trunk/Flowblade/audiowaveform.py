@@ -23,15 +23,14 @@ Modules handles creating and caching audio waveform images for clips.
 """
 
 import mlt
-import os
-import pickle
 import threading
 import time
 
 from gi.repository import Gtk, Gdk
 
 import appconsts
-import atomicfile
+import audiolevels
+import audiowaveformrenderer
 import dialogutils
 from editorstate import PROJECT
 import gui
@@ -40,10 +39,6 @@ import updater
 import userfolders
 import utils
 
-# Frame level value cache for audio levels
-# path -> list of frame levels
-frames_cache = {}
-
 waveform_thread = None
 
 LEFT_CHANNEL = "_audio_level.0"
@@ -53,17 +48,9 @@ RIGHT_CHANNEL = "_audio_level.1"
 def set_waveform_displayer_clip_from_popup(data):
     clip, track, item_id, item_data = data
 
-    global frames_cache
-    if clip.path in frames_cache:
-        frame_levels = frames_cache[clip.path]
-        clip.waveform_data = frame_levels
-        updater.repaint_tline()
-        return
-
-    cache_file_path = userfolders.get_cache_dir() + appconsts.AUDIO_LEVELS_DIR + _get_unique_name_for_media(clip.path)
-    if os.path.isfile(cache_file_path):
-        frame_levels = utils.unpickle(cache_file_path)
-        frames_cache[clip.path] = frame_levels
+    # Levels data is shared with audio levels displayed for all clips, memory cache falls back to disk cache.
+    frame_levels = audiowaveformrenderer.get_cached_waveform_data(clip.path)
+    if frame_levels != None:
         clip.waveform_data = frame_levels
         updater.repaint_tline()
         return
@@ -113,10 +100,6 @@ class WaveformCreator(threading.Thread):
         self.dialog = dialog
         
     def run(self):
-        global frames_cache
-        frame_levels = [None] * self.clip_media_length 
-        frames_cache[self.clip.path] = frame_levels
-
         Gdk.threads_enter()
         self.dialog.progress_bar.set_fraction(0.0)
         self.dialog.progress_bar.set_text(str(0) + "%")
@@ -125,40 +108,20 @@ class WaveformCreator(threading.Thread):
         Gdk.threads_leave()
         time.sleep(0.2)
 
-        for frame in range(0, len(frame_levels)):
-            if self.abort:
-                break
-            self.temp_clip.seek(frame)
-            mlt.frame_get_waveform(self.temp_clip.get_frame(), 10, 50)
-            val = self.levels.get(RIGHT_CHANNEL)
-            if val == None:
-                val = 0.0
-            frame_levels[frame] = float(val)
-            self.last_rendered_frame = frame
-            if frame % 500 == 0:
-                render_fraction = float(self.last_rendered_frame) / float(self.clip_media_length)
-                Gdk.threads_enter()
-                self.dialog.progress_bar.set_fraction(render_fraction)
-                pros = int(render_fraction * 100)
-                self.dialog.progress_bar.set_text(str(pros) + "%")
-                while(Gtk.events_pending()):
-                    Gtk.main_iteration()
-                Gdk.threads_leave()
-                time.sleep(0.1)
+        frame_levels = audiolevels.get_frame_levels(self.clip.path, PROJECT().profile, self.clip_media_length,
+                                                    self.update_progress, lambda: self.abort)
+        if frame_levels == None and self.abort == False:
+            frame_levels = self._get_frame_levels_with_seeks()
 
         if not self.abort:
-            self.clip.waveform_data = frame_levels
-            with atomicfile.AtomicFileWriter(self.file_cache_path, "wb") as afw:
-                write_file = afw.get_file()
-                pickle.dump(frame_levels, write_file)
+            waveform_data = audiolevels.write_levels_file(self.file_cache_path, frame_levels)
+            audiowaveformrenderer.add_waveform_data(self.clip.path, waveform_data)
+            self.clip.waveform_data = waveform_data
 
             Gdk.threads_enter()
             self.dialog.progress_bar.set_fraction(1.0)
             self.dialog.progress_bar.set_text(_("Saving to Hard Drive"))
             Gdk.threads_leave()
-        
-        else:
-            frames_cache.pop(self.clip.path, None)
 
         updater.repaint_tline()
 
@@ -168,6 +131,34 @@ class WaveformCreator(threading.Thread):
         
         _waveform_render_stop(self.dialog, None)
 
+    def _get_frame_levels_with_seeks(self):
+        # Slow fallback used if levels could not be read with block reads.
+        frame_levels = [None] * self.clip_media_length 
+        for frame in range(0, len(frame_levels)):
+            if self.abort:
+                break
+            self.temp_clip.seek(frame)
+            mlt.frame_get_waveform(self.temp_clip.get_frame(), 10, 50)
+            val = self.levels.get(RIGHT_CHANNEL)
+            if val == None:
+                val = 0.0
+            frame_levels[frame] = float(val)
+            self.last_rendered_frame = frame
+            if frame % 500 == 0:
+                self.update_progress(float(self.last_rendered_frame) / float(self.clip_media_length))
+                time.sleep(0.1)
+        
+        return frame_levels
+
+    def update_progress(self, render_fraction):
+        Gdk.threads_enter()
+        self.dialog.progress_bar.set_fraction(render_fraction)
+        pros = int(render_fraction * 100)
+        self.dialog.progress_bar.set_text(str(pros) + "%")
+        while(Gtk.events_pending()):
+            Gtk.main_iteration()
+        Gdk.threads_leave()
+
     def _get_temp_producer(self, clip):
         service = clip.get("mlt_service")
         if service.startswith("xml"):
@@ -24,8 +24,8 @@ Modules handles creating and caching audio waveform images for clips.
 
 import locale
 import mlt
+import multiprocessing
 import os
-import pickle
 import subprocess
 import sys
 import threading
@@ -35,9 +35,10 @@ gi.require_version('Gdk', '3.0')
 from gi.repository import Gdk
 
 import appconsts
-import atomicfile
+import audiolevels
 import editorpersistance
 import editorstate
+import memorycache
 import mltenv
 import mltprofiles
 import mlttransitions
@@ -54,41 +55,64 @@ LEFT_CHANNEL = "_audio_level.0"
 RIGHT_CHANNEL = "_audio_level.1"
 
 FILE_SEPARATOR = "#&#file:"
+LEVELS_RENDERED_MSG = "#&#levels_rendered:" # Render process writes this to stdout followed by media file path when file is done.
 
-_waveforms = {} # Memory cache for waveform data
 _queued_waveform_renders = [] # Media queued for render during one timeline repaint
 _render_already_requested = [] # Files that have been sent to rendering since last project load
 
 
 # ------------------------------------------------- waveform cache
 def clear_cache():
-    global _waveforms, _queued_waveform_renders, _render_already_requested
+    global _queued_waveform_renders, _render_already_requested
 
-    _waveforms = {}
+    _waveforms.clear()
     _queued_waveform_renders = []
     _render_already_requested = []
 
+def get_clip_waveform_data(clip):
+    # Returns levels data to be displayed for clip or None.
+    if clip.waveform_data != None:
+        return clip.waveform_data # Levels display set for single clip
+    
+    if clip.is_blanck_clip == False and editorstate.display_all_audio_levels == True \
+        and clip.media_type != appconsts.IMAGE_SEQUENCE and clip.media_type != appconsts.PATTERN_PRODUCER:
+        return get_waveform_data(clip)
+    
+    return None
+
 def get_waveform_data(clip):
-    # Return from memory if present
-    global _waveforms
-    try:
-        waveform = _waveforms[clip.path]
+    # Return from memory cache, disk cache is used on memory cache miss.
+    waveform = _waveforms.get(clip.path)
+    if waveform != None:
         return waveform
-    except:
-        pass
-        
-    # Load from disk if found, otherwise queue for levels render
-    levels_file_path = _get_levels_file_path(clip.path, editorstate.PROJECT().profile)
-    if os.path.isfile(levels_file_path):
-        if os.path.getsize(levels_file_path) == 0:
-             print( "Size zero Audio levels file, this is error!", levels_file_path)
-        waveform = utils.unpickle(levels_file_path)
-        _waveforms[clip.path] = waveform
-        return waveform
-    else:
-        global _queued_waveform_renders
-        _queued_waveform_renders.append(clip.path)
+
+    # Not found, queue for levels render
+    global _queued_waveform_renders
+    _queued_waveform_renders.append(clip.path)
+    return None
+
+def get_cached_waveform_data(media_path):
+    # Returns levels data from memory or disk cache without queueing render if not found.
+    return _waveforms.get(media_path)
+
+def add_waveform_data(media_path, waveform):
+    _waveforms.put(media_path, waveform)
+
+def _load_waveform_data(media_path):
+    levels_file_path = _get_levels_file_path(media_path, editorstate.PROJECT().profile)
+    if not os.path.isfile(levels_file_path):
         return None
+
+    if os.path.getsize(levels_file_path) == 0:
+         print( "Size zero Audio levels file, this is error!", levels_file_path)
+    waveform = audiolevels.load_levels_file(levels_file_path)
+    if waveform == None:
+        # Unknown file version or broken file, render new one.
+        os.remove(levels_file_path)
+
+    return waveform
+
+_waveforms = memorycache.get_cache("audio_levels", lambda waveform: waveform.get_size_bytes(), _load_waveform_data)
     
 # ------------------------------------------------- launching render
 def launch_queued_renders():
@@ -142,7 +166,17 @@ class AudioRenderLaunchThread(threading.Thread):
         # Sep-2018 - SvdB - Added self. to be able to access the thread through 'process'
         self.process = subprocess.Popen([sys.executable, respaths.LAUNCH_DIR + "flowbladeaudiorender", \
                   self.rendered_media, self.profile_desc, respaths.ROOT_PATH], \
-                  stdin=FLOG, stdout=FLOG, stderr=FLOG)
+                  stdin=FLOG, stdout=subprocess.PIPE, stderr=FLOG, universal_newlines=True)
+
+        # Repaint timeline as levels for each file become available.
+        for line in self.process.stdout:
+            if line.startswith(LEVELS_RENDERED_MSG):
+                Gdk.threads_enter()
+                updater.repaint_tline()
+                Gdk.threads_leave()
+            else:
+                FLOG.write(line)
+
         self.process.wait()
         
         Gdk.threads_enter()
@@ -197,10 +231,22 @@ def main():
     
     files = files_paths.split(FILE_SEPARATOR)
 
-    for f in files:
-       t = WaveformCreator(f, profile_desc)
-       t.start()
-       t.join()
+    # Worker processes are forked after MLT has been initialized, so they don't need to do it again.
+    workers_count = max(1, min(editorpersistance.prefs.audio_levels_render_processes, len(files)))
+    render_args = [(f, profile_desc) for f in files]
+    with multiprocessing.get_context("fork").Pool(workers_count) as pool:
+        for rendered_file in pool.imap_unordered(_render_levels_file, render_args):
+            print(LEVELS_RENDERED_MSG + rendered_file, flush=True)
+
+def _render_levels_file(render_args):
+    clip_path, profile_desc = render_args
+    try:
+        waveform_creator = WaveformCreator(clip_path, profile_desc)
+        waveform_creator.run()
+    except Exception as e:
+        # Failing file should not stop rendering rest of the files.
+        print("Audio levels render failed for", clip_path, e, flush=True)
+    return clip_path
 
 
 class WaveformCreator(threading.Thread):    
@@ -208,11 +254,20 @@ class WaveformCreator(threading.Thread):
         threading.Thread.__init__(self)
         self.clip_path = clip_path
         profile = mltprofiles.get_profile(profile_desc)
+        self.profile = profile
         self.temp_clip = self._get_temp_producer(clip_path, profile)
         self.file_cache_path =_get_levels_file_path(clip_path, profile)
         self.last_rendered_frame = 0
 
     def run(self):
+        frame_levels = audiolevels.get_frame_levels(self.clip_path, self.profile, self.clip_media_length)
+        if frame_levels == None:
+            frame_levels = self._get_frame_levels_with_seeks()
+
+        audiolevels.write_levels_file(self.file_cache_path, frame_levels)
+
+    def _get_frame_levels_with_seeks(self):
+        # Slow fallback used if levels could not be read with block reads.
         frame_levels = [None] * self.clip_media_length 
 
         for frame in range(0, len(frame_levels)):
@@ -224,9 +279,7 @@ class WaveformCreator(threading.Thread):
             frame_levels[frame] = float(val)
             self.last_rendered_frame = frame
 
-        with atomicfile.AtomicFileWriter(self.file_cache_path, "wb") as afw:
-            write_file = afw.get_file()
-            pickle.dump(frame_levels, write_file)
+        return frame_levels
 
     def _get_temp_producer(self, clip_path, profile):
         temp_producer = mlt.Producer(profile, str(clip_path))
@@ -0,0 +1,487 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module handles autosave snapshots and edit journal used for crash recovery.
+
+Snapshots are project files written from persistance.ProjectCopy objects. Copy is created
+on GTK thread and it is pickled and written in SnapshotWriterThread.
+
+Every start() begins a new generation, e.g. when another project is opened. Journal file is
+not written for a generation until its first snapshot has been written, so that snapshot and
+journal files on disk are always from the same project.
+
+Between snapshots every edit, undo and redo appends an entry to journal file next to snapshot file.
+Entries have increasing serial numbers and snapshot index has serial of last entry that was done
+before its copy was created. On crash recovery entries after that are replayed on top of snapshot.
+
+Edits are journaled with their undo and redo function names and data. Tracks, timeline clips
+and compositors in data are replaced with their positions in current sequence and new media
+file clips with descriptions that are used to create them again. Edits with data that can not be
+journaled, and undos and redos of edits done before snapshot, stop journaling until a new
+snapshot is taken, and it is taken right after them.
+"""
+
+import os
+import pickle
+import threading
+import time
+import types
+
+from gi.repository import GLib
+
+import appconsts
+import atomicfile
+import edit
+import editorstate
+import persistance
+import undo
+
+JOURNAL_EXTENSION = ".journal"
+MAX_JOURNAL_ENTRIES = 200 # snapshot is taken when journal grows this long to keep replay short
+MIN_SNAPSHOT_INTERVAL = 10 # seconds, requested snapshots are delayed so that project is copied at most this often
+
+# Entry types
+EDIT = 0
+UNDO = 1
+REDO = 2
+
+_snapshot_path = None
+_active = False
+_generation = 0
+_written_generation = -1 # generation of last written snapshot
+_serial = 0 # serial of last journaled entry
+_entries = [] # (serial, entry) for entries not included in last written snapshot
+_journal_broken = False
+_snapshot_idle_id = -1
+_last_snapshot_time = 0.0
+_lock = threading.Lock() # journal file and _entries are accessed from writer thread
+
+# Journaled edits done since last snapshot that are below and above undo stack index.
+_undos_available = 0
+_redos_available = 0
+
+_edit_depth = 0 # edits done inside other edits are not journaled separately
+
+_writer_thread = None
+
+
+class JournalRef:
+    """
+    Replaces sequence object in journaled edit data.
+    """
+    def __init__(self, ref_type, position):
+        self.ref_type = ref_type
+        self.position = position
+
+
+class MediaClipDescription:
+    """
+    Replaces media file clip that is not in timeline in journaled edit data.
+    """
+    def __init__(self, clip_dict, properties):
+        self.clip_dict = clip_dict
+        self.properties = properties
+
+    def create_clip(self, memo):
+        clip = editorstate.current_sequence().create_file_producer_clip(self.clip_dict["path"], None, False, self.clip_dict["ttl"])
+        if clip == None:
+            raise JournalReplayError("could not create clip for " + self.clip_dict["path"])
+        for name, value in self.properties:
+            clip.set(name, value)
+        clip.__dict__.update(_decode(self.clip_dict, memo))
+        return clip
+
+
+class JournalReplayError(Exception):
+
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class _NotJournalable(Exception):
+    pass
+
+
+# ------------------------------------------------------------ snapshots
+def start(snapshot_path):
+    global _snapshot_path, _active, _entries, _generation
+    with _lock:
+        _snapshot_path = snapshot_path
+        _entries = []
+        _generation += 1
+    _active = True
+    take_snapshot()
+
+def stop():
+    global _active, _snapshot_idle_id
+    _active = False
+    if _snapshot_idle_id != -1:
+        GLib.source_remove(_snapshot_idle_id)
+        _snapshot_idle_id = -1
+
+def take_snapshot():
+    """
+    Creates project copy and gives it to writer thread. Must be called from GTK thread.
+    """
+    global _journal_broken, _undos_available, _redos_available, _writer_thread, _last_snapshot_time, _snapshot_idle_id
+    if _active == False:
+        return
+
+    # This snapshot also serves requested snapshot.
+    if _snapshot_idle_id != -1:
+        GLib.source_remove(_snapshot_idle_id)
+        _snapshot_idle_id = -1
+
+    _last_snapshot_time = time.monotonic()
+    project_copy = persistance.get_project_copy(editorstate.PROJECT())
+    _journal_broken = False
+    _undos_available = 0
+    _redos_available = 0
+
+    if _writer_thread == None:
+        _writer_thread = SnapshotWriterThread()
+        _writer_thread.start()
+    _writer_thread.write(_snapshot_path, project_copy, _generation, _serial)
+
+def wait_for_writes():
+    if _writer_thread != None:
+        _writer_thread.wait_for_writes()
+
+def _snapshot_needed():
+    global _journal_broken, _snapshot_idle_id
+    _journal_broken = True
+    if _snapshot_idle_id != -1:
+        return
+
+    # Snapshot is taken after edit that needs it has been completed, edits are not
+    # journaled until then.
+    delay = MIN_SNAPSHOT_INTERVAL - (time.monotonic() - _last_snapshot_time)
+    if delay > 0:
+        _snapshot_idle_id = GLib.timeout_add(int(delay * 1000), _do_requested_snapshot)
+    else:
+        _snapshot_idle_id = GLib.idle_add(_do_requested_snapshot)
+
+def _do_requested_snapshot():
+    global _snapshot_idle_id
+    _snapshot_idle_id = -1
+    take_snapshot()
+    return False
+
+
+class SnapshotWriterThread(threading.Thread):
+    """
+    Writes latest given project copy, earlier copies that have not been written yet are skipped.
+    """
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.condition = threading.Condition()
+        self.pending = None
+        self.writing = False
+
+    def write(self, snapshot_path, project_copy, generation, serial):
+        with self.condition:
+            self.pending = (snapshot_path, project_copy, generation, serial)
+            self.condition.notify_all()
+
+    def wait_for_writes(self):
+        with self.condition:
+            while self.pending != None or self.writing == True:
+                self.condition.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending == None:
+                    self.condition.wait()
+                snapshot_path, project_copy, generation, serial = self.pending
+                self.pending = None
+                self.writing = True
+
+            try:
+                persistance.write_project_copy(snapshot_path, project_copy, serial)
+                _snapshot_written(snapshot_path, generation, serial)
+            except Exception as e:
+                # Journal is kept and next snapshot may succeed.
+                print("Autosave snapshot write failed: " + str(e))
+
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+def _snapshot_written(snapshot_path, generation, serial):
+    # Entries included in snapshot are removed from journal.
+    global _entries, _written_generation
+    with _lock:
+        if generation != _generation:
+            return # Journal on disk stays with snapshot of previous generation until replaced.
+        _written_generation = generation
+        _entries = [(entry_serial, entry) for entry_serial, entry in _entries if entry_serial > serial]
+        with atomicfile.AtomicFileWriter(get_journal_path(snapshot_path), "wb") as afw:
+            journal_file = afw.get_file()
+            for serial_and_entry in _entries:
+                pickle.dump(serial_and_entry, journal_file)
+
+
+# ------------------------------------------------------------ journal
+def edit_started(edit_action):
+    """
+    Called before edit is done, edit data positions are taken from sequence state before edit.
+    Returns journal entry or None.
+    """
+    global _edit_depth
+    _edit_depth += 1
+    if _active == False or _journal_broken == True or _edit_depth > 1:
+        return None
+
+    try:
+        data = {}
+        positions = _get_sequence_positions()
+        for key in edit_action.data_keys:
+            data[key] = _encode(edit_action.__dict__[key], positions)
+        entry = (EDIT, _get_function_name(edit_action.undo_func), _get_function_name(edit_action.redo_func), data)
+        pickle.dumps(entry) # Test that data is pickleable before edit changes it.
+        return entry
+    except (_NotJournalable, pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+def edit_done(entry):
+    global _edit_depth, _undos_available, _redos_available
+    _edit_depth -= 1
+    if _active == False or _edit_depth > 0:
+        return
+    if entry == None:
+        _snapshot_needed()
+        return
+    _undos_available += 1
+    _redos_available = 0
+    _append_entry(entry)
+
+def undo_done():
+    global _undos_available, _redos_available
+    if _active == False or _journal_broken == True:
+        return
+    if _undos_available == 0:
+        _snapshot_needed()
+        return
+    _undos_available -= 1
+    _redos_available += 1
+    _append_entry((UNDO,))
+
+def redo_done():
+    global _undos_available, _redos_available
+    if _active == False or _journal_broken == True:
+        return
+    if _redos_available == 0:
+        _snapshot_needed()
+        return
+    _undos_available += 1
+    _redos_available -= 1
+    _append_entry((REDO,))
+
+def undo_stack_changed():
+    # Undo stack had edits dropped outside journaled undos and redos.
+    project_changed()
+
+def project_changed():
+    # Project was changed outside edits, journal can't be replayed on top of last snapshot.
+    global _undos_available, _redos_available
+    _undos_available = 0
+    _redos_available = 0
+    if _active == True:
+        _snapshot_needed()
+
+def _append_entry(entry):
+    global _serial
+    if _journal_broken == True:
+        return
+    with _lock:
+        _serial += 1
+        _entries.append((_serial, entry))
+        if _written_generation != _generation:
+            return # Entry is written with first snapshot of generation.
+        try:
+            with open(get_journal_path(_snapshot_path), "ab") as journal_file:
+                pickle.dump((_serial, entry), journal_file)
+        except OSError as e:
+            print("Autosave journal write failed: " + str(e))
+
+    if len(_entries) > MAX_JOURNAL_ENTRIES:
+        _snapshot_needed()
+
+def _get_function_name(func):
+    # Only module level functions of edit module can be found on replay.
+    if getattr(edit, func.__name__, None) is not func:
+        raise _NotJournalable()
+    return func.__name__
+
+def _get_sequence_positions():
+    # id -> JournalRef for tracks, clips and compositors of current sequence.
+    positions = {}
+    seq = editorstate.current_sequence()
+    for track_index in range(0, len(seq.tracks)):
+        track = seq.tracks[track_index]
+        positions[id(track)] = JournalRef("track", track_index)
+        for clip_index in range(0, len(track.clips)):
+            positions[id(track.clips[clip_index])] = JournalRef("clip", (track_index, clip_index))
+    for compositor_index in range(0, len(seq.compositors)):
+        positions[id(seq.compositors[compositor_index])] = JournalRef("compositor", compositor_index)
+    return positions
+
+def _encode(value, positions):
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return value
+    if id(value) in positions:
+        return positions[id(value)]
+    if isinstance(value, list):
+        return [_encode(item, positions) for item in value]
+    if isinstance(value, tuple):
+        return tuple([_encode(item, positions) for item in value])
+    if isinstance(value, dict):
+        return {key:_encode(item, positions) for key, item in value.items()}
+    if isinstance(value, types.FunctionType) and value.__qualname__ == value.__name__:
+        return value # module level functions are pickled by name
+    if _is_clip(value):
+        description = _get_media_clip_description(value, positions)
+        positions[id(value)] = description # clip is created once on replay
+        return description
+
+    raise _NotJournalable()
+
+def _is_clip(value):
+    # Clips are MLT producers with attributes added by Sequence.add_clip_attr().
+    return hasattr(value, "this") and hasattr(value, "is_blanck_clip")
+
+def _get_media_clip_description(clip, positions):
+    if clip.is_blanck_clip == True or clip.media_type == appconsts.PATTERN_PRODUCER or hasattr(clip, "speed"):
+        raise _NotJournalable()
+    if len(clip.filters) > 0 or clip.mute_filter != None or clip.sync_data != None:
+        raise _NotJournalable()
+
+    clip_dict = dict(clip.__dict__)
+    # SWIG pointer and length function are specific to MLT object, waveform is recreated when needed.
+    clip_dict.pop("this", None)
+    clip_dict.pop("clip_length", None)
+    clip_dict["waveform_data"] = None
+    clip_dict = _encode(clip_dict, positions)
+
+    properties = []
+    for i in range(0, clip.count()):
+        name = clip.get_name(i)
+        if name.startswith("_"):
+            continue
+        value = clip.get(name)
+        if value != None:
+            properties.append((name, value))
+
+    return MediaClipDescription(clip_dict, properties)
+
+
+# ------------------------------------------------------------ replay
+def replay_journal(snapshot_path):
+    """
+    Replays journal entries made after snapshot was copied on top of loaded snapshot project.
+    Returns number of replayed entries.
+    """
+    index = persistance.read_project_index(snapshot_path)
+    if index == None or not("journal_serial" in index):
+        return 0
+    snapshot_serial = index["journal_serial"]
+
+    entries = []
+    try:
+        with open(get_journal_path(snapshot_path), "rb") as journal_file:
+            while True:
+                entries.append(pickle.load(journal_file))
+    except FileNotFoundError:
+        return 0
+    except (EOFError, pickle.UnpicklingError):
+        pass # Last entry may have been partially written at crash.
+
+    replayed = 0
+    expected_serial = snapshot_serial + 1
+    for serial, entry in entries:
+        if serial <= snapshot_serial:
+            continue
+        if serial != expected_serial:
+            break
+        try:
+            _replay_entry(entry)
+        except Exception as e:
+            print("Autosave journal replay stopped at entry " + str(serial) + ": " + str(e))
+            break
+        replayed += 1
+        expected_serial += 1
+
+    print("Autosave journal entries replayed: " + str(replayed))
+    return replayed
+
+def _replay_entry(entry):
+    if entry[0] == UNDO:
+        undo.do_undo()
+    elif entry[0] == REDO:
+        undo.do_redo()
+    else:
+        entry_type, undo_func_name, redo_func_name, data = entry
+        memo = {}
+        decoded = {key:_decode(value, memo) for key, value in data.items()}
+        action = edit.EditAction(getattr(edit, undo_func_name), getattr(edit, redo_func_name), decoded)
+        action.do_edit()
+
+def _decode(value, memo):
+    if isinstance(value, JournalRef):
+        seq = editorstate.current_sequence()
+        if value.ref_type == "track":
+            return seq.tracks[value.position]
+        elif value.ref_type == "clip":
+            track_index, clip_index = value.position
+            return seq.tracks[track_index].clips[clip_index]
+        else:
+            return seq.compositors[value.position]
+    if isinstance(value, MediaClipDescription):
+        if not(id(value) in memo):
+            memo[id(value)] = value.create_clip(memo)
+        return memo[id(value)]
+    if isinstance(value, list):
+        return [_decode(item, memo) for item in value]
+    if isinstance(value, tuple):
+        return tuple([_decode(item, memo) for item in value])
+    if isinstance(value, dict):
+        return {key:_decode(item, memo) for key, item in value.items()}
+    return value
+
+
+# ------------------------------------------------------------ files
+def get_journal_path(snapshot_path):
+    return snapshot_path + JOURNAL_EXTENSION
+
+def is_journal_file(file_path):
+    return file_path.endswith(JOURNAL_EXTENSION)
+
+def delete_autosave(snapshot_path):
+    os.remove(snapshot_path)
+    try:
+        os.remove(get_journal_path(snapshot_path))
+    except FileNotFoundError:
+        pass
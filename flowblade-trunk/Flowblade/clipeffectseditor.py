@@ -472,6 +472,7 @@ def reset_filter_values():
     row_index = max(row)
     
     clip.filters[row_index].reset_values(PROJECT().profile, clip)
+    tlinerender.clip_filters_changed(clip)
     effect_selection_changed()
 
 def toggle_filter_active(row, update_stack_view=True):
@@ -814,6 +815,7 @@ def _load_effect_values_dialog_callback(dialog, response_id):
         
         if effect_data.data_applicable(filter_object.info):
             effect_data.set_effect_values(filter_object)
+            tlinerender.clip_filters_changed(clip)
             effect_selection_changed()
         else:
             # Info window
@@ -833,6 +835,7 @@ def _reset_filter_values():
 
     filter_object.properties = copy.deepcopy(info.properties)
     filter_object.non_mlt_properties = copy.deepcopy(info.non_mlt_properties)
+    tlinerender.clip_filters_changed(clip)
         
     effect_selection_changed()
 
@@ -874,6 +877,7 @@ class PropertyChangePollingThread(threading.Thread):
                 if changed:
                     global filter_changed_since_last_save
                     filter_changed_since_last_save = True
+                    tlinerender.clip_filters_changed(clip)
                     tlinerender.get_renderer().timeline_changed()
 
                 self.last_properties = new_properties
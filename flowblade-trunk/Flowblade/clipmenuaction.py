@@ -54,6 +54,7 @@ import mlttransitions
 import modesetting
 import movemodes
 import syncsplitevent
+import tlinerender
 import tlinewidgets
 import tlineaction
 import updater
@@ -654,6 +655,7 @@ def _reload_clip_media(data):
     # TODO: This ain't doing the clip icon update as wished.
     media_item = PROJECT().get_media_file_for_path(clip.path)
     media_item.create_icon()
+    tlinerender.media_reloaded(clip.path)
     
     clip_index = track.clips.index(clip)
     new_clip = current_sequence().create_clone_clip(clip)
@@ -46,6 +46,7 @@ from editorstate import PROJECT
 import gui
 import gmicheadless
 import gmicplayer
+import headlessworkers
 import jobs
 import mltprofiles
 import mltxmlheadless
@@ -577,13 +578,7 @@ class MLTXMLContainerActions(AbstractContainerActionObject):
                 "profile_desc:" + PROJECT().profile.description().replace(" ", "_"),
                 "xml_file_path:" + str(self.container_data.unrendered_media))
 
-        # Run with nice to lower priority if requested (currently hard coded to lower)
-        nice_command = "nice -n " + str(10) + " " + respaths.LAUNCH_DIR + "flowblademltxmlheadless"
-        for arg in args:
-            nice_command += " "
-            nice_command += arg
-
-        subprocess.Popen([nice_command], shell=True)
+        headlessworkers.launch_headless_process("flowblademltxmlheadless", args)
         
     def update_render_status(self):
 
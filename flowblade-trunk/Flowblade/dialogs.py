@@ -30,6 +30,7 @@ import os
 from gi.repository import Pango
 
 import appconsts
+import autosave
 import dialogutils
 import gui
 import guicomponents
@@ -937,16 +938,16 @@ def autosaves_many_recovery_dialog(response_callback, autosaves, parent_window):
     dialog.show_all()
 
 def _autosaves_delete_all_clicked(autosaves, autosaves_view, dialog):
-    for autosave in autosaves:
-        os.remove(autosave.path)
+    for autosave_object in autosaves:
+        autosave.delete_autosave(autosave_object.path)
     dialog.set_response_sensitive(Gtk.ResponseType.OK, False)
     del autosaves[:]
     autosaves_view.fill_data_model(autosaves)
 
 def _autosaves_delete_unselected(autosaves, autosaves_view):
     selected_autosave = autosaves.pop(autosaves_view.get_selected_indexes_list()[0])
-    for autosave in autosaves:
-        os.remove(autosave.path)
+    for autosave_object in autosaves:
+        autosave.delete_autosave(autosave_object.path)
     del autosaves[:]
     autosaves.append(selected_autosave)
     autosaves_view.fill_data_model(autosaves)
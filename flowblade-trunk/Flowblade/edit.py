@@ -28,6 +28,7 @@ EditAction objects and placing them on the undo/redo stack.
 import copy
 
 import appconsts
+import autosave
 import clipeffectseditor
 import compositeeditor
 import compositorfades
@@ -63,7 +64,9 @@ def append_clip(track, clip, clip_in, clip_out):
     clip.clip_out = clip_out
     track.clips.append(clip) # py
     track.append(clip, clip_in, clip_out) # mlt
+    track.sequence.clip_added_to_track(clip, track)
     resync.clip_added_to_timeline(clip, track)
+    tlinerender.track_clips_changed(track, len(track.clips) - 1)
 
 def _insert_clip(track, clip, index, clip_in, clip_out):
     """
@@ -73,7 +76,9 @@ def _insert_clip(track, clip, index, clip_in, clip_out):
     clip.clip_out = clip_out
     track.clips.insert(index, clip) # py
     track.insert(clip, index, clip_in, clip_out) # mlt
+    track.sequence.clip_added_to_track(clip, track)
     resync.clip_added_to_timeline(clip, track)
+    tlinerender.track_clips_changed(track, index)
 
 def _insert_blank(track, index, length):
     track.insert_blank(index, length - 1) # end inclusive
@@ -83,13 +88,17 @@ def _insert_blank(track, index, length):
     blank_clip.clip_out = length - 1 # -1, end inclusive
     blank_clip.is_blanck_clip = True
     track.clips.insert(index, blank_clip)
+    track.sequence.clip_added_to_track(blank_clip, track)
+    tlinerender.track_clips_changed(track, index)
     
 def _remove_clip(track, index):
     """
     Affects MLT c-struct and python obj values.
     """
+    tlinerender.track_clips_changed(track, index)
     track.remove(index)
     clip = track.clips.pop(index)
+    track.sequence.clip_removed_from_track(clip, track)
     resync.clip_removed_from_timeline(clip)
     
     return clip
@@ -130,6 +139,8 @@ def _add_blank_to_py(track, index, length):
     blank_clip.clip_out = length - 1 # -1, end inclusive
     blank_clip.is_blanck_clip = True
     track.clips.insert(index, blank_clip)
+    track.sequence.clip_added_to_track(blank_clip, track)
+    tlinerender.track_clips_changed(track, index)
     return blank_clip
 
 # --------------------------------- util methods
@@ -192,10 +203,12 @@ def _create_mute_volume_filter(seq):
     
 def _do_clip_mute(clip, volume_filter):
     mltfilters.do_clip_mute(clip, volume_filter)
+    tlinerender.clip_filters_changed(clip)
 
 def _do_clip_unmute(clip):
     clip.detach(clip.mute_filter.mlt_filter)
     clip.mute_filter = None
+    tlinerender.clip_filters_changed(clip)
 
 def _remove_consecutive_blanks(track, index):
     lengths = []
@@ -301,6 +314,7 @@ class EditAction:
     
         # Grabs data as object members.
         self.__dict__.update(data)
+        self.data_keys = list(data.keys()) # edit data is journaled for autosave
         
         # Compositor auto follow is saved with each edit and is computed on first do and later done on redo/undo
         self.compositor_autofollow_data = None
@@ -335,31 +349,39 @@ class EditAction:
         if self.exit_active_trimmode_on_edit:
             trimmodes.set_no_edit_trim_mode()
 
-        self.redo()
-        undo.register_edit(self)
-        if self.turn_on_stop_for_edit:
-            self.stop_for_edit = True
-
-        global edit_done_since_last_save
-        edit_done_since_last_save = True
-
-        # Create autofollow data if needed and update GUI.
-        # If autofollow and no data, then GUI update happens in do_edit()
-        # Added complexity here is to avoid two GUI updates
-        if auto_follow_active() == True:
-            self.compositor_autofollow_data, self.orphaned_compositors = get_full_compositor_sync_data()
-            do_autofollow_redo(self)
-            if current_sequence().compositing_mode == appconsts.COMPOSITING_MODE_STANDARD_AUTO_FOLLOW:
-                do_orphaned_compositors_delete_redo(self)
+        journal_entry = autosave.edit_started(self)
+        try:
+            self.redo()
+            undo.register_edit(self)
+            if self.turn_on_stop_for_edit:
+                self.stop_for_edit = True
+
+            global edit_done_since_last_save
+            edit_done_since_last_save = True
+
+            # Create autofollow data if needed and update GUI.
+            # If autofollow and no data, then GUI update happens in do_edit()
+            # Added complexity here is to avoid two GUI updates
+            if auto_follow_active() == True:
+                self.compositor_autofollow_data, self.orphaned_compositors = get_full_compositor_sync_data()
+                do_autofollow_redo(self)
+                if current_sequence().compositing_mode == appconsts.COMPOSITING_MODE_STANDARD_AUTO_FOLLOW:
+                    do_orphaned_compositors_delete_redo(self)
             
-            if self.do_restack_compositors == True:
-                current_sequence().restack_compositors()
+                if self.do_restack_compositors == True:
+                    current_sequence().restack_compositors()
                 
-            self.do_restack_compositors = False  # We wish to do this only once 
+                self.do_restack_compositors = False  # We wish to do this only once 
              
-            # This wasn't done in redo() because no auto follow data was available
-            if do_gui_update:
-                self._update_gui()
+                # This wasn't done in redo() because no auto follow data was available
+                if do_gui_update:
+                    self._update_gui()
+        except:
+            # Failed edit can't be journaled, snapshot is taken after it instead.
+            autosave.edit_done(None)
+            raise
+
+        autosave.edit_done(journal_entry)
 
     def undo(self):
         PLAYER().stop_playback()
@@ -472,17 +494,16 @@ def get_full_compositor_sync_data():
     
     # Create resync list
     resync_list = []
-    orphan_origin_clip_ids = list(comp_clip_pairings.keys())
-    for i in range(current_sequence().first_video_index, len(current_sequence().tracks) - 1): # -1, there is a topmost hidden track 
-        track = current_sequence().tracks[i] # b_track is source track where origin clip is
-        for j in range(0, len(track.clips)):
-            clip = track.clips[j]
-            if clip.id in comp_clip_pairings:
-                compositor_list = comp_clip_pairings[clip.id]
-                for compositor in compositor_list:
-                    resync_list.append((clip, track, j, compositor))
-            if clip.id in orphan_origin_clip_ids:
-                orphan_origin_clip_ids.remove(clip.id)
+    orphan_origin_clip_ids = []
+    for origin_clip_id, compositor_list in comp_clip_pairings.items():
+        track, j = current_sequence().get_track_and_index_for_id(origin_clip_id)
+        # b_track is source track where origin clip is, origin clips can only be on video tracks below topmost hidden track
+        if track == None or track.id < current_sequence().first_video_index or track.id == len(current_sequence().tracks) - 1:
+            orphan_origin_clip_ids.append(origin_clip_id)
+            continue
+        clip = track.clips[j]
+        for compositor in compositor_list:
+            resync_list.append((clip, track, j, compositor))
     
     # Create orphan compositors list
     orhan_compositors = []
@@ -1776,6 +1797,7 @@ def _add_filter_undo(self):
     self.clip.detach(self.filter_object.mlt_filter)
     index = self.clip.filters.index(self.filter_object)
     self.clip.filters.pop(index)
+    tlinerender.clip_filters_changed(self.clip)
 
     self.filter_edit_done_func(self.clip, len(self.clip.filters) - 1) # updates effect stack gui
 
@@ -1788,6 +1810,7 @@ def _add_filter_redo(self):
         self.filter_object.replace_values(self.clip)
         self.clip.attach(self.filter_object.mlt_filter)
         self.clip.filters.append(self.filter_object)
+    tlinerender.clip_filters_changed(self.clip)
         
     self.filter_edit_done_func(self.clip, len(self.clip.filters) - 1) # updates effect stack gui
 
@@ -1837,6 +1860,7 @@ def _add_multipart_filter_undo(self):
     self.filter_object.detach_all_mlt_filters(self.clip)
     index = self.clip.filters.index(self.filter_object)
     self.clip.filters.pop(index)
+    tlinerender.clip_filters_changed(self.clip)
 
     self.filter_edit_done_func(self.clip, len(self.clip.filters) - 1) # updates effect stack
 
@@ -1848,6 +1872,7 @@ def _add_multipart_filter_redo(self):
         self.filter_object = current_sequence().create_multipart_filter(self.filter_info, self.clip)
         self.filter_object.attach_all_mlt_filters(self.clip)
         self.clip.filters.append(self.filter_object)
+    tlinerender.clip_filters_changed(self.clip)
         
     self.filter_edit_done_func(self.clip, len(self.clip.filters) - 1) # updates effect stack
 
@@ -1958,9 +1983,11 @@ def _move_filter_redo(self):
     
 def _detach_all(clip):
     mltfilters.detach_all_filters(clip)
+    tlinerender.clip_filters_changed(clip)
 
 def _attach_all(clip):
     mltfilters.attach_all_filters(clip)
+    tlinerender.clip_filters_changed(clip)
 
 def _filter_move_insert(filters_list, f, insert_index):
     try:
@@ -2586,35 +2613,22 @@ def _consolidate_all_blanks_undo(self):
             _insert_blank(track, index + i, length)
         
 def _consolidate_all_blanks_redo(self):
+    # Single pass over each track, only runs of two or more consecutive blanks
+    # are touched in MLT playlists and saved for undo.
     self.consolidate_actions = []
     for i in range(1, len(current_sequence().tracks) - 1): # -1 because hidden track, 1 because black track
         track = current_sequence().tracks[i]
-        consolidaded_indexes = []
-        try_do_next = True
-        while(try_do_next == True):
-            if len(track.clips) == 0:
-                try_do_next = False
-            for i in range(0, len(track.clips)):
-                if i == len(track.clips) - 1:
-                    try_do_next = False
-                clip = track.clips[i]
-                if clip.is_blanck_clip == False:
-                    continue
-                try:
-                    consolidaded_indexes.index(i)
-                    continue
-                except:
-                    pass
-
-                # Now consolidate from clip in index i
-                consolidaded_indexes.append(i)
-                removed_lengths = _remove_consecutive_blanks(track, i)
-                total_length = 0
-                for length in removed_lengths:
-                    total_length = total_length + length
-                _insert_blank(track, i, total_length)
-                self.consolidate_actions.append((track, i, removed_lengths))
-                break
+        index = 0
+        while index < len(track.clips) - 1:
+            if track.clips[index].is_blanck_clip == False or track.clips[index + 1].is_blanck_clip == False:
+                index += 1
+                continue
+
+            # Now consolidate blanks starting from index
+            removed_lengths = _remove_consecutive_blanks(track, index)
+            _insert_blank(track, index, sum(removed_lengths))
+            self.consolidate_actions.append((track, index, removed_lengths))
+            index += 1 # Next clip cannot be blank
 
 #----------------- RANGE OVERWRITE 
 # "track","clip","clip_in","clip_out","mark_in_frame","mark_out_frame"
@@ -98,6 +98,9 @@ def load():
     current_prefs = EditorPreferences()
 
     if len(prefs.__dict__) != len(current_prefs.__dict__):
+        # Sequential jobs rendering setting was replaced by max parallel jobs renders limit.
+        if not hasattr(prefs, "max_concurrent_jobs") and getattr(prefs, "render_jobs_sequentially", False) == True:
+            current_prefs.max_concurrent_jobs = 1
         current_prefs.__dict__.update(prefs.__dict__)
         prefs = current_prefs
         with atomicfile.AtomicFileWriter(prefs_file_path, "wb") as afw:
@@ -192,7 +195,7 @@ def update_prefs_from_widgets(widgets_tuples_tuple):
     window_mode_combo, full_names, double_track_hights, top_row_layout, layout_monitor = view_prefs_widgets
 
     # Jan-2017 - SvdB
-    perf_render_threads, perf_drop_frames = performance_widgets
+    perf_render_threads, perf_drop_frames, audio_levels_processes, memory_cache_size, undo_memory_budget, trim_cache_entries, trim_cache_size, render_in_jobs_queue = performance_widgets
 
     global prefs
     prefs.open_in_last_opended_media_dir = open_in_last_opened_check.get_active()
@@ -231,6 +234,12 @@ def update_prefs_from_widgets(widgets_tuples_tuple):
     # Jan-2017 - SvdB
     prefs.perf_render_threads = int(perf_render_threads.get_adjustment().get_value())
     prefs.perf_drop_frames = perf_drop_frames.get_active()
+    prefs.audio_levels_render_processes = int(audio_levels_processes.get_adjustment().get_value())
+    prefs.memory_cache_size = int(memory_cache_size.get_adjustment().get_value())
+    prefs.undo_memory_budget = int(undo_memory_budget.get_adjustment().get_value())
+    prefs.trim_clips_cache_entries = int(trim_cache_entries.get_adjustment().get_value())
+    prefs.trim_clips_cache_size = int(trim_cache_size.get_adjustment().get_value())
+    prefs.render_timeline_in_jobs_queue = render_in_jobs_queue.get_active()
     # Feb-2017 - SvdB - for full file names
     prefs.show_full_file_names = full_names.get_active()
     prefs.center_on_arrow_move = auto_center_on_updown.get_active()
@@ -348,5 +357,16 @@ class EditorPreferences:
         self.tline_render_encoding = 0 # index of available proxy encodings, timeline rendering uses same encodings.
         self.tline_render_size = appconsts.PROXY_SIZE_FULL
         self.open_jobs_panel_on_add = True
-        self.render_jobs_sequentially = True
+        self.render_jobs_sequentially = True # deprecated, mapped to max_concurrent_jobs when prefs from earlier versions are updated
         self.disk_space_warning = 1 #  [off, 500MB,1GB, 2GB], see preferenceswindow.py
+        self.tline_render_processes = 2 # number of worker processes used by timeline render server
+        self.tline_render_cache_size = 2000 # MB, least recently used rendered segments are deleted when exceeded
+        self.audio_levels_render_processes = max(1, os.cpu_count() // 2)
+        self.memory_cache_size = 256 # MB, budget for audio levels and thumbnails kept in memory
+        self.undo_memory_budget = 512 # MB, estimated memory use of clips kept by undo stack
+        self.trim_clips_cache_entries = 20 # number of media files kept open for trim view
+        self.trim_clips_cache_size = 1000 # MB, estimated memory use of media files kept open for trim view
+        self.max_concurrent_jobs = max(1, os.cpu_count() // 2) # number of background render jobs run at the same time
+        self.render_timeline_in_jobs_queue = False # render from sequence snapshot in jobs queue, False renders in single render process from saved project
+        self.render_chunks = 1 # number of parts timeline renders in jobs queue are split into, 1 for linear render
+        self.render_chunk_workers = max(1, os.cpu_count() // 2) # number of parts rendered at the same time
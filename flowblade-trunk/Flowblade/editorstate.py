@@ -27,7 +27,10 @@ We're using BIG_METHOD_NAMES() for state objects. This is a bit unusual
 but looks good when reading code.
 """
 
+import collections
+
 import appconsts
+import mltrefhold
 
 # Edit modes
 INSERT_MOVE = 0
@@ -135,8 +138,13 @@ fade_length = -1
 transition_length = -1
 steal_frames = True
 
-# Trim clips cache for quicker inits, path -> clip
-_trim_clips_cache = {}
+# Trim clips cache for quicker inits, path -> clip, least recently used first
+_trim_clips_cache = collections.OrderedDict()
+_trim_clips_cache_max_entries = 20
+_trim_clips_cache_max_bytes = 1000 * 1000000
+
+# MLT objects in project, player, copy-paste data and trim clips cache are in use.
+mltrefhold.add_roots_provider(lambda: [project, player, _copy_paste_objects, _trim_clips_cache])
 
 def current_is_move_mode():
     if ((edit_mode == INSERT_MOVE) or (edit_mode == OVERWRITE_MOVE) or (edit_mode == MULTI_MOVE)):
@@ -282,16 +290,36 @@ def screen_size_large_height():
         
 def get_cached_trim_clip(path):
     try:
-        return _trim_clips_cache[path]
-    except:
+        clip = _trim_clips_cache[path]
+        _trim_clips_cache.move_to_end(path)
+        return clip
+    except KeyError:
         return None 
 
+def trim_clip_is_cached(path):
+    return path in _trim_clips_cache
+
 def add_cached_trim_clip(clip):
-     _trim_clips_cache[clip.path] = clip
+    _trim_clips_cache[clip.path] = clip
+    _trim_clips_cache.move_to_end(clip.path)
+    _evict_trim_clips()
+
+def set_trim_clips_cache_limits(max_entries, max_bytes):
+    global _trim_clips_cache_max_entries, _trim_clips_cache_max_bytes
+    _trim_clips_cache_max_entries = max_entries
+    _trim_clips_cache_max_bytes = max_bytes
+    _evict_trim_clips()
 
 def clear_trim_clip_cache():
     global _trim_clips_cache
-    _trim_clips_cache = {}
+    _trim_clips_cache = collections.OrderedDict()
+
+def _evict_trim_clips():
+    # Least recently used clips are dropped, most recently used clip is always kept.
+    used_bytes = sum([mltrefhold.get_estimated_bytes(clip) for clip in _trim_clips_cache.values()])
+    while len(_trim_clips_cache) > 1 and (len(_trim_clips_cache) > _trim_clips_cache_max_entries or used_bytes > _trim_clips_cache_max_bytes):
+        path, clip = _trim_clips_cache.popitem(last=False)
+        used_bytes -= mltrefhold.get_estimated_bytes(clip)
 
 
 # Called from tline "motion_notify_event" when drag is not on.
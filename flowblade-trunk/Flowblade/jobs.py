@@ -25,19 +25,20 @@ from gi.repository import Pango
 
 import copy
 import os
-import subprocess
 import time
 import threading
 
 import appconsts
+import ccrutils
 import editorpersistance
 from editorstate import PROJECT
 import gui
 import guicomponents
 import guiutils
+import headlessworkers
 import motionheadless
 import proxyheadless
-import respaths
+import renderheadless
 import utils
 
 QUEUED = 0
@@ -51,6 +52,21 @@ CONTAINER_CLIP_RENDER_MLT_XML = 2
 CONTAINER_CLIP_RENDER_BLENDER = 3
 MOTION_MEDIA_ITEM_RENDER = 4
 PROXY_RENDER = 5
+TIMELINE_RENDER = 6
+
+# Waiting jobs with higher priority are started first, jobs with same priority in order of adding.
+# Proxy clips are lowest because there are usually many of them and editing can continue with original media.
+JOB_PRIORITIES = {  TIMELINE_RENDER:3,
+                    CONTAINER_CLIP_RENDER_GMIC:2,
+                    CONTAINER_CLIP_RENDER_MLT_XML:2,
+                    CONTAINER_CLIP_RENDER_BLENDER:2,
+                    MOTION_MEDIA_ITEM_RENDER:1,
+                    PROXY_RENDER:0}
+
+MAX_CONCURRENT_JOBS_CHOICES = 8 # max value selectable from jobs panel menu
+
+POLL_INTERVAL = 0.5 # seconds, render status is polled at least this often
+MIN_POLL_INTERVAL = 0.1 # seconds, messages from render processes arriving faster than this are handled together
 
 open_media_file_callback = None
 
@@ -66,6 +82,8 @@ _remove_list = [] # objects are removed from GUI with delay to give user time to
 
 jobs_notebook_index = 4 # 4 for single window, app.py sets to 3 for two windows
 
+_queue_paused = False # when paused no new jobs are started, running jobs continue
+
 
 class JobProxy: # Background renders provide these to give info on render status.
                   # Modules doing the rendering must manage setting all values.
@@ -99,8 +117,17 @@ class JobProxy: # Background renders provide these to give info on render status
             return _("Motion Clip")
         elif self.type == PROXY_RENDER:
             return _("Proxy Clip")
+        elif self.type == TIMELINE_RENDER:
+            return _("Timeline Render")
             
+    def get_priority(self):
+        return JOB_PRIORITIES.get(self.type, 1)
+
     def get_progress_str(self):
+        if self.status == QUEUED:
+            if _queue_paused == True:
+                return _("Paused")
+            return _("Queued") + " " + str(_get_queue_position(self))
         if self.progress < 0.0:
             return "-"
         return str(int(self.progress * 100.0)) + "%"
@@ -111,6 +138,18 @@ class JobProxy: # Background renders provide these to give info on render status
     def abort_render(self):
         self.callback_object.abort_render()
 
+    def cancel(self):
+        # Jobs that have not been started have no render session to abort.
+        if self.status == QUEUED:
+            if _status_polling_thread != None and self.callback_object in _status_polling_thread.poll_objects:
+                remove_as_status_polling_object(self.callback_object)
+        else:
+            self.abort_render()
+
+        self.progress = -1.0
+        self.text = _("Cancelled")
+        self.status = CANCELLED
+
 
 #---------------------------------------------------------------- interface
 def add_job(job_proxy):
@@ -119,14 +158,9 @@ def add_job(job_proxy):
     _jobs_list_view.fill_data_model()
     if editorpersistance.prefs.open_jobs_panel_on_add == True:
         gui.middle_notebook.set_current_page(jobs_notebook_index)
-    
-    if editorpersistance.prefs.render_jobs_sequentially == False:
-        job_proxy.start_render()
-    else:
-         running = _get_jobs_with_status(RENDERING)
-         if len(running) == 0:
-             job_proxy.start_render()
-            
+
+    _start_waiting_jobs()
+
 def update_job_queue(update_msg_job_proxy): # We're using JobProxy objects as messages to update values on jobs in _jobs list.
     global _jobs_list_view, _remove_list
     row = -1
@@ -137,6 +171,8 @@ def update_job_queue(update_msg_job_proxy): # We're using JobProxy objects as me
         if _jobs[i].proxy_uid == update_msg_job_proxy.proxy_uid:
             if _jobs[i].status == CANCELLED:
                 return # it is maybe possible to get update attempt here after cancellation.         
+            if _jobs[i].status == QUEUED:
+                return # status polling can start before job is started, job is set RENDERING when started.
             # Update job proxy info and remember row
             row = i
             break
@@ -157,9 +193,7 @@ def update_job_queue(update_msg_job_proxy): # We're using JobProxy objects as me
         _jobs[row].progress = 1.0
         _remove_list.append(_jobs[row])
         GObject.timeout_add(4000, _remove_jobs)
-        waiting_jobs = _get_jobs_with_status(QUEUED)
-        if len(waiting_jobs) > 0:
-            waiting_jobs[0].start_render()
+        _start_waiting_jobs()
     else:
         _jobs[row].status = update_msg_job_proxy.status
 
@@ -176,8 +210,8 @@ def update_job_queue(update_msg_job_proxy): # We're using JobProxy objects as me
 def get_jobs_of_type(job_type):
     jobs_of_type = []
     for job in _jobs:
-        job.type = job_type
-        jobs_of_type.append(job)
+        if job.type == job_type:
+            jobs_of_type.append(job)
     
     return jobs_of_type
 
@@ -213,24 +247,38 @@ class ContainerStatusPollingThread(threading.Thread):
         #     abort_render()
         self.poll_objects = []
         self.abort = False
+        self.message_received = threading.Event() # set when render processes send messages over socket
 
         threading.Thread.__init__(self)
 
     def run(self):
         
         while self.abort == False:
-            for poll_obj in self.poll_objects:
+            self.message_received.clear()
+            for poll_obj in list(self.poll_objects):
                 poll_obj.update_render_status() # make sure methids enter/exit Gtk threads
                     
-                
-            time.sleep(0.5)
+            time.sleep(MIN_POLL_INTERVAL)
+            self.message_received.wait(POLL_INTERVAL - MIN_POLL_INTERVAL)
 
     def shutdown(self):
-        for poll_obj in self.poll_objects:
-            poll_obj.abort_render()
+        queued_objects = [job.callback_object for job in _get_jobs_with_status(QUEUED)]
+        for poll_obj in list(self.poll_objects): # aborting removes polling objects
+            if not(poll_obj in queued_objects):
+                poll_obj.abort_render()
         
         self.abort = True
 
+def start_session_messages_server():
+    # Render processes launched after this send status messages over socket instead of writing message files,
+    # and polling is done right after messages arrive.
+    ccrutils.set_session_message_listener(_session_message_received)
+    ccrutils.start_sessions_server()
+
+def _session_message_received():
+    if _status_polling_thread != None:
+        _status_polling_thread.message_received.set()
+
 def add_as_status_polling_object(polling_object):
     global _status_polling_thread
     if _status_polling_thread == None:
@@ -243,6 +291,8 @@ def remove_as_status_polling_object(polling_object):
     _status_polling_thread.poll_objects.remove(polling_object)
 
 def shutdown_polling():
+    ccrutils.stop_sessions_server()
+
     if _status_polling_thread == None:
         return
     
@@ -258,14 +308,23 @@ def _menu_action_pressed(widget, event):
     
     guiutils.add_separetor(menu)
 
-    """ Not settable for 2.6, let's see later
-    sequential_render_item = Gtk.CheckMenuItem()
-    sequential_render_item.set_label(_("Render All Jobs Sequentially"))
-    sequential_render_item.set_active(editorpersistance.prefs.render_jobs_sequentially)
-    sequential_render_item.connect("activate", _hamburger_item_activated, "sequential_render")
-    menu.add(sequential_render_item)
-    """
-    
+    pause_item = Gtk.CheckMenuItem()
+    pause_item.set_label(_("Pause Queue"))
+    pause_item.set_active(_queue_paused)
+    pause_item.connect("activate", _hamburger_item_activated, "pause_queue")
+    menu.add(pause_item)
+
+    max_jobs_menu_item = Gtk.MenuItem(_("Max Parallel Renders"))
+    max_jobs_menu = Gtk.Menu()
+    max_jobs_choices = max(1, min(os.cpu_count(), MAX_CONCURRENT_JOBS_CHOICES))
+    labels = [str(i) for i in range(1, max_jobs_choices + 1)]
+    active_index = min(editorpersistance.prefs.max_concurrent_jobs, max_jobs_choices) - 1
+    guiutils.get_radio_menu_items_group(max_jobs_menu, labels, list(range(1, max_jobs_choices + 1)), _max_jobs_selected, active_index)
+    max_jobs_menu_item.set_submenu(max_jobs_menu)
+    menu.add(max_jobs_menu_item)
+
+    guiutils.add_separetor(menu)
+
     open_on_add_item = Gtk.CheckMenuItem()
     open_on_add_item.set_label(_("Show Jobs Panel on Adding New Job"))
     open_on_add_item.set_active(editorpersistance.prefs.open_jobs_panel_on_add)
@@ -279,11 +338,8 @@ def _hamburger_item_activated(widget, msg):
     if msg == "cancel_all":
         global _jobs, _remove_list
         _remove_list = []
-        for job in _get_jobs_with_status(RENDERING):
-            job.abort_render()
-            job.progress = -1.0
-            job.text = _("Cancelled")
-            job.status = CANCELLED
+        for job in _get_jobs_with_status(QUEUED) + _get_jobs_with_status(RENDERING):
+            job.cancel()
             _remove_list.append(job)
 
         _jobs_list_view.fill_data_model()
@@ -294,12 +350,12 @@ def _hamburger_item_activated(widget, msg):
         jobs_list_index = _jobs_list_view.get_selected_row_index()
         
         job = _jobs[jobs_list_index]
-        job.abort_render()
-        job.progress = -1.0
-        job.text = _("Cancelled")
-        job.status = CANCELLED
+        if job.status == COMPLETED or job.status == CANCELLED:
+            return
+        job.cancel()
         _remove_list.append(job)
 
+        _start_waiting_jobs()
         _jobs_list_view.fill_data_model()
         _jobs_list_view.scroll.queue_draw()
         GObject.timeout_add(4000, _remove_jobs)
@@ -308,9 +364,41 @@ def _hamburger_item_activated(widget, msg):
         editorpersistance.prefs.open_jobs_panel_on_add = widget.get_active()
         editorpersistance.save()
 
-    elif msg == "sequential_render":
-        editorpersistance.prefs.render_jobs_sequentially = widget.get_active()
-        editorpersistance.save()
+    elif msg == "pause_queue":
+        global _queue_paused
+        _queue_paused = widget.get_active()
+        _start_waiting_jobs()
+        _jobs_list_view.fill_data_model()
+
+def _max_jobs_selected(widget, max_jobs):
+    if widget.get_active() == False:
+        return
+
+    editorpersistance.prefs.max_concurrent_jobs = max_jobs
+    editorpersistance.save()
+    _start_waiting_jobs()
+    _jobs_list_view.fill_data_model()
+
+def _start_waiting_jobs():
+    # Lowering the limit does not stop running jobs, new jobs are started when running count goes below it.
+    if _queue_paused == True:
+        return
+
+    free_slots = editorpersistance.prefs.max_concurrent_jobs - len(_get_jobs_with_status(RENDERING))
+    for job in _get_waiting_jobs()[:max(0, free_slots)]:
+        # Status is set before starting so that job is not started again from update_job_queue() calls done by start_render().
+        job.status = RENDERING
+        job.start_render()
+
+def _get_waiting_jobs():
+    # sorted() is stable, so jobs with same priority stay in order of adding.
+    return sorted(_get_jobs_with_status(QUEUED), key=lambda job: job.get_priority(), reverse=True)
+
+def _get_queue_position(job):
+    try:
+        return _get_waiting_jobs().index(job) + 1
+    except ValueError:
+        return 0
 
 def _get_jobs_with_status(status):
     running = []
@@ -489,13 +577,7 @@ class MotionRenderJobQueueObject(AbstractJobQueueObject):
         job_proxy.status = RENDERING
         update_job_queue(job_proxy)
         
-        # Run with nice to lower priority if requested (currently hard coded to lower)
-        nice_command = "nice -n " + str(10) + " " + respaths.LAUNCH_DIR + "flowblademotionheadless"
-        for arg in self.args:
-            nice_command += " "
-            nice_command += arg
-
-        subprocess.Popen([nice_command], shell=True)
+        headlessworkers.launch_headless_process("flowblademotionheadless", self.args)
 
     def update_render_status(self):
 
@@ -561,18 +643,8 @@ class ProxyRenderJobQueueObject(AbstractJobQueueObject):
         job_proxy.status = RENDERING
         update_job_queue(job_proxy)
         
-        # Run with nice to lower priority if requested (currently hard coded to lower)
-        nice_command = "nice -n " + str(10) + " " + respaths.LAUNCH_DIR + "flowbladeproxyheadless"
-        args = self.render_data.get_data_as_args_tuple()
-        for arg in args:
-            nice_command += " "
-            nice_command += arg
-
-        session_arg = "session_id:" + str(self.session_id)
-        nice_command += " "
-        nice_command += session_arg
-                
-        subprocess.Popen([nice_command], shell=True)
+        args = self.render_data.get_data_as_args_tuple() + ("session_id:" + str(self.session_id),)
+        headlessworkers.launch_headless_process("flowbladeproxyheadless", args)
 
     def update_render_status(self):
 
@@ -637,3 +709,60 @@ class ProxyRenderJobQueueObject(AbstractJobQueueObject):
             elif len(proxy_jobs) == 1:
                 self.render_data.do_auto_re_convert_func()
 
+
+class TimelineRenderJobQueueObject(AbstractJobQueueObject):
+
+    def __init__(self, session_id, render_data, open_in_bin):
+        
+        AbstractJobQueueObject.__init__(self, session_id, TIMELINE_RENDER)
+        
+        self.render_data = render_data # renderheadless.TimelineRenderData object
+        self.open_in_bin = open_in_bin
+
+    def get_job_name(self):
+        folder, file_name = os.path.split(self.render_data.render_path)
+        return file_name
+        
+    def start_render(self):
+        job_proxy = self.get_job_proxy()
+        job_proxy.text = _("Render Starting...")
+        job_proxy.status = RENDERING
+        update_job_queue(job_proxy)
+        
+        headlessworkers.launch_headless_process("flowbladerenderheadless", ["session_id:" + str(self.session_id)])
+
+    def update_render_status(self):
+
+        Gdk.threads_enter()
+                    
+        if renderheadless.session_render_complete(self.get_session_id()) == True:
+            remove_as_status_polling_object(self)
+            
+            job_proxy = self.get_completed_job_proxy()
+            update_job_queue(job_proxy)
+            
+            renderheadless.delete_session_folders(self.get_session_id()) # this also deletes sequence snapshot
+            
+            if self.open_in_bin == True:
+                GLib.idle_add(self.create_media_item)
+
+        else:
+            status = renderheadless.get_session_status(self.get_session_id())
+            if status != None:
+                fraction, elapsed = status
+
+                job_proxy = self.get_job_proxy()
+                job_proxy.progress = min(float(fraction), 1.0)
+                job_proxy.elapsed = float(elapsed)
+                job_proxy.text = _("Rendering ") + self.get_job_name()
+                
+                update_job_queue(job_proxy)
+
+        Gdk.threads_leave()
+    
+    def abort_render(self):
+        remove_as_status_polling_object(self)
+        renderheadless.abort_render(self.get_session_id())
+        
+    def create_media_item(self):
+        open_media_file_callback(self.render_data.render_path)
@@ -27,6 +27,7 @@ import cairo
 import math
 
 import appconsts
+import audiowaveformrenderer
 import cairoarea
 import clipeffectseditor
 import dialogutils
@@ -501,7 +502,8 @@ class TLineKeyFrameEditor:
         ex, ey, ew, eh = self._get_edit_area_rect()
         
         # Maybe draw audio levels
-        if self.edit_type == VOLUME_KF_EDIT and clip.is_blanck_clip == False and clip.waveform_data != None:
+        waveform_data = audiowaveformrenderer.get_clip_waveform_data(clip)
+        if self.edit_type == VOLUME_KF_EDIT and clip.is_blanck_clip == False and waveform_data != None:
 
             cr.set_source_rgba(*AUDIO_LEVELS_COLOR)
         
@@ -528,12 +530,15 @@ class TLineKeyFrameEditor:
             # Get media frame 0 position in screen pixels
             media_start_pos_pix = scale_in - clip_in * pix_per_frame
             mid_y = y + y_pad + eh / 2.0
-            
+
+            # Get levels with decimation matching zoom level
+            decimation, levels_first, levels = waveform_data.get_draw_levels(draw_first, draw_last, step)
+
             # Draw level bar for each frame in draw range
             for f in range(draw_first, draw_last, step):
                 try:
                     xf = media_start_pos_pix + f * pix_per_frame
-                    hf = bar_height * clip.waveform_data[f] * 0.5
+                    hf = bar_height * levels[f // decimation - levels_first] * 0.5
                     if h < 1:
                         h = 1
                     cr.rectangle(xf, mid_y - hf, draw_pix_per_frame, hf * 2.0)
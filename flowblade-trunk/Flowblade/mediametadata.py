@@ -0,0 +1,101 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module handles persistent disk cache of media file metadata.
+
+One record is kept for each (media file path, profile) combination and it holds
+file length, producer info dict with dimensions, fps and audio info, and thumbnail path.
+Records are validated with file size and modification time so that media files
+edited after they were cached are probed again.
+"""
+
+import hashlib
+import os
+import pickle
+
+import appconsts
+import atomicfile
+import userfolders
+
+RECORD_VERSION = 1
+
+
+class MediaMetadata:
+
+    def __init__(self, file_path, file_size, file_mtime, length, info, thumbnail_path):
+        self.version = RECORD_VERSION
+        self.file_path = file_path
+        self.file_size = file_size
+        self.file_mtime = file_mtime
+        self.length = length
+        self.info = info # dict from utils.get_file_producer_info() or None for audio files
+        self.thumbnail_path = thumbnail_path # None for audio files
+
+
+def get_metadata(file_path, profile):
+    """
+    Returns MediaMetadata for file or None if file has not been cached or it has changed since.
+    """
+    file_stat = _get_file_stat(file_path)
+    if file_stat == None:
+        return None
+
+    try:
+        with open(_get_record_path(file_path, profile), "rb") as f:
+            record = pickle.load(f)
+    except Exception:
+        return None
+
+    if record.version != RECORD_VERSION or record.file_path != file_path:
+        return None
+    if (record.file_size, record.file_mtime) != file_stat:
+        return None
+    if record.thumbnail_path != None and not os.path.isfile(record.thumbnail_path):
+        return None
+
+    return record
+
+def write_metadata(file_path, profile, length, info, thumbnail_path):
+    file_stat = _get_file_stat(file_path)
+    if file_stat == None:
+        return
+
+    file_size, file_mtime = file_stat
+    record = MediaMetadata(file_path, file_size, file_mtime, length, info, thumbnail_path)
+    try:
+        with atomicfile.AtomicFileWriter(_get_record_path(file_path, profile), "wb") as afw:
+            pickle.dump(record, afw.get_file())
+    except Exception as e:
+        # Metadata is recreated if cache write fails, this is not an error for caller.
+        print("Writing media metadata for " + file_path + " failed: " + str(e))
+
+def _get_file_stat(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+def _get_record_path(file_path, profile):
+    # Length is given in profile frames, so records are profile specific.
+    key = file_path + profile.description()
+    md_str = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return userfolders.get_cache_dir() + appconsts.MEDIA_METADATA_DIR + "/" + md_str + ".metadata"
@@ -0,0 +1,158 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module provides in-memory caches that share a single byte budget.
+
+Items from all caches are kept in one least recently used order and when
+the combined size of items exceeds budget, least recently used items are evicted
+from whichever cache they are in. Caches are created with a loader function that
+is used to get items again after eviction, e.g. from disk cache.
+"""
+
+import collections
+import threading
+
+DEFAULT_BUDGET = 256 * 1000000 # bytes
+
+_items = collections.OrderedDict() # (cache name, key) -> (item, size), least recently used first
+_used_bytes = 0
+_budget = DEFAULT_BUDGET
+_lock = threading.RLock()
+
+_caches = {} # cache name -> MemoryCache
+
+
+# ----------------------------------------------------- interface
+def get_cache(name, size_func, loader_func=None):
+    """
+    Returns MemoryCache with given name, creating it if needed.
+
+    size_func(item) gives estimated size of item in bytes.
+    loader_func(key) is called on cache miss, it should return item or None if item is not available.
+    """
+    with _lock:
+        try:
+            return _caches[name]
+        except KeyError:
+            cache = MemoryCache(name, size_func, loader_func)
+            _caches[name] = cache
+            return cache
+
+def set_budget(budget_bytes):
+    global _budget
+    with _lock:
+        _budget = budget_bytes
+        _evict()
+
+def get_used_bytes():
+    return _used_bytes
+
+def get_stats():
+    """
+    Returns list of (cache name, items count, bytes used, hits, misses) tuples.
+    """
+    with _lock:
+        stats = []
+        for name, cache in _caches.items():
+            items_count = 0
+            used_bytes = 0
+            for (cache_name, key), (item, size) in _items.items():
+                if cache_name == name:
+                    items_count += 1
+                    used_bytes += size
+            stats.append((name, items_count, used_bytes, cache.hits, cache.misses))
+        return stats
+
+def _evict():
+    global _used_bytes
+    while _used_bytes > _budget and len(_items) > 0:
+        (cache_name, key), (item, size) = _items.popitem(last=False)
+        _used_bytes -= size
+
+
+# ----------------------------------------------------- cache
+class MemoryCache:
+
+    def __init__(self, name, size_func, loader_func):
+        self.name = name
+        self.size_func = size_func
+        self.loader_func = loader_func
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns item for key or None if item is not in memory and cannot be loaded.
+        """
+        item_key = (self.name, key)
+        with _lock:
+            try:
+                item, size = _items[item_key]
+                _items.move_to_end(item_key)
+                self.hits += 1
+                return item
+            except KeyError:
+                self.misses += 1
+
+        if self.loader_func == None:
+            return None
+
+        # Loading is done outside lock, it may access disk.
+        item = self.loader_func(key)
+        if item != None:
+            self.put(key, item)
+        return item
+
+    def put(self, key, item):
+        global _used_bytes
+        item_key = (self.name, key)
+        size = self.size_func(item)
+        with _lock:
+            try:
+                old_item, old_size = _items.pop(item_key)
+                _used_bytes -= old_size
+            except KeyError:
+                pass
+            _items[item_key] = (item, size)
+            _used_bytes += size
+            _evict()
+
+    def pop(self, key):
+        global _used_bytes
+        with _lock:
+            try:
+                item, size = _items.pop((self.name, key))
+                _used_bytes -= size
+            except KeyError:
+                pass
+
+    def clear(self):
+        global _used_bytes
+        with _lock:
+            for item_key in [k for k in _items.keys() if k[0] == self.name]:
+                item, size = _items.pop(item_key)
+                _used_bytes -= size
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        with _lock:
+            return (self.name, key) in _items
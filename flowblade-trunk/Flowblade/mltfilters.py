@@ -470,6 +470,17 @@ def clone_filter_object(filter_object, mlt_profile):
     clone.create_mlt_filter(mlt_profile)
     return clone
 
+def clone_multipart_filter_object(filter_object, mlt_profile, clip):
+    """
+    Creates new multipart filter object with copied values for clip.
+    """
+    clone = MultipartFilterObject(filter_object.info)
+    clone.properties = copy.deepcopy(filter_object.properties)
+    clone.non_mlt_properties = copy.deepcopy(filter_object.non_mlt_properties)
+    clone.value = filter_object.value
+    clone.create_mlt_filters(mlt_profile, clip)
+    return clone
+
 def replace_services(services):
     
     replacements_doc = xml.dom.minidom.parse(respaths.REPLACEMENTS_XML_DOC)
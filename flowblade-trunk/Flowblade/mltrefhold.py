@@ -18,17 +18,163 @@
     along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-mlt_objects = []
+"""
+Module keeps references to created MLT objects so that they are not destroyed
+while they are in use.
+
+Modules that keep MLT objects in use, e.g. in project tracks, undo stack, caches or
+monitor, register roots providers. collect() walks Python data reachable from roots
+and releases held objects that are no longer reachable, so that they can be freed.
+Objects held after previous collect() are always kept over the next one, as they
+may not yet have been added to data reachable from roots.
+
+Collecting is only done in the editor process, other processes hold all objects.
+"""
+
+import threading
+import types
+import weakref
+
+COLLECT_GROWTH = 500 # collect_if_needed() collects after this many objects have been held since last collect
+
+# Memory use estimates.
+PRODUCER_BASE_BYTES = 2000000 # decoder context and buffers
+PRODUCER_FRAME_BUFFERS = 4 # RGBA frames kept by producer
+OBJECT_BYTES = 50000
 
+_held = {} # id -> (MLT object, generation when held)
+_live = weakref.WeakValueDictionary() # id -> MLT object, held objects that have not been destroyed
+_generation = 0
+_held_since_collect = 0
+_lock = threading.Lock()
+
+_roots_providers = [] # functions returning lists of objects that keep MLT objects in use
+
+
+# ----------------------------------------------------- interface
 def hold_ref(mlt_obj):
-    mlt_objects.append(mlt_obj)
+    global _held_since_collect
+    with _lock:
+        _held[id(mlt_obj)] = (mlt_obj, _generation)
+        _held_since_collect += 1
+        try:
+            _live[id(mlt_obj)] = mlt_obj
+        except TypeError:
+            pass # Object does not support weak references, it is counted only while held.
+
+def release_ref(mlt_obj):
+    with _lock:
+        try:
+            held_obj, generation = _held[id(mlt_obj)]
+            if held_obj is mlt_obj:
+                del _held[id(mlt_obj)]
+        except KeyError:
+            pass
+
+def add_roots_provider(roots_func):
+    """
+    roots_func() is called on collect() and it should return a list of objects.
+    MLT objects reachable from these through lists, tuples, dicts and object attributes are kept.
+    """
+    _roots_providers.append(roots_func)
+
+def collect_if_needed():
+    if _held_since_collect >= COLLECT_GROWTH:
+        collect()
+
+def collect():
+    """
+    Releases held objects that are not reachable from roots. Must be called from the thread that edits project data.
+    """
+    global _generation, _held_since_collect
+
+    reachable = _get_reachable_ids()
+
+    with _lock:
+        for obj_id in list(_held.keys()):
+            mlt_obj, generation = _held[obj_id]
+            if generation < _generation and not(obj_id in reachable):
+                del _held[obj_id]
+        _generation += 1
+        _held_since_collect = 0
+
+def get_stats():
+    """
+    Returns list of (MLT type name, live objects count, held objects count, estimated bytes) tuples.
+    Live objects include objects that have been released but are still referenced from somewhere.
+    """
+    with _lock:
+        live_objects = list(_live.values())
+        held_ids = set(_held.keys())
+        for mlt_obj, generation in _held.values():
+            if not(id(mlt_obj) in _live):
+                live_objects.append(mlt_obj)
+
+    types_stats = {}
+    for mlt_obj in live_objects:
+        type_name = type(mlt_obj).__name__
+        live_count, held_count, size = types_stats.get(type_name, (0, 0, 0))
+        if id(mlt_obj) in held_ids:
+            held_count += 1
+        types_stats[type_name] = (live_count + 1, held_count, size + get_estimated_bytes(mlt_obj))
+
+    return [(type_name,) + stats for type_name, stats in sorted(types_stats.items())]
+
+def get_estimated_bytes(mlt_obj):
+    if type(mlt_obj).__name__ != "Producer":
+        return OBJECT_BYTES
+    frame_bytes = mlt_obj.get_int("width") * mlt_obj.get_int("height") * 4
+    return PRODUCER_BASE_BYTES + frame_bytes * PRODUCER_FRAME_BUFFERS
 
 def print_objects():
-    global mlt_objects
-    print("len(mlt_objects):", len(mlt_objects))
-    
+    total_live = 0
+    total_bytes = 0
+    for type_name, live_count, held_count, size in get_stats():
+        print(type_name + ": live " + str(live_count) + ", held " + str(held_count) + ", " + str(size // 1000000) + " MB")
+        total_live += live_count
+        total_bytes += size
+    print("live MLT objects:", total_live, "estimated memory:", str(total_bytes // 1000000), "MB")
+
 def print_and_clear():
     print_objects()
-    global mlt_objects
-    mlt_objects = []
-    
+    global _held
+    with _lock:
+        _held = {}
+
+
+# ----------------------------------------------------- reachability
+def _get_reachable_ids():
+    reachable = set()
+    visited = set()
+    pending = []
+    for roots_func in _roots_providers:
+        pending.extend(roots_func())
+
+    while len(pending) > 0:
+        value = pending.pop()
+        if value is None or isinstance(value, (str, bytes, int, float)):
+            continue
+        if id(value) in visited:
+            continue
+        visited.add(id(value))
+
+        if id(value) in _held:
+            reachable.add(id(value))
+
+        if isinstance(value, (list, tuple, set, frozenset)):
+            pending.extend(value)
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif _is_walkable_object(value):
+            pending.extend(value.__dict__.values())
+
+    return reachable
+
+def _is_walkable_object(value):
+    # Application and MLT modules are not in packages, objects from library packages
+    # like Gtk or xml.dom are not walked into.
+    if not hasattr(value, "__dict__"):
+        return False
+    if isinstance(value, (type, types.ModuleType)) or callable(value):
+        return False
+    return not("." in type(value).__module__)
@@ -24,18 +24,35 @@ Module for saving and loading projects.
 Main functionality of the module is to replace unpickleable 
 SwigPyObject MLT objects with pickleable python objects for save, 
 and then create MLT objects from pickled objects when project is loaded.
+
+Project files start with a header and an index that can be read without reading 
+the rest of the file. Index is followed by pickled project data chunk and 
+one pickled chunk for every sequence. Project files saved by earlier versions are 
+single pickled Project objects, these are still loaded.
+
+When project is loaded MLT objects are created only for current sequence, 
+other sequences are built when they are first activated.
+
+Saving is done in two parts. get_project_copy() creates pickleable copies of project 
+data and must be called in the thread that edits project. write_project_copy() pickles and 
+writes the copy and it can be called from another thread, because the copy does not 
+share any containers with project data that edits change.
 """
 
+import concurrent.futures
 import copy
 import glob
 import fnmatch
 import hashlib
 import os
 import pickle
+import struct
 import time
 
 from gi.repository import Gdk
 
+import mlt
+
 import appconsts
 import atomicfile
 import editorstate
@@ -52,13 +69,21 @@ import utils
 # Unpickleable attributes for all objects
 # These are removed at save and recreated at load.
 PROJECT_REMOVE = ['profile','c_seq']
-SEQUENCE_REMOVE = ['profile','field','multitrack','tractor','monitor_clip','vectorscope','audiowave','rgbparade','outputfilter','watermark_filter']
+SEQUENCE_REMOVE = ['profile','field','multitrack','tractor','monitor_clip','vectorscope','audiowave','rgbparade','outputfilter','watermark_filter','clip_id_index','clip_positions','load_data']
 PLAY_LIST_REMOVE = ['this','sequence','get_name','gain_filter','pan_filter']
 CLIP_REMOVE = ['this','clip_length']
 TRANSITION_REMOVE = ['this']
 FILTER_REMOVE = ['mlt_filter','mlt_filters']
 MEDIA_FILE_REMOVE = ['icon']
 
+# Project file format
+PROJECT_FILE_MAGIC = b"FBPROJCT"
+PROJECT_FILE_FORMAT_VERSION = 1
+PROJECT_FILE_HEADER = "<8sHQ" # magic, format version, index length
+
+# Number of threads used to check media files and load media data when loading projects
+PREFETCH_THREADS = 8
+
 # Used to flag a not found relative path
 NOT_FOUND = "/not_found_not_found/not_found"
 
@@ -83,6 +108,10 @@ _load_file_path = None
 # 'snapshot_paths != None' flags that snapsave is being done and paths need to be replaced 
 snapshot_paths = None
 
+# Media paths resolved and file existence checked before sequence is built on load
+_prefetched_paths = {} # (saved path, is image sequence) -> resolved path
+_prefetched_file_exists = {} # path -> bool
+
 # Used to compute in/out points when saving to change profile
 _fps_conv_mult = 1.0
 
@@ -103,6 +132,25 @@ class ProjectProfileNotFoundError(Exception):
     def __str__(self):
         return repr(self.value)
 
+class ProjectCopy:
+    """
+    Pickleable copies of project data created with get_project_copy().
+    """
+    def __init__(self, s_proj, s_sequences, sequence_savefile_versions):
+        self.s_proj = s_proj
+        self.s_sequences = s_sequences
+        self.sequence_savefile_versions = sequence_savefile_versions
+
+class SequenceLoadData:
+    """
+    Data needed to create MLT objects for a loaded sequence that has not yet been built.
+    """
+    def __init__(self, savefile_version, load_file_path, proxy_mode, proxy_path_dict):
+        self.savefile_version = savefile_version
+        self.load_file_path = load_file_path
+        self.proxy_mode = proxy_mode
+        self.proxy_path_dict = proxy_path_dict
+
 # -------------------------------------------------- LOAD MESSAGES
 def _show_msg(msg, delay=0.0):
     if show_messages == True:
@@ -117,7 +165,12 @@ def save_project(project, file_path, changed_profile_desc=None):
     Creates pickleable project object
     """
     print("Saving project...")  # + os.path.basename(file_path)
-    
+    write_project_copy(file_path, get_project_copy(project, changed_profile_desc))
+
+def get_project_copy(project, changed_profile_desc=None):
+    """
+    Returns ProjectCopy for project.
+    """
     # Get shallow copy
     s_proj = copy.copy(project)
     
@@ -186,18 +239,66 @@ def save_project(project, file_path, changed_profile_desc=None):
 
     # Replace sequences with pickleable objects
     sequences = []
+    sequence_savefile_versions = []
     for i in range(0, len(project.sequences)):
         add_seq = project.sequences[i]
         sequences.append(get_p_sequence(add_seq))
-    s_proj.sequences = sequences
+        # Sequences that have not been built have not been converted to current SAVEFILE_VERSION.
+        if getattr(add_seq, "load_data", None) != None:
+            sequence_savefile_versions.append(add_seq.load_data.savefile_version)
+        else:
+            sequence_savefile_versions.append(appconsts.SAVEFILE_VERSION)
+    s_proj.sequences = []
+
+    # Copy containers that are changed in place when project is edited.
+    s_proj.bins = [get_p_bin(b) for b in project.bins]
+    s_proj.events = list(project.events)
+    s_proj.media_log = list(project.media_log)
+    s_proj.media_log_groups = list(project.media_log_groups)
+    s_proj.project_properties = dict(project.project_properties)
 
     # Remove unpickleable attributes
     remove_attrs(s_proj, PROJECT_REMOVE)
 
-    # Write out file.
+    return ProjectCopy(s_proj, sequences, sequence_savefile_versions)
+
+def write_project_copy(file_path, project_copy, journal_serial=None):
+    """
+    Writes project file from ProjectCopy, journal_serial is written in index for autosave snapshots.
+    """
+    _write_project_file(file_path, project_copy.s_proj, project_copy.s_sequences, 
+                        project_copy.sequence_savefile_versions, journal_serial)
+
+def _write_project_file(file_path, s_proj, s_sequences, sequence_savefile_versions, journal_serial=None):
+    chunks = [pickle.dumps(s_proj)]
+    for s_seq in s_sequences:
+        chunks.append(pickle.dumps(s_seq))
+
+    # Chunk offsets are relative to end of index.
+    offset = len(chunks[0])
+    index = {}
+    index["SAVEFILE_VERSION"] = s_proj.SAVEFILE_VERSION
+    index["name"] = s_proj.name
+    index["profile_desc"] = s_proj.profile_desc
+    index["c_seq_index"] = s_proj.c_seq_index
+    index["project_chunk"] = (0, len(chunks[0]))
+    index["sequences"] = []
+    for i in range(0, len(s_sequences)):
+        seq_chunk = chunks[i + 1]
+        index["sequences"].append({"name": s_sequences[i].name,
+                                   "SAVEFILE_VERSION": sequence_savefile_versions[i],
+                                   "chunk": (offset, len(seq_chunk))})
+        offset += len(seq_chunk)
+    if journal_serial != None:
+        index["journal_serial"] = journal_serial
+    index_data = pickle.dumps(index)
+
     with atomicfile.AtomicFileWriter(file_path, "wb") as afw:
         outfile = afw.get_file()
-        pickle.dump(s_proj, outfile)
+        outfile.write(struct.pack(PROJECT_FILE_HEADER, PROJECT_FILE_MAGIC, PROJECT_FILE_FORMAT_VERSION, len(index_data)))
+        outfile.write(index_data)
+        for chunk in chunks:
+            outfile.write(chunk)
 
 def get_p_sequence(sequence):
     """
@@ -263,6 +364,9 @@ def get_p_clip(clip):
     # This IS NOT USED anywhere anymore and should be removed.
     s_clip.type = 'Mlt__Producer'
 
+    if hasattr(clip, "markers"):
+        s_clip.markers = list(clip.markers)
+
     # Get replace filters
     filters = []
     try: # This fails for blank clips
@@ -316,6 +420,9 @@ def get_p_filter(f):
     Creates pickleable version of MLT Filter object.
     """
     s_filter = copy.copy(f)
+    s_filter.properties = list(f.properties)
+    if hasattr(f, "non_mlt_properties"):
+        s_filter.non_mlt_properties = list(f.non_mlt_properties)
     remove_attrs(s_filter, FILTER_REMOVE)
     if f.info.multipart_filter == False:
         s_filter.is_multi_filter = False
@@ -330,6 +437,8 @@ def get_p_compositors(compositors):
         s_compositor = copy.copy(compositor)
         s_compositor.transition = copy.copy(compositor.transition)
         s_compositor.transition.mlt_transition = None
+        if hasattr(compositor.transition, "properties"):
+            s_compositor.transition.properties = list(compositor.transition.properties)
         if _fps_conv_mult != 1.0:
             _update_compositor_in_out_for_fps_change(s_compositor)
 
@@ -337,6 +446,11 @@ def get_p_compositors(compositors):
 
     return s_compositors
 
+def get_p_bin(b):
+    s_bin = copy.copy(b)
+    s_bin.file_ids = list(b.file_ids)
+    return s_bin
+
 def get_p_sync_data(sync_data):
     s_sync_data = copy.copy(sync_data)
     if isinstance( sync_data.master_clip, int ): # When saving relinked projects sync_data.master_clip 
@@ -386,14 +500,60 @@ def _save_changed_xml_file(s_media_file, new_profile):
     return new_xml_file_path
 
 # -------------------------------------------------- LOAD
+def read_project_index(file_path):
+    """
+    Returns index dict of project file without reading project data, or None
+    if file was saved by earlier versions as a single pickled Project object.
+    """
+    with open(file_path, "rb") as f:
+        return _read_index(f)
+
+def _read_index(f):
+    header = f.read(struct.calcsize(PROJECT_FILE_HEADER))
+    if len(header) < struct.calcsize(PROJECT_FILE_HEADER) or header[0:len(PROJECT_FILE_MAGIC)] != PROJECT_FILE_MAGIC:
+        return None
+        
+    magic, format_version, index_length = struct.unpack(PROJECT_FILE_HEADER, header)
+    return pickle.loads(f.read(index_length))
+
+def _unpickle_project(file_path):
+    """
+    Returns (project, sequence_savefile_versions) tuple.
+    """
+    with open(file_path, "rb") as f:
+        index = _read_index(f)
+        if index != None:
+            chunks_start = f.tell()
+
+            offset, length = index["project_chunk"]
+            f.seek(chunks_start + offset)
+            project = pickle.loads(f.read(length))
+
+            project.sequences = []
+            sequence_savefile_versions = []
+            for seq_entry in index["sequences"]:
+                offset, length = seq_entry["chunk"]
+                f.seek(chunks_start + offset)
+                project.sequences.append(pickle.loads(f.read(length)))
+                sequence_savefile_versions.append(seq_entry["SAVEFILE_VERSION"])
+            
+            return (project, sequence_savefile_versions)
+
+    # Project files saved by earlier versions.
+    project = utils.unpickle(file_path)
+    savefile_version = getattr(project, "SAVEFILE_VERSION", 1) # first save files did not have this
+    return (project, [savefile_version] * len(project.sequences))
+
 def load_project(file_path, icons_and_thumnails=True, relinker_load=False):
     _show_msg("Unpickling")
 
-    project = utils.unpickle(file_path)
+    project, sequence_savefile_versions = _unpickle_project(file_path)
 
     # Relinker only operates on pickleable python data 
     if relinker_load:
         FIX_MISSING_PROJECT_ATTRS(project)
+        for i in range(0, len(project.sequences)):
+            project.sequences[i].load_data = SequenceLoadData(sequence_savefile_versions[i], file_path, project.proxy_data.proxy_mode, {})
         return project
 
     global _load_file_path
@@ -430,13 +590,6 @@ def load_project(file_path, icons_and_thumnails=True, relinker_load=False):
         # This fixes Media Relinked projects with SAVEFILE_VERSION < 4:
         if (not(hasattr(media_file,  "is_proxy_file"))):
             FIX_N_TO_4_MEDIA_FILE_COMPATIBILITY(media_file)
-            
-        # Try to find relative path files if needed for non-proxy media files
-        if media_file.is_proxy_file == False:
-            if media_file.type != appconsts.PATTERN_PRODUCER and media_file.type != appconsts.IMAGE_SEQUENCE:
-                media_file.path = get_media_asset_path(media_file.path, _load_file_path)
-            elif media_file.type == appconsts.IMAGE_SEQUENCE:
-                media_file.path = get_img_seq_media_path(media_file.path, _load_file_path)
 
         # This attr was added for 1.8. It is not computed for older projects.
         if (not hasattr(media_file, "info")):
@@ -445,68 +598,216 @@ def load_project(file_path, icons_and_thumnails=True, relinker_load=False):
         if not hasattr(media_file, "ttl"):
             media_file.ttl = None
 
-        # Avoid crash in case path attribute is missing (color clips).
-        if not hasattr(media_file, "path"):
-            continue
-        # Add container data if not found.
-        if not hasattr(media_file, "container_data"):
-            media_file.container_data = None
-            
-        # Use this to try to fix clips with missing proxy files.
-        proxy_path_dict[media_file.path] = media_file.second_file_path
-        
-        # Try to fix possible missing proxy files for media assets if we are in proxy mode.
-        if not os.path.isfile(media_file.path) and media_file.is_proxy_file and project_proxy_mode == appconsts.USE_PROXY_MEDIA:
-            if os.path.isfile(media_file.second_file_path): # Original media file exists, use it
-                media_file.set_as_original_media_file()
-
-    # Add MLT objects to sequences.
-    global all_clips, sync_clips
-    seq_count = 1
-    for seq in project.sequences:
-        FIX_N_TO_3_SEQUENCE_COMPATIBILITY(seq)
-            
-        if not hasattr(seq, "compositing_mode"):
-            seq.compositing_mode = appconsts.COMPOSITING_MODE_TOP_DOWN_FREE_MOVE
+    if(not hasattr(project, "update_media_lengths_on_load")):
+        project.update_media_lengths_on_load = True # old projects < 1.10 had wrong media length data which just was never used.
+                                                    # 1.10 needed that data for the first time and required recreating it correctly for older projects
 
-        _show_msg(_("Building sequence ") + str(seq_count))
-        all_clips = {}
-        sync_clips = []
+    # Media paths are resolved and checked for all media before any sequence is built.
+    _show_msg(_("Checking media files"))
+    _prefetch_media_paths(project)
+    try:
+        for k, media_file in project.media_files.items():
+            # Try to find relative path files if needed for non-proxy media files
+            if media_file.is_proxy_file == False:
+                if media_file.type != appconsts.PATTERN_PRODUCER and media_file.type != appconsts.IMAGE_SEQUENCE:
+                    media_file.path = _get_media_path(media_file.path, False)
+                elif media_file.type == appconsts.IMAGE_SEQUENCE:
+                    media_file.path = _get_media_path(media_file.path, True)
+
+            # Avoid crash in case path attribute is missing (color clips).
+            if not hasattr(media_file, "path"):
+                continue
+            # Add container data if not found.
+            if not hasattr(media_file, "container_data"):
+                media_file.container_data = None
                 
-        seq.profile = project.profile
-        fill_sequence_mlt(seq, project.SAVEFILE_VERSION)
-
-        handle_seq_watermark(seq)
+            # Use this to try to fix clips with missing proxy files.
+            proxy_path_dict[media_file.path] = media_file.second_file_path
+            
+            # Try to fix possible missing proxy files for media assets if we are in proxy mode.
+            if not _file_exists(media_file.path) and media_file.is_proxy_file and project_proxy_mode == appconsts.USE_PROXY_MEDIA:
+                if _file_exists(media_file.second_file_path): # Original media file exists, use it
+                    media_file.set_as_original_media_file()
+
+        if icons_and_thumnails == True:
+            _show_msg(_("Loading icons"))
+            _load_media_data(project)
+
+        # Add MLT objects to current sequence, other sequences are built when first activated.
+        for i in range(0, len(project.sequences)):
+            seq = project.sequences[i]
+            FIX_N_TO_3_SEQUENCE_COMPATIBILITY(seq)
+                
+            if not hasattr(seq, "compositing_mode"):
+                seq.compositing_mode = appconsts.COMPOSITING_MODE_TOP_DOWN_FREE_MOVE
 
-        if not hasattr(seq, "seq_len"):
-            seq.update_edit_tracks_length()
+            seq.profile = project.profile
+            seq.load_data = SequenceLoadData(sequence_savefile_versions[i], file_path, project_proxy_mode, proxy_path_dict)
 
-        seq_count = seq_count + 1
+        _show_msg(_("Building sequence ") + str(project.c_seq_index + 1))
+        build_sequence_mlt(project.sequences[project.c_seq_index])
+    finally:
+        # Files may be added or removed before other sequences are built.
+        _clear_prefetched_media_paths()
 
-    all_clips = {}
-    sync_clips = []
-                
-    if(not hasattr(project, "update_media_lengths_on_load")):
-        project.update_media_lengths_on_load = True # old projects < 1.10 had wrong media length data which just was never used.
-                                                    # 1.10 needed that data for the first time and required recreating it correctly for older projects
-    
-    if icons_and_thumnails == True:
-        _show_msg(_("Loading icons"))
-        for k, media_file in project.media_files.items():
-            media_file.create_icon()
-    
     project.c_seq = project.sequences[project.c_seq_index]
     if icons_and_thumnails == True:
         project.init_thumbnailer()
 
     return project
 
+def update_media_lengths(project, progress_callback=None):
+    """
+    Gets lengths of video and image sequence media files by probing them concurrently.
+    progress_callback(media_file) is called from pool threads after each file.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_THREADS) as executor:
+        futures = []
+        for k, media_file in project.media_files.items():
+            if media_file.type == appconsts.VIDEO or media_file.type == appconsts.IMAGE_SEQUENCE:
+                futures.append(executor.submit(_update_media_length, project.profile, media_file, progress_callback))
+        for future in futures:
+            future.result()
+
+    project.update_media_lengths_on_load = False
+
+def _update_media_length(profile, media_file, progress_callback):
+    producer = mlt.Producer(profile, str(media_file.path))
+    if producer.is_valid() == False:
+        print("not valid producer")
+    else:
+        media_file.length = producer.get_length()
+
+    if progress_callback != None:
+        progress_callback(media_file)
+
+def _load_media_data(project):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_THREADS) as executor:
+        futures = []
+        for k, media_file in project.media_files.items():
+            futures.append(executor.submit(media_file.create_icon))
+        for future in futures:
+            future.result()
+
+    # Old projects need media lengths recreated.
+    if project.update_media_lengths_on_load == True:
+        update_media_lengths(project)
+
+# -------------------------------------------------- media paths prefetch
+def _prefetch_media_paths(project):
+    """
+    Resolves saved media paths and checks which files exist for media files and current sequence clips.
+    Done concurrently because on network mounted media every lookup is a round trip.
+    """
+    global _prefetched_paths, _prefetched_file_exists
+    lookups = set()
+    check_paths = set()
+    for k, media_file in project.media_files.items():
+        if not hasattr(media_file, "path") or media_file.path == None:
+            continue
+        if media_file.is_proxy_file == False and media_file.type != appconsts.PATTERN_PRODUCER:
+            lookups.add((media_file.path, media_file.type == appconsts.IMAGE_SEQUENCE))
+        else:
+            check_paths.add(media_file.path)
+        if media_file.second_file_path != None:
+            check_paths.add(media_file.second_file_path)
+
+    for track in project.sequences[project.c_seq_index].tracks:
+        for clip in track.clips:
+            if clip.is_blanck_clip == True or clip.media_type == appconsts.PATTERN_PRODUCER:
+                continue
+            container_data = getattr(clip, "container_data", None)
+            if container_data != None:
+                check_paths.add(container_data.unrendered_media)
+                if container_data.rendered_media != None:
+                    check_paths.add(clip.path) # Rendered container clip media is not searched for.
+                    continue
+            lookups.add((clip.path, clip.media_type == appconsts.IMAGE_SEQUENCE))
+
+    lookups = list(lookups)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_THREADS) as executor:
+        resolved_paths = list(executor.map(_resolve_media_path, lookups))
+        check_paths.update(resolved_paths)
+        check_paths.discard(None)
+        check_paths = list(check_paths)
+        file_exists = list(executor.map(os.path.isfile, check_paths))
+
+    _prefetched_paths = dict(zip(lookups, resolved_paths))
+    _prefetched_file_exists = dict(zip(check_paths, file_exists))
+
+def _clear_prefetched_media_paths():
+    global _prefetched_paths, _prefetched_file_exists
+    _prefetched_paths = {}
+    _prefetched_file_exists = {}
+
+def _resolve_media_path(lookup):
+    path, is_img_seq = lookup
+    if is_img_seq == True:
+        return get_img_seq_media_path(path, _load_file_path)
+    else:
+        return get_media_asset_path(path, _load_file_path)
+
+def _get_media_path(path, is_img_seq):
+    try:
+        return _prefetched_paths[(path, is_img_seq)]
+    except KeyError:
+        return _resolve_media_path((path, is_img_seq))
+
+def _file_exists(path):
+    try:
+        return _prefetched_file_exists[path]
+    except KeyError:
+        return os.path.isfile(path)
+
+# -------------------------------------------------- sequence building
+def build_sequence_mlt(seq):
+    """
+    Creates MLT objects for a loaded sequence if they have not yet been created.
+    Raises FileProducerNotFoundError if sequence could not be built, sequence is then left unbuilt.
+    """
+    load_data = getattr(seq, "load_data", None)
+    if load_data == None:
+        return
+
+    # These may have been changed by saves and loads after sequence was loaded.
+    global _load_file_path, project_proxy_mode, proxy_path_dict, all_clips, sync_clips
+    _load_file_path = load_data.load_file_path
+    project_proxy_mode = load_data.proxy_mode
+    proxy_path_dict = load_data.proxy_path_dict
+
+    project = editorstate.project
+    c_seq = getattr(project, "c_seq", None)
+    py_seq_attrs = dict(seq.__dict__)
+    all_clips = {}
+    sync_clips = []
+    try:
+        fill_sequence_mlt(seq, load_data.savefile_version)
+        handle_seq_watermark(seq)
+    except:
+        seq.__dict__.clear()
+        seq.__dict__.update(py_seq_attrs)
+        raise
+    finally:
+        all_clips = {}
+        sync_clips = []
+        project.c_seq = c_seq # fill_sequence_mlt() sets this
+
+    if not hasattr(seq, "seq_len"):
+        seq.update_edit_tracks_length()
+
+    seq.load_data = None
+
+    # Building sequence added its sync clips to be monitored.
+    if c_seq != None and c_seq != seq:
+        resync.sequence_changed(c_seq)
+
 def fill_sequence_mlt(seq, SAVEFILE_VERSION):
     """
     Replaces sequences py objects with mlt objects
     """
     # Create tractor, field, multitrack
     seq.init_mlt_objects()
+    seq.reset_clip_index()
     
     # Grap and replace py tracks. Do this way to use same create
     # method as when originally created.
@@ -525,6 +826,9 @@ def fill_sequence_mlt(seq, SAVEFILE_VERSION):
             mlt_track.gain_filter.set("gain", str(mlt_track.audio_gain))
         if mlt_track.audio_pan != appconsts.NO_PAN:
             seq.add_track_pan_filter(mlt_track, mlt_track.audio_pan) # only rtack with non-center pan values have pan filters
+
+    # Saved clip ids were set after clips were added to tracks
+    seq.reset_clip_index()
     
     # Create and connect compositors.
     mlt_compositors = []
@@ -613,22 +917,19 @@ def fill_track_mlt(mlt_track, py_track):
 
             # Possibly do a relative file search to all but rendered container clip media, that needs to be re-rendered.
             if not(clip.container_data != None and clip.container_data.rendered_media != None):
-                if clip.media_type != appconsts.IMAGE_SEQUENCE:
-                    clip.path = get_media_asset_path(clip.path, _load_file_path)
-                else:
-                    clip.path = get_img_seq_media_path(clip.path, _load_file_path)
+                clip.path = _get_media_path(clip.path, clip.media_type == appconsts.IMAGE_SEQUENCE)
 
             # Try to fix possible missing proxy files for clips if we are in proxy mode.
-            if not os.path.isfile(clip.path) and project_proxy_mode == appconsts.USE_PROXY_MEDIA:
+            if not _file_exists(clip.path) and project_proxy_mode == appconsts.USE_PROXY_MEDIA:
                 try:
                     possible_orig_file_path = proxy_path_dict[clip.path] # This dict was filled with media file data.
-                    if os.path.isfile(possible_orig_file_path): # Original media file exists, use it
+                    if _file_exists(possible_orig_file_path): # Original media file exists, use it
                         clip.path = possible_orig_file_path
                 except:
                     pass # missing proxy file fix has failed
 
             # If container clip rendered media is missing try to use unrendered media.
-            if not os.path.isfile(clip.path) and clip.container_data != None:
+            if not _file_exists(clip.path) and clip.container_data != None:
                 if clip.path != clip.container_data.unrendered_media:
                     clip.path = clip.container_data.unrendered_media
                     clip.container_data.clear_rendered_media()
@@ -712,6 +1013,7 @@ def append_clip(track, clip, clip_in, clip_out):
     clip.clip_out = clip_out
     track.clips.append(clip) # py
     track.append(clip, clip_in, clip_out) # mlt
+    track.sequence.clip_added_to_track(clip, track)
     resync.clip_added_to_timeline(clip, track)
 
 # --------------------------------------------------------- watermarks
@@ -725,6 +1027,34 @@ def handle_seq_watermark(seq):
         seq.watermark_filter = None
         seq.watermark_file_path = None
 
+def get_unbuilt_clip_path(seq, clip):
+    """
+    Returns media path that clip of a sequence that has not yet been built
+    will have after sequence is built. Saved clip paths are resolved and mapped
+    to original media when sequence is built, see fill_track_mlt().
+    """
+    load_data = seq.load_data
+    path = clip.path
+    container_data = getattr(clip, "container_data", None)
+    if not(container_data != None and container_data.rendered_media != None):
+        if clip.media_type == appconsts.IMAGE_SEQUENCE:
+            path = get_img_seq_media_path(path, load_data.load_file_path)
+        else:
+            path = get_media_asset_path(path, load_data.load_file_path)
+
+    if not os.path.isfile(path) and load_data.proxy_mode == appconsts.USE_PROXY_MEDIA:
+        try:
+            possible_orig_file_path = load_data.proxy_path_dict[path]
+            if os.path.isfile(possible_orig_file_path):
+                path = possible_orig_file_path
+        except KeyError:
+            pass
+
+    if not os.path.isfile(path) and container_data != None:
+        path = container_data.unrendered_media
+
+    return path
+
 # --------------------------------------------------------- relative paths
 def get_media_asset_path(path, load_file_path):
     # Load order absolute, relative
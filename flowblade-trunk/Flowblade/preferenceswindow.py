@@ -28,6 +28,7 @@ import dialogutils
 import editorpersistance
 import gui
 import guiutils
+import memorycache
 import mltprofiles
 import multiprocessing
 import utils
@@ -75,6 +76,7 @@ def _preferences_dialog_callback(dialog, response_id, all_widgets):
     if response_id == Gtk.ResponseType.ACCEPT:
         editorpersistance.update_prefs_from_widgets(all_widgets)
         editorpersistance.save()
+        memorycache.set_budget(editorpersistance.prefs.memory_cache_size * 1000000)
         dialog.destroy()
         primary_txt = _("Restart required for some setting changes to take effect.")
         secondary_txt = _("If requested change is not in effect, restart application.")
@@ -480,25 +482,66 @@ def _performance_panel():
     perf_drop_frames = Gtk.CheckButton()
     perf_drop_frames.set_active(prefs.perf_drop_frames)
 
+    levels_spin_adj = Gtk.Adjustment(value=prefs.audio_levels_render_processes, lower=1, upper=multiprocessing.cpu_count(), step_incr=1)
+    audio_levels_processes = Gtk.SpinButton(adjustment=levels_spin_adj)
+    audio_levels_processes.set_numeric(True)
+
+    cache_spin_adj = Gtk.Adjustment(value=prefs.memory_cache_size, lower=32, upper=16000, step_incr=32)
+    memory_cache_size = Gtk.SpinButton(adjustment=cache_spin_adj)
+    memory_cache_size.set_numeric(True)
+
+    undo_spin_adj = Gtk.Adjustment(value=prefs.undo_memory_budget, lower=64, upper=16000, step_incr=64)
+    undo_memory_budget = Gtk.SpinButton(adjustment=undo_spin_adj)
+    undo_memory_budget.set_numeric(True)
+
+    trim_entries_spin_adj = Gtk.Adjustment(value=prefs.trim_clips_cache_entries, lower=1, upper=500, step_incr=1)
+    trim_cache_entries = Gtk.SpinButton(adjustment=trim_entries_spin_adj)
+    trim_cache_entries.set_numeric(True)
+
+    trim_size_spin_adj = Gtk.Adjustment(value=prefs.trim_clips_cache_size, lower=64, upper=16000, step_incr=64)
+    trim_cache_size = Gtk.SpinButton(adjustment=trim_size_spin_adj)
+    trim_cache_size.set_numeric(True)
+
+    render_in_jobs_queue = Gtk.CheckButton()
+    render_in_jobs_queue.set_active(prefs.render_timeline_in_jobs_queue)
+
     # Tooltips
     perf_render_threads.set_tooltip_text(_("Between 1 and the number of CPU Cores"))
     perf_drop_frames.set_tooltip_text(_("Allow Frame Dropping for real-time rendering, when needed"))
+    audio_levels_processes.set_tooltip_text(_("Number of media files that have their audio levels rendered in parallel"))
+    memory_cache_size.set_tooltip_text(_("Memory used for audio levels and thumbnails, least recently used data is dropped when exceeded"))
+    undo_memory_budget.set_tooltip_text(_("Estimated memory used by clips kept for undo, oldest undos are dropped when exceeded"))
+    trim_cache_entries.set_tooltip_text(_("Number of media files kept open for quicker Trim tool inits"))
+    trim_cache_size.set_tooltip_text(_("Estimated memory used by media files kept open for Trim tool, least recently used are closed when exceeded"))
+    render_in_jobs_queue.set_tooltip_text(_("Render timeline in a low priority background process so that editing and playback stay available"))
 
     # Layout
     row0 = _row(guiutils.get_left_justified_box([warning_icon, warning_label]))
     row1 = _row(guiutils.get_two_column_box(Gtk.Label(label=_("Render Threads:")), perf_render_threads, PREFERENCES_LEFT))
     row2 = _row(guiutils.get_checkbox_row_box(perf_drop_frames, Gtk.Label(label=_("Allow Frame Dropping"))))
+    row3 = _row(guiutils.get_two_column_box(Gtk.Label(label=_("Audio Levels Render Processes:")), audio_levels_processes, PREFERENCES_LEFT))
+    row4 = _row(guiutils.get_two_column_box(Gtk.Label(label=_("Memory Cache Size (MB):")), memory_cache_size, PREFERENCES_LEFT))
+    row5 = _row(guiutils.get_two_column_box(Gtk.Label(label=_("Undo Memory Budget (MB):")), undo_memory_budget, PREFERENCES_LEFT))
+    row6 = _row(guiutils.get_two_column_box(Gtk.Label(label=_("Trim Clips Cache Files:")), trim_cache_entries, PREFERENCES_LEFT))
+    row7 = _row(guiutils.get_two_column_box(Gtk.Label(label=_("Trim Clips Cache Size (MB):")), trim_cache_size, PREFERENCES_LEFT))
+    row8 = _row(guiutils.get_checkbox_row_box(render_in_jobs_queue, Gtk.Label(label=_("Render Timeline In Jobs Queue"))))
 
     vbox = Gtk.VBox(False, 2)
     vbox.pack_start(row0, False, False, 0)
     vbox.pack_start(guiutils.pad_label(12, 12), False, False, 0)
     vbox.pack_start(row1, False, False, 0)
     vbox.pack_start(row2, False, False, 0)
+    vbox.pack_start(row3, False, False, 0)
+    vbox.pack_start(row4, False, False, 0)
+    vbox.pack_start(row5, False, False, 0)
+    vbox.pack_start(row6, False, False, 0)
+    vbox.pack_start(row7, False, False, 0)
+    vbox.pack_start(row8, False, False, 0)
     vbox.pack_start(Gtk.Label(), True, True, 0)
 
     guiutils.set_margins(vbox, 12, 0, 12, 12)
 
-    return vbox, (perf_render_threads, perf_drop_frames)
+    return vbox, (perf_render_threads, perf_drop_frames, audio_levels_processes, memory_cache_size, undo_memory_budget, trim_cache_entries, trim_cache_size, render_in_jobs_queue)
 
 def _row(row_cont):
     row_cont.set_size_request(10, 26)
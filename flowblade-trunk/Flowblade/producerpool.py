@@ -0,0 +1,104 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module keeps a pool of probed file producers so that media files are probed only once.
+
+Creating a MLT file producer probes the media file and this can take 0.5s+ for some files.
+For each (path, profile, ttl) combination one parent producer is created and kept here. Clip
+producers for video and audio files are then created with "avformat-novalidate" service that
+does not probe the file, and media properties are copied from the parent producer. This
+is the same thing MLT does when loading its XML files.
+
+Clips cannot be MLT cuts of the shared parent producer because filters are attached
+to clip producers and MLT playlists create new cuts from parent when clips are added.
+
+Other producers are not pooled and are created normally.
+"""
+
+import os
+import threading
+
+import mlt
+
+import mltrefhold
+
+POOLED_SERVICE = "avformat"
+NOVALIDATE_SERVICE = "avformat-novalidate"
+
+_parents = {} # (path, profile description, ttl) -> (file modification time, parent producer or None if not poolable)
+_lock = threading.Lock()
+
+
+def _get_pooled_producers():
+    with _lock:
+        return list(_parents.values())
+
+mltrefhold.add_roots_provider(_get_pooled_producers)
+
+def get_producer(profile, path, ttl=None):
+    """
+    Returns new mlt.Producer for path, it may be invalid if file could not be opened.
+    """
+    key = (str(path), profile.description(), ttl)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    with _lock:
+        try:
+            parent_mtime, parent = _parents[key]
+            if parent_mtime != mtime:
+                raise KeyError
+            pooled = True
+        except KeyError:
+            pooled = False
+
+    if pooled == False:
+        # Probing is done outside lock, media files may be probed from loading and GUI threads.
+        producer = mlt.Producer(profile, str(path))
+        if producer.is_valid() == False or producer.get("mlt_service") != POOLED_SERVICE:
+            with _lock:
+                _parents[key] = (mtime, None)
+            return producer
+
+        mltrefhold.hold_ref(producer)
+        parent = producer
+        with _lock:
+            _parents[key] = (mtime, parent)
+
+    if parent == None:
+        return mlt.Producer(profile, str(path))
+
+    return _create_from_parent(profile, path, parent)
+
+def _create_from_parent(profile, path, parent):
+    producer = mlt.Producer(profile, NOVALIDATE_SERVICE, str(path))
+    # Properties beginning with "_" are internal to parent producer.
+    for i in range(0, parent.count()):
+        name = parent.get_name(i)
+        if name.startswith("_"):
+            continue
+        value = parent.get(name)
+        if value != None:
+            producer.set(name, value)
+
+    return producer
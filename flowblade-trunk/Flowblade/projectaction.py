@@ -23,6 +23,7 @@ Module handles user actions that are not edits on the current sequence.
 Load, save, add media file, etc...
 """
 
+import concurrent.futures
 import copy
 import datetime
 import glob
@@ -45,6 +46,7 @@ from gi.repository import GLib
 import app
 import audiowaveformrenderer
 import appconsts
+import autosave
 import batchrendering
 import containerprogramedit
 import clipeffectseditor
@@ -101,6 +103,10 @@ force_proxy = False
 # This is needed to pass only one event for double click, double init for monitor click possibly somewhat unstable
 _media_panel_double_click_counter = 0
 
+# Media import
+MEDIA_IMPORT_THREADS = 4
+MEDIA_PANEL_REFRESH_INTERVAL = 0.5 # seconds
+
 
 #--------------------------------------- worker threads
 class LoadThread(threading.Thread):
@@ -235,23 +241,38 @@ class AddMediaFilesThread(threading.Thread):
         target_bin = PROJECT().c_bin
         succes_new_file = None
         filenames = self.filenames
+
+        media_paths = PROJECT().get_media_files_path_index()
+        new_files = []
         for new_file in filenames:
             (folder, file_name) = os.path.split(new_file)
-            if PROJECT().media_file_exists(new_file):
+            if new_file in media_paths:
                 duplicates.append(file_name)
             else:
+                new_files.append(new_file)
+                media_paths[new_file] = None
+
+        # Files are probed and thumbnailed concurrently, and added to project in selection order.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MEDIA_IMPORT_THREADS) as executor:
+            futures = []
+            for new_file in new_files:
+                futures.append(executor.submit(PROJECT().get_media_file_data, new_file))
+
+            last_refresh_time = time.time()
+            for new_file, future in zip(new_files, futures):
                 try:
-                    PROJECT().add_media_file(new_file, self.compound_clip_name, target_bin)
+                    PROJECT().add_media_file(new_file, self.compound_clip_name, target_bin, future.result())
                     succes_new_file = new_file
                 except projectdata.ProducerNotValidError as err:
                     print(err.__str__())
                     dialogs.not_valid_producer_dialog(err.value, gui.editor_window.window)
-            
-            Gdk.threads_enter()
-            gui.media_list_view.fill_data_model()
-            max_val = gui.editor_window.media_scroll_window.get_vadjustment().get_upper()
-            gui.editor_window.media_scroll_window.get_vadjustment().set_value(max_val)
-            Gdk.threads_leave()
+
+                # Media panel is refreshed in batches because refreshing it gets slow with a lot of media.
+                if time.time() - last_refresh_time > MEDIA_PANEL_REFRESH_INTERVAL:
+                    self._refresh_media_panel()
+                    last_refresh_time = time.time()
+
+        self._refresh_media_panel()
 
         add_count = len(filenames) - len(duplicates)
         project_event = projectdata.ProjectEvent(projectdata.EVENT_MEDIA_ADDED, str(add_count))
@@ -280,6 +301,13 @@ class AddMediaFilesThread(threading.Thread):
             
         audiowaveformrenderer.launch_audio_levels_rendering(filenames)
 
+    def _refresh_media_panel(self):
+        Gdk.threads_enter()
+        gui.media_list_view.fill_data_model()
+        max_val = gui.editor_window.media_scroll_window.get_vadjustment().get_upper()
+        gui.editor_window.media_scroll_window.get_vadjustment().set_value(max_val)
+        Gdk.threads_leave()
+
 
 class UpdateMediaLengthsThread(threading.Thread):
     
@@ -294,27 +322,18 @@ class UpdateMediaLengthsThread(threading.Thread):
         time.sleep(0.1)
         Gdk.threads_leave()
 
-        for key, media_file in PROJECT().media_files.items():
-            if media_file.type == appconsts.VIDEO or media_file.type == appconsts.IMAGE_SEQUENCE:
-                Gdk.threads_enter()
-                dialog.info.set_text(media_file.name)
-                Gdk.threads_leave()
-        
-                producer = mlt.Producer(PROJECT().profile, str(media_file.path))
-                if producer.is_valid() == False:
-                    print("not valid producer")
-                    continue
-
-                length = producer.get_length()
-                media_file.length = length
-                
-        PROJECT().update_media_lengths_on_load = False
+        persistance.update_media_lengths(PROJECT(), lambda media_file: self._media_file_done(dialog, media_file))
         
         Gdk.threads_enter()
         dialog.destroy()
         Gdk.threads_leave()
         
         print("Updating media lengths done.")
+
+    def _media_file_done(self, dialog, media_file):
+        Gdk.threads_enter()
+        dialog.info.set_text(media_file.name)
+        Gdk.threads_leave()
         
 def _duplicates_info(duplicates):
     primary_txt = _("Media files already present in project were opened!")
@@ -648,6 +667,7 @@ class SnaphotSaveThread(threading.Thread):
         # from media file objects should be covered as media files can't be destroyed 
         # if a clip made from them exists...I think
         for seq in PROJECT().sequences:
+            seq_unbuilt = (getattr(seq, "load_data", None) != None)
             for track in seq.tracks:
                 for i in range(0, len(track.clips)):
                     clip = track.clips[i]
@@ -658,15 +678,22 @@ class SnaphotSaveThread(threading.Thread):
 
                     # Only producer clips are affected
                     if (clip.is_blanck_clip == False and (clip.media_type != appconsts.PATTERN_PRODUCER)):
-                        directory, file_name = os.path.split(clip.path)
+                        # Clips of sequences that have not been built still have their saved paths.
+                        clip_path = clip.path
+                        if seq_unbuilt == True:
+                            clip_path = persistance.get_unbuilt_clip_path(seq, clip)
+                            if clip_path in asset_paths: # Media file for clip was copied above
+                                asset_paths[clip.path] = asset_paths[clip_path]
+                                continue
+
+                        directory, file_name = os.path.split(clip_path)
                         clip_file_copy = media_folder + file_name
                         
                         if not os.path.isfile(clip_file_copy):
-                            directory, file_name = os.path.split(clip.path)
                             Gdk.threads_enter()
                             dialog.media_copy_info.set_text(copy_txt + "... " +  file_name)
                             Gdk.threads_leave()
-                            shutil.copyfile(clip.path, clip_file_copy) # only rendered files are copied here
+                            shutil.copyfile(clip_path, clip_file_copy) # only rendered files are copied here
                             asset_paths[clip.path] = clip_file_copy # This stuff is already md5 hashed, so no duplicate problems here
             for compositor in seq.compositors:
                 if compositor.type_id == "##wipe": # Wipe may have user luma and needs to be looked up relatively
@@ -819,11 +846,15 @@ def do_rendering():
     force_overwrite = False
     force_proxy = False
     
-    success = _write_out_render_item(True)
+    if editorpersistance.prefs.render_timeline_in_jobs_queue == True:
+        success = _launch_render_job()
+    else:
+        success = _write_out_render_item(True)
     if success:
         render_selections = render.get_current_gui_selections()
         PROJECT().set_project_property(appconsts.P_PROP_LAST_RENDER_SELECTIONS, render_selections)
-        batchrendering.launch_single_rendering()
+        if editorpersistance.prefs.render_timeline_in_jobs_queue == False:
+            batchrendering.launch_single_rendering()
         
         project_event = projectdata.ProjectEvent(projectdata.EVENT_RENDERED, str(render.get_file_path()))
         PROJECT().events.append(project_event)
@@ -848,12 +879,28 @@ def _proxy_confirm_dialog_callback(dialog, response_id):
 def add_to_render_queue():
     _write_out_render_item(False)
 
-def _write_out_render_item(single_render_item_item):
-    # Get render arga and path
+def _launch_render_job():
     args_vals_list = render.get_args_vals_list_for_current_selections()
-    render_path = render.get_file_path()
+    if args_vals_list == None:
+        return False
 
-    # Get render start and end points
+    render_range = _get_render_range()
+    if render_range == None:
+        return False
+    start_frame, end_frame = render_range
+
+    try:
+        render.launch_timeline_render_job(render.get_file_path(), args_vals_list, render.get_current_profile(), start_frame, end_frame)
+    except Exception as e:
+        primary_txt = _("Render launch failed!")
+        secondary_txt = _("Error message: ") + str(e)
+        dialogutils.warning_message(primary_txt, secondary_txt, gui.editor_window.window, is_info=False)
+        return False
+
+    return True
+
+def _get_render_range():
+    # Returns (start_frame, end_frame) or None if range is selected but not defined.
     if render.widgets.range_cb.get_active() == 0:
         start_frame = 0
         end_frame = -1 # renders till finish
@@ -865,7 +912,20 @@ def _write_out_render_item(single_render_item_item):
     if start_frame == -1 or end_frame == -1:
         if render.widgets.range_cb.get_active() == 1:
             rendergui.no_good_rander_range_info()
-            return False
+            return None
+
+    return (start_frame, end_frame)
+
+def _write_out_render_item(single_render_item_item):
+    # Get render arga and path
+    args_vals_list = render.get_args_vals_list_for_current_selections()
+    render_path = render.get_file_path()
+
+    # Get render start and end points
+    render_range = _get_render_range()
+    if render_range == None:
+        return False
+    start_frame, end_frame = render_range
 
     # Create batchrendering.RenderData object.
     # batchrendering.RenderData object is only used to display info about render,
@@ -1264,10 +1324,15 @@ def remove_unused_media():
     
     # Remove all items from created dict that have a clip with same path on any of the sequences
     for seq in PROJECT().sequences:
+        seq_unbuilt = (getattr(seq, "load_data", None) != None)
         for track in seq.tracks:
             for clip in track.clips:
                 try:
-                    removed = path_to_media_object.pop(clip.path)
+                    clip_path = clip.path
+                    # Clips of sequences that have not been built still have their saved paths.
+                    if seq_unbuilt == True and clip.is_blanck_clip == False and clip.media_type != appconsts.PATTERN_PRODUCER:
+                        clip_path = persistance.get_unbuilt_clip_path(seq, clip)
+                    removed = path_to_media_object.pop(clip_path)
                 except:
                     pass
     
@@ -1416,6 +1481,8 @@ def _do_create_sequence_compound_clip_from_selected(dialog, response_id, name_en
     (model, rows) = selection.get_selected_rows()
     row = max(rows[0])
     selected_sequence = PROJECT().sequences[row]
+    if build_sequence(selected_sequence) == False:
+        return
 
     render_player = renderconsumer.XMLRenderPlayer( write_file, _sequence_xml_compound_render_done_callback, 
                                                     (write_file, media_name), selected_sequence, 
@@ -1673,6 +1740,23 @@ def move_files_to_bin(new_bin, bin_indexes):
     
     
 # ------------------------------------ sequences
+def build_sequence(seq):
+    """
+    Creates MLT objects for sequence if not yet created after project load.
+    Returns False and informs user if sequence could not be built.
+    """
+    try:
+        persistance.build_sequence_mlt(seq)
+    except persistance.FileProducerNotFoundError as e:
+        primary_txt = _("Media asset was missing!")
+        secondary_txt = _("Path of missing asset:") + "\n   <b>" + e.value + "</b>\n\n" + \
+                        _("Sequence '") + seq.name + _("' could not be opened.") + "\n\n" + \
+                        _("Open project in 'Media Relinker' tool to relink media assets to new files.")
+        dialogutils.warning_message(primary_txt, secondary_txt, gui.editor_window.window)
+        return False
+
+    return True
+
 def change_edit_sequence():
     selection = gui.sequence_list_view.treeview.get_selection()
     (model, rows) = selection.get_selected_rows()
@@ -1809,9 +1893,11 @@ def _delete_confirm_callback(dialog, response_id):
     model.remove(iter)
     PROJECT().sequences.pop(row)
     
-    # If we deleted current sequence, open first sequence
+    # If we deleted current sequence, open first sequence that can be opened
     if row == current_index:
-        app.change_current_sequence(0)
+        for i in range(0, len(PROJECT().sequences)):
+            if app.change_current_sequence(i) == True:
+                break
     
     _enable_save()
 
@@ -1859,6 +1945,7 @@ def _change_track_count_dialog_callback(dialog, response_id, tracks_select):
     if current_sequence().compositing_mode == appconsts.COMPOSITING_MODE_STANDARD_FULL_TRACK:
         # Put track compositors back
         current_sequence().add_full_track_compositors()
+        autosave.project_changed()
 
     tlinerender.get_renderer().timeline_changed()
 
@@ -1874,6 +1961,9 @@ def _combine_sequences_dialog_callback(dialog, response_id, action_select, seq_s
     seq = selectable_seqs[seq_select.get_active()]
     
     dialog.destroy()
+
+    if build_sequence(seq) == False:
+        return
     
     if action == 0:
         _append_sequence(seq)
@@ -32,6 +32,7 @@ from gi.repository import GdkPixbuf
 import appconsts
 import editorpersistance
 from editorstate import PROJECT
+import mediametadata
 import mltprofiles
 import patternproducer
 import miscdataobjects
@@ -116,23 +117,17 @@ class Project:
         media_object.name = name
         media_object.ttl = ttl
 
-    def add_media_file(self, file_path, compound_clip_name=None, target_bin=None):
+    def add_media_file(self, file_path, compound_clip_name=None, target_bin=None, media_data=None):
         """
         Adds media file to project if exists and file is of right type.
+        media_data is tuple returned by get_media_file_data() if it has already been created.
         """
         (directory, file_name) = os.path.split(file_path)
         (name, ext) = os.path.splitext(file_name)
 
-        # Get media type
-        media_type = sequence.get_media_type(file_path)
-
-        # Get length and icon
-        if media_type == appconsts.AUDIO:
-            icon_path = respaths.IMAGE_PATH + "audio_file.png"
-            length = thumbnailer.get_file_length(file_path)
-            info = None
-        else: # For non-audio we need write a thumbbnail file and get file lengh while we're at it
-             (icon_path, length, info) = thumbnailer.write_image(file_path)
+        if media_data == None:
+            media_data = self.get_media_file_data(file_path)
+        media_type, length, icon_path, info = media_data
 
         # Hide file extension if enabled in user preferences
         clip_name = file_name
@@ -153,6 +148,24 @@ class Project:
         
         return media_object
 
+    def get_media_file_data(self, file_path):
+        """
+        Returns (media_type, length, icon_path, info) tuple for media file.
+        This does not change project data and can be called from several threads at the same time.
+        """
+        # Get media type
+        media_type = sequence.get_media_type(file_path)
+
+        # Get length and icon
+        if media_type == appconsts.AUDIO:
+            icon_path = respaths.IMAGE_PATH + "audio_file.png"
+            length = thumbnailer.get_file_length(file_path)
+            info = None
+        else: # For non-audio we need write a thumbbnail file and get file lengh while we're at it
+             (icon_path, length, info) = thumbnailer.write_image(file_path)
+
+        return (media_type, length, icon_path, info)
+
     def add_pattern_producer_media_object(self, media_object):
         self._add_media_object(media_object)
         
@@ -181,6 +194,17 @@ class Project:
 
         return False
 
+    def get_media_files_path_index(self):
+        """
+        Returns dict file path -> MediaFile for checking many paths without scanning all media files for each.
+        """
+        path_index = {}
+        for key, media_file in self.media_files.items():
+            if media_file.type == appconsts.PATTERN_PRODUCER:
+                continue
+            path_index[media_file.path] = media_file
+        return path_index
+
     def get_media_file_for_path(self, file_path):
         for key, media_file in list(self.media_files.items()):
             if media_file.type == appconsts.PATTERN_PRODUCER:
@@ -464,10 +488,16 @@ class Thumbnailer:
     def set_context(self, profile):
         self.profile = profile
     
-    def write_image(self, file_path):
+    def write_image(self, file_path, use_cache=True):
         """
-        Writes thumbnail image from file producer
+        Writes thumbnail image from file producer, or uses thumbnail and data
+        from media metadata cache if file has not changed after it was cached.
         """
+        if use_cache == True:
+            metadata = mediametadata.get_metadata(file_path, self.profile)
+            if metadata != None and metadata.thumbnail_path != None:
+                return (metadata.thumbnail_path, metadata.length, metadata.info)
+
         # Get data
         md_str = hashlib.md5(file_path.encode('utf-8')).hexdigest()
         thumbnail_path = userfolders.get_cache_dir() + appconsts.THUMBNAILS_DIR + "/" + md_str +  ".png"
@@ -492,16 +522,24 @@ class Thumbnailer:
         # Connect and write image
         consumer.connect(producer)
         consumer.run()
-        
+
+        mediametadata.write_metadata(file_path, self.profile, length, info, thumbnail_path)
+
         return (thumbnail_path, length, info)
 
     def get_file_length(self, file_path):
         # This is used for audio files which don't need a thumbnail written
         # but do need file length known
+        metadata = mediametadata.get_metadata(file_path, self.profile)
+        if metadata != None:
+            return metadata.length
 
         # Create one frame producer
         producer = mlt.Producer(self.profile, str(file_path))
-        return producer.get_length()
+        length = producer.get_length()
+        if producer.is_valid() == True:
+            mediametadata.write_metadata(file_path, self.profile, length, None, None)
+        return length
 
 
 # ----------------------------------- project and media log events
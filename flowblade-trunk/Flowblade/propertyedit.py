@@ -37,6 +37,7 @@ import gui
 import mlttransitions
 import mltfilters
 import propertyparse
+import tlinerender
 import utils
 
 import traceback
@@ -404,6 +405,8 @@ class EditableProperty(AbstractProperty):
         filter_object = self._get_filter_object()
         prop = (str(self.name), str(str_value), self.type)
         filter_object.properties[self.property_index] = prop
+        if not self.is_compositor_filter:
+            tlinerender.clip_filters_changed(self.clip)
 
 
 class TransitionEditableProperty(AbstractProperty):
@@ -885,6 +888,7 @@ class MultipartKeyFrameProperty(AbstractProperty):
         self.value = val_str
         filter_object = self.clip.filters[self.filter_index]
         filter_object.update_value(val_str, self.clip, current_sequence().profile)
+        tlinerender.clip_filters_changed(self.clip)
 
 
 class AffineScaleProperty(EditableProperty):
@@ -24,25 +24,26 @@ import mlt
 import os
 import shutil
 import threading
-import time
 
 from gi.repository import Gtk, Gdk
 
-import app
 import appconsts
 import atomicfile
+import clipeffectseditor
 import dialogs
 import dialogutils
+import edit
 import editorpersistance
 import editorstate
 import gui
 import guiutils
 import jobs
 import mltrefhold
-import persistance
-import render
+import movemodes
 import renderconsumer
-import sequence
+import resync
+import undo
+import updater
 import utils
 import userfolders
 
@@ -52,7 +53,6 @@ proxy_render_issues_window = None
 
 render_thread = None
 runner_thread = None
-load_thread = None
 
 # These are made to correspond with size selector combobox indexes on manager window
 PROXY_SIZE_FULL = appconsts.PROXY_SIZE_FULL
@@ -545,131 +545,124 @@ def _proxy_render_stopped():
 
 # ----------------------------------------------------------- changing proxy modes
 def _convert_to_proxy_project():    
-    editorstate.PROJECT().proxy_data.proxy_mode = appconsts.CONVERTING_TO_USE_PROXY_MEDIA
-    conv_temp_project_path = userfolders.get_cache_dir() + "proxy_conv.flb"
     manager_window.convert_progress_bar.set_text(_("Converting Project to Use Proxy Media"))
-    
-    mark_in = editorstate.PROJECT().c_seq.tractor.mark_in
-    mark_out = editorstate.PROJECT().c_seq.tractor.mark_out
-    
-    persistance.save_project(editorstate.PROJECT(), conv_temp_project_path)
-    global load_thread
-    load_thread = ProxyProjectLoadThread(conv_temp_project_path, manager_window.convert_progress_bar, mark_in, mark_out)
-    load_thread.start()
+    _swap_project_media(True)
+    _converting_proxy_mode_done()
 
 def _convert_to_original_media_project():
-    editorstate.PROJECT().proxy_data.proxy_mode = appconsts.CONVERTING_TO_USE_ORIGINAL_MEDIA
-    conv_temp_project_path = userfolders.get_cache_dir() + "proxy_conv.flb"
     manager_window.convert_progress_bar.set_text(_("Converting to Use Original Media"))
-
-    mark_in = editorstate.PROJECT().c_seq.tractor.mark_in
-    mark_out = editorstate.PROJECT().c_seq.tractor.mark_out
-    
-    persistance.save_project(editorstate.PROJECT(), conv_temp_project_path)
-    global load_thread
-    load_thread = ProxyProjectLoadThread(conv_temp_project_path, manager_window.convert_progress_bar, mark_in, mark_out)
-    load_thread.start()
+    _swap_project_media(False)
+    _converting_proxy_mode_done()
 
 def _auto_re_convert_after_proxy_render_in_proxy_mode():
-
-    editorstate.project_is_loading = True
-
-    # Save to temp to convert to using original media
-    project = editorstate.PROJECT()
-    project.proxy_data.proxy_mode = appconsts.CONVERTING_TO_USE_ORIGINAL_MEDIA
-    conv_temp_project_path = userfolders.get_cache_dir() + "proxy_conv.flb"
-    persistance.save_project(editorstate.PROJECT(), conv_temp_project_path)
-    project.proxy_data.proxy_mode = appconsts.USE_ORIGINAL_MEDIA
-
-    # Load saved temp original media project
-    persistance.show_messages = False
-    project = persistance.load_project(conv_temp_project_path)
-    
-    # Save to temp to convert back to using proxy media
-    project.proxy_data.proxy_mode = appconsts.CONVERTING_TO_USE_PROXY_MEDIA
-    persistance.save_project(project, conv_temp_project_path)
-    
-    # Load saved temp proxy project
-    project = persistance.load_project(conv_temp_project_path)
-    project.proxy_data.proxy_mode = appconsts.USE_PROXY_MEDIA
-        
-    editorstate.project_is_loading = False
-            
-    # Open saved temp project
-    app.stop_autosave()
-
-    Gdk.threads_enter()
-    app.open_project(project)
-    Gdk.threads_leave()
-
-    app.start_autosave()
-    
+    # Rendered proxy files have been set as media file paths, clips using them are updated here.
+    _swap_project_media(True)
     editorstate.update_current_proxy_paths()
-    
-    persistance.show_messages = True
+    gui.media_list_view.widget.queue_draw()
 
 def _converting_proxy_mode_done():
-    global load_thread
-    load_thread = None
-
     editorstate.update_current_proxy_paths()
     
     manager_window.update_proxy_mode_display()
     gui.media_list_view.widget.queue_draw()
     gui.tline_left_corner.update_gui()
     set_menu_to_proxy_state()
-    
 
-class ProxyProjectLoadThread(threading.Thread):
 
-    def __init__(self, proxy_project_path, progressbar, mark_in, mark_out):
-        threading.Thread.__init__(self)
-        self.proxy_project_path = proxy_project_path
-        self.progressbar = progressbar
-        self.mark_in = mark_in
-        self.mark_out = mark_out
-    
-    def run(self):
-        pulse_runner = guiutils.PulseThread(self.progressbar)
-        pulse_runner.start()
-        time.sleep(2.0)
-        persistance.show_messages = False
-        try:
-            Gdk.threads_enter()
-            project = persistance.load_project(self.proxy_project_path)
-            sequence.set_track_counts(project)
-            Gdk.threads_leave()
-        except persistance.FileProducerNotFoundError as e:
-            print("did not find file:", e)
-
-        pulse_runner.running = False
-        time.sleep(0.3) # need to be sure pulse_runner has stopped
-        
-        project.c_seq.tractor.mark_in = self.mark_in
-        project.c_seq.tractor.mark_out = self.mark_out
+# ----------------------------------------------------------- media swap
+def _swap_project_media(to_proxy):
+    """
+    Switches media files between original and proxy media and replaces clips
+    using switched media with clips using new media files.
     
-        app.stop_autosave()
+    Filters, compositors, sync relations and undo stack are kept. Clips with 
+    media that has no proxy file, or whose new media file is missing, are not changed.
+    """
+    project = editorstate.PROJECT()
+    path_map = _set_media_files_proxy_state(project, to_proxy)
+    if to_proxy:
+        proxy_mode = appconsts.USE_PROXY_MEDIA
+    else:
+        proxy_mode = appconsts.USE_ORIGINAL_MEDIA
 
-        Gdk.threads_enter()
-        app.open_project(project)
-        Gdk.threads_leave()
+    movemodes.clear_selected_clips()
+    clipeffectseditor.clear_clip()
 
-        # Loaded project has been converted, set proxy mode to correct mode 
-        if project.proxy_data.proxy_mode == appconsts.CONVERTING_TO_USE_PROXY_MEDIA:
-            project.proxy_data.proxy_mode = appconsts.USE_PROXY_MEDIA
+    replaced_clips = {} # id(old clip) -> new clip
+    old_clips = [] # Old clips are kept alive until done so that ids in replaced_clips stay valid.
+    for seq in project.sequences:
+        if getattr(seq, "load_data", None) != None:
+            _swap_unbuilt_sequence_media(seq, path_map, proxy_mode)
         else:
-            project.proxy_data.proxy_mode = appconsts.USE_ORIGINAL_MEDIA
+            _swap_sequence_media(seq, path_map, replaced_clips, old_clips)
+    
+    replaced_clips.update(undo.media_paths_changed(replaced_clips, path_map))
+    for seq in project.sequences:
+        if getattr(seq, "load_data", None) == None:
+            for track in seq.tracks:
+                for clip in track.clips:
+                    undo.replace_sync_master_clip(clip, replaced_clips)
+
+    project.proxy_data.proxy_mode = proxy_mode
+
+    editorstate.clear_trim_clip_cache()
+    resync.sequence_changed(project.c_seq)
+    updater.repaint_tline()
+    editorstate.PLAYER().seek_frame(editorstate.PLAYER().current_frame())
+
+def _set_media_files_proxy_state(project, to_proxy):
+    # Returns dict old path -> new path for media files used by clips.
+    path_map = {}
+    for media_file in project.media_files.values():
+        if not hasattr(media_file, "path") or media_file.has_proxy_file == False:
+            continue # color clips and media without proxy files
+        if media_file.is_proxy_file != to_proxy and _media_exists(media_file, media_file.second_file_path):
+            if to_proxy:
+                media_file.set_as_proxy_media_file()
+            else:
+                media_file.set_as_original_media_file()
+        if media_file.is_proxy_file == to_proxy:
+            path_map[media_file.second_file_path] = media_file.path
+
+    return path_map
+
+def _media_exists(media_file, path):
+    if media_file.type == appconsts.IMAGE_SEQUENCE:
+        return os.path.isdir(os.path.dirname(path))
+    return os.path.isfile(path)
+
+def _swap_sequence_media(seq, path_map, replaced_clips, old_clips):
+    # Hidden track is not changed, it only has trim and monitor display clips.
+    for track in seq.tracks[1:len(seq.tracks) - 1]:
+        for i in range(0, len(track.clips)):
+            clip = track.clips[i]
+            if clip.is_blanck_clip == True or clip.media_type == appconsts.PATTERN_PRODUCER:
+                continue
+            try:
+                new_path = path_map[clip.path]
+            except KeyError:
+                continue
 
-        app.start_autosave()
+            description = undo.ClipDescription(clip, new_path)
+            new_clip = description.create_clip()
+            if new_clip == None:
+                continue
 
-        global load_thread
-        load_thread = None
-        persistance.show_messages = True
+            clip_in = clip.clip_in
+            clip_out = clip.clip_out
+            edit._remove_clip(track, i)
+            edit._insert_clip(track, new_clip, i, clip_in, clip_out)
 
-        Gdk.threads_enter()
-        selections = project.get_project_property(appconsts.P_PROP_LAST_RENDER_SELECTIONS)
-        if selections != None:
-            render.set_saved_gui_selections(selections)
-        _converting_proxy_mode_done()
-        Gdk.threads_leave()
+            replaced_clips[id(clip)] = new_clip
+            old_clips.append(clip)
+
+def _swap_unbuilt_sequence_media(seq, path_map, proxy_mode):
+    # Sequences that have not been built have pickled clips and sync parent clip ids.
+    for track in seq.tracks:
+        for clip in track.clips:
+            if clip.is_blanck_clip == False and clip.media_type != appconsts.PATTERN_PRODUCER and clip.path in path_map:
+                clip.path = path_map[clip.path]
 
+    seq.load_data.proxy_mode = proxy_mode
+    for old_path, new_path in path_map.items():
+        seq.load_data.proxy_path_dict[new_path] = old_path
@@ -22,7 +22,8 @@
 Module loads render options, provides them in displayable form 
 and builds a mlt.Consumer for rendering on request.
 
-Rendering is done in app.player object of class mltplayer.Player
+Timeline renders are done in separate processes, either in jobs queue from
+MLT XML snapshot of sequence, or in single render process from saved project.
 """
 
 
@@ -51,6 +52,7 @@ import mltprofiles
 import mltrefhold
 import renderconsumer
 import rendergui
+import renderheadless
 import respaths
 import sequence
 import userfolders
@@ -101,6 +103,43 @@ class RenderLauncher(threading.Thread):
         PLAYER().set_render_callbacks(callbacks)
         PLAYER().start_rendering(self.render_consumer, self.start_frame, self.end_frame)
 
+def launch_timeline_render_job(render_path, args_vals_list, profile, start_frame, end_frame):
+    # end_frame -1 renders till end of sequence
+    length = current_sequence().get_length()
+    if end_frame == -1:
+        end_frame = length - 1
+        wait_for_producer_end_stop = True
+    else:
+        end_frame = min(end_frame, length - 2)
+        wait_for_producer_end_stop = False
+
+    editorpersistance.prefs.render_chunks = widgets.chunks_spin.get_value_as_int()
+    editorpersistance.prefs.render_chunk_workers = widgets.chunk_workers_spin.get_value_as_int()
+    editorpersistance.save()
+
+    session_id = hashlib.md5(str(os.urandom(32)).encode('utf-8')).hexdigest()
+    render_data = renderheadless.TimelineRenderData(render_path, args_vals_list, profile.description(),
+                                                    start_frame, end_frame, wait_for_producer_end_stop,
+                                                    editorpersistance.prefs.render_chunks, 
+                                                    editorpersistance.prefs.render_chunk_workers)
+
+    renderheadless.create_session_folder(session_id)
+    renderheadless.set_render_data(session_id, render_data)
+    _write_sequence_snapshot(renderheadless.get_snapshot_path(session_id))
+
+    open_in_bin = widgets.args_panel.open_in_bin.get_active()
+    job_queue_object = jobs.TimelineRenderJobQueueObject(session_id, render_data, open_in_bin)
+    job_queue_object.add_to_queue()
+
+def _write_sequence_snapshot(xml_path):
+    # MLT xml consumer writes producer graph when started without pulling frames, 
+    # so playback does not need to be stopped.
+    xml_consumer = mlt.Consumer(PROJECT().profile, "xml", str(xml_path))
+    xml_consumer.connect(current_sequence().tractor)
+    xml_consumer.start()
+    while xml_consumer.is_stopped() == False:
+        time.sleep(0.01)
+
 def get_args_vals_list_for_current_selections():
     profile = get_current_profile()
     encoding_option_index = widgets.encoding_panel.encoding_selector.widget.get_active()
@@ -220,6 +259,8 @@ def create_widgets():
     # Range, Render, Reset, Render Queue
     widgets.render_button = guiutils.get_render_button()
     widgets.range_cb = rendergui.get_range_selection_combo()
+    widgets.chunks_spin, widgets.chunk_workers_spin = rendergui.get_chunks_spins(editorpersistance.prefs.render_chunks,
+                                                                                 editorpersistance.prefs.render_chunk_workers)
     widgets.reset_button = Gtk.Button(_("Reset"))
     widgets.reset_button.connect("clicked", lambda w: set_default_values_for_widgets())
     widgets.queue_button = Gtk.Button(_("To Queue"))
@@ -227,6 +268,8 @@ def create_widgets():
     
     # Tooltips
     widgets.range_cb.set_tooltip_text(_("Select render range"))
+    widgets.chunks_spin.set_tooltip_text(_("Number of parts render is split into, parts are rendered in parallel and joined without re-encoding.\n1 renders in one part."))
+    widgets.chunk_workers_spin.set_tooltip_text(_("Number of parts rendered at the same time"))
     widgets.reset_button.set_tooltip_text(_("Reset all render options to defaults"))
     widgets.render_button.set_tooltip_text(_("Begin Rendering"))
 
@@ -23,6 +23,7 @@ from gi.repository import GObject
 from gi.repository import Pango
 
 import math
+import multiprocessing
 import os
 
 import dialogutils
@@ -581,6 +582,17 @@ def get_range_selection_combo():
     range_cb.set_active(0) 
     return range_cb
 
+def get_chunks_spins(chunks, chunk_workers):
+    chunks_adj = Gtk.Adjustment(value=chunks, lower=1, upper=64, step_incr=1)
+    chunks_spin = Gtk.SpinButton(adjustment=chunks_adj)
+    chunks_spin.set_numeric(True)
+
+    workers_adj = Gtk.Adjustment(value=chunk_workers, lower=1, upper=multiprocessing.cpu_count(), step_incr=1)
+    chunk_workers_spin = Gtk.SpinButton(adjustment=workers_adj)
+    chunk_workers_spin.set_numeric(True)
+
+    return (chunks_spin, chunk_workers_spin)
+
 # ------------------------------------------------------------ panels
 def get_render_panel_left(render_widgets):
     small_height = editorstate.screen_size_small_height()
@@ -629,6 +641,17 @@ def get_render_panel_right(render_widgets, render_clicked_cb, to_queue_clicked_c
         range_row.pack_start(guiutils.get_pad_label(10, 2),  False, False, 0)
     range_row.pack_start(render_widgets.range_cb,  True, True, 0)
 
+    chunks_row = Gtk.HBox()
+    chunks_row.pack_start(guiutils.get_pad_label(10, 8),  False, False, 0)
+    chunks_row.pack_start(Gtk.Label(label=_("Parallel Parts:")),  False, False, 0)
+    chunks_row.pack_start(guiutils.get_pad_label(10, 2),  False, False, 0)
+    chunks_row.pack_start(render_widgets.chunks_spin,  False, False, 0)
+    chunks_row.pack_start(guiutils.get_pad_label(10, 2),  False, False, 0)
+    chunks_row.pack_start(Gtk.Label(label=_("Workers:")),  False, False, 0)
+    chunks_row.pack_start(guiutils.get_pad_label(10, 2),  False, False, 0)
+    chunks_row.pack_start(render_widgets.chunk_workers_spin,  False, False, 0)
+    chunks_row.pack_start(Gtk.Label(), True, True, 0)
+
     buttons_panel = Gtk.HBox()
     buttons_panel.pack_start(guiutils.get_pad_label(10, 8), False, False, 0)
     buttons_panel.pack_start(render_widgets.reset_button, False, False, 0)
@@ -660,6 +683,7 @@ def get_render_panel_right(render_widgets, render_clicked_cb, to_queue_clicked_c
         render_panel.pack_start(Gtk.Label(), True, True, 0)
     
     render_panel.pack_start(range_row, False, False, 0)
+    render_panel.pack_start(chunks_row, False, False, 0)
     if small_height == False:
         render_panel.pack_start(guiutils.get_pad_label(10, 12), False, False, 0)
     else:
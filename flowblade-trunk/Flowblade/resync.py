@@ -65,13 +65,13 @@ def sequence_changed(new_sequence):
 def calculate_and_set_child_clip_sync_states():
     parent_track = current_sequence().first_video_track()
     for child_clip, track in sync_children.items():
-        child_index = track.clips.index(child_clip)
+        child_index = current_sequence().get_clip_position(track, child_clip)
         child_clip_start = track.clip_start(child_index) - child_clip.clip_in
 
         #print child_clip.id
         parent_clip = child_clip.sync_data.master_clip
         try:
-            parent_index = parent_track.clips.index(parent_clip)
+            parent_index = current_sequence().get_clip_position(parent_track, parent_clip)
         except:
             child_clip.sync_data.sync_state = appconsts.SYNC_PARENT_GONE
             continue
@@ -91,12 +91,12 @@ def get_resync_data_list():
     resync_data = []
     parent_track = current_sequence().first_video_track()
     for child_clip, track in sync_children.items():
-        child_index = track.clips.index(child_clip)
+        child_index = current_sequence().get_clip_position(track, child_clip)
         child_clip_start = track.clip_start(child_index) - child_clip.clip_in
 
         parent_clip = child_clip.sync_data.master_clip
         try:
-            parent_index = parent_track.clips.index(parent_clip)
+            parent_index = current_sequence().get_clip_position(parent_track, parent_clip)
         except:
             # Parent clip no longer awailable
             continue
@@ -116,12 +116,12 @@ def get_resync_data_list_for_clip_list(clips_list):
     parent_track = current_sequence().first_video_track()
     for clip_track_tuple in clips_list:
         child_clip, track = clip_track_tuple
-        child_index = track.clips.index(child_clip)
+        child_index = current_sequence().get_clip_position(track, child_clip)
         child_clip_start = track.clip_start(child_index) - child_clip.clip_in
 
         parent_clip = child_clip.sync_data.master_clip
         try:
-            parent_index = parent_track.clips.index(parent_clip)
+            parent_index = current_sequence().get_clip_position(parent_track, parent_clip)
         except:
             # Parent clip no longer awailable
             continue
@@ -33,6 +33,7 @@ import mltfilters
 import mlttransitions
 import mltrefhold
 import patternproducer
+import producerpool
 import tlinerender
 import utils
 
@@ -115,6 +116,9 @@ class Sequence:
         self.compositing_mode = appconsts.COMPOSITING_MODE_TOP_DOWN_FREE_MOVE
         self.tline_render_mode = appconsts.TLINE_RENDERING_OFF
 
+        # Clip id index, kept up to date by edit.py atomic edit ops
+        self.reset_clip_index()
+
         # MLT objects for a multitrack sequence
         self.init_mlt_objects()
 
@@ -398,8 +402,14 @@ class Sequence:
         Creates MLT Producer and adds attributes to it, but does 
         not add it to track/playlist object.
         """
-        producer = mlt.Producer(self.profile, str(path)) # this runs 0.5s+ on some clips
+        producer = producerpool.get_producer(self.profile, path, ttl) # media file is probed only once, that runs 0.5s+ on some clips
+        return self.init_file_producer_clip(producer, path, new_clip_name, ttl)
 
+    def init_file_producer_clip(self, producer, path, new_clip_name=None, ttl=None):
+        """
+        Adds attributes to MLT Producer created with producerpool.get_producer().
+        Producer can be created in another thread, but this must be called in the thread that edits sequence.
+        """
         mltrefhold.hold_ref(producer)
         producer.path = path
         producer.filters = []
@@ -1055,27 +1065,91 @@ class Sequence:
         """
         Returns clip or None if not found.
         """
-        for i in range(1, len(self.tracks)):
-            track = self.tracks[i]
-            for j in range(0, len(track.clips)):
-                clip = track.clips[j]
-                if clip.id == clip_id:
-                    return clip
+        track, index = self.get_track_and_index_for_id(clip_id)
+        if track == None:
+            return None
 
-        return None
+        return track.clips[index]
 
     def get_track_and_index_for_id(self, clip_id):
         """
-        Returns clip or None if not found.
+        Returns (track, index) tuple or (None, None) if not found.
         """
-        for i in range(1, len(self.tracks)):
-            track = self.tracks[i]
-            for j in range(0, len(track.clips)):
-                clip = track.clips[j]
-                if clip.id == clip_id:
-                    return (track, j)
+        try:
+            track = self._get_clip_id_index()[clip_id]
+            return (track, self._get_clip_positions(track)[clip_id])
+        except KeyError:
+            pass
+
+        # Hidden track is not indexed, it only ever has a few clips.
+        hidden_track = self.tracks[-1]
+        for j in range(0, len(hidden_track.clips)):
+            if hidden_track.clips[j].id == clip_id:
+                return (hidden_track, j)
 
         return (None, None)
+
+    def get_clip_position(self, track, clip):
+        """
+        Returns index of clip on track, raises ValueError if clip not on track like list.index().
+        """
+        if self._is_indexed_track(track) == False:
+            return track.clips.index(clip)
+
+        try:
+            index = self._get_clip_positions(track)[clip.id]
+            if track.clips[index] is clip:
+                return index
+        except (KeyError, IndexError):
+            pass
+
+        return track.clips.index(clip)
+
+    # ------------------------------------------ clip id index
+    def reset_clip_index(self):
+        """
+        Index is rebuilt from tracks on next lookup. Needs to be called if track clips 
+        lists are changed without using edit.py atomic edit ops.
+        """
+        self.clip_id_index = None # clip id -> track for all tracks except black bg track and hidden track
+        self.clip_positions = {} # track id -> (clip id -> index), tracks not in dict have changed since last lookup
+
+    def clip_added_to_track(self, clip, track):
+        if self._is_indexed_track(track) == False:
+            return
+        if self.clip_id_index != None:
+            self.clip_id_index[clip.id] = track
+        self.clip_positions.pop(track.id, None)
+
+    def clip_removed_from_track(self, clip, track):
+        if self._is_indexed_track(track) == False:
+            return
+        if self.clip_id_index != None and self.clip_id_index.get(clip.id) is track:
+            self.clip_id_index.pop(clip.id)
+        self.clip_positions.pop(track.id, None)
+
+    def _is_indexed_track(self, track):
+        return track.id > 0 and track.id < len(self.tracks) - 1
+
+    def _get_clip_id_index(self):
+        if self.clip_id_index == None:
+            self.clip_id_index = {}
+            for i in range(1, len(self.tracks) - 1):
+                track = self.tracks[i]
+                for clip in track.clips:
+                    self.clip_id_index[clip.id] = track
+
+        return self.clip_id_index
+
+    def _get_clip_positions(self, track):
+        try:
+            return self.clip_positions[track.id]
+        except KeyError:
+            positions = {}
+            for j in range(0, len(track.clips)):
+                positions[track.clips[j].id] = j
+            self.clip_positions[track.id] = positions
+            return positions
         
     def set_track_mute_state(self, track_index, mute_state):
         track = self.tracks[track_index]
@@ -1252,6 +1326,7 @@ def _copy_track_contents(from_track, to_track, to_sequence):
     
     from_track.clear()
     from_track.clips = []
+    from_track.sequence.reset_clip_index()
 
     # Copy track attributes.
     to_sequence.set_track_mute_state(to_track.id, from_track.mute_state)
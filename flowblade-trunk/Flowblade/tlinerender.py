@@ -19,6 +19,7 @@
 """
 import hashlib
 from gi.repository import Gdk, Gtk
+import multiprocessing
 import os
 from os import listdir
 from os.path import isfile, join
@@ -72,10 +73,35 @@ _timeline_renderer = None # this gets set to NoOpRenderer on launch, is never No
 
 _update_thread = None
 
+# Cached content hashes for clip filter stacks, clip.id -> content_hash.
+# Hashes are dropped when filters of clip are changed, see clip_filters_changed().
+# These are combined with clip positions to create segment content hashes.
+_clip_content_hashes = {}
+
+# Timeline changes since last segments update. Only segments overlapping 
+# changed clips or positions after first changed position get their content hashes computed again.
+_dirty_clip_ids = set()
+_dirty_start_frame = 0 # first frame where clip positions may have changed, None if no changes
+_dirty_lock = threading.Lock()
+_update_lock = threading.Lock() # segments updates from consecutive update threads are done one at a time
+
+# Media file descriptions with size and modification time, path -> media_desc.
+# Files are stated once and entries are dropped when media is reloaded, see media_reloaded().
+_media_descs = {}
+
 # ------------------------------------------------------------ MODULE INTERFACE
 def app_launch_clean_up():
+    # Session dirs only contain sequence XML files and render profiles, 
+    # rendered segments are kept in content addressed cache dir.
     for old_session_dir in listdir(_get_tline_render_dir()):
         _delete_dir_and_contents(_get_tline_render_dir() + "/" + old_session_dir)
+
+    # Renders that were interrupted e.g. by a crash leave partial files behind.
+    for f in _get_folder_files(_get_tline_render_cache_dir()):
+        if f.startswith("partial_"):
+            os.remove(_get_tline_render_cache_dir() + "/" + f)
+
+    _enforce_cache_size_limit([])
     
 def init_session(): # called when project is loaded
     
@@ -93,8 +119,61 @@ def delete_session():
     _delete_session_dir()
 
 def init_for_sequence(sequence):
+    global _clip_content_hashes, _media_descs
+    _clip_content_hashes = {} # clip ids are only unique within a sequence
+    _media_descs = {} # media files may have changed since sequence was last edited
+    _set_all_dirty()
+
     update_renderer_to_mode(None)
 
+def clip_filters_changed(clip):
+    # Called when filters of clip or their property values are changed.
+    _clip_content_hashes.pop(clip.id, None)
+    with _dirty_lock:
+        _dirty_clip_ids.add(clip.id)
+
+def track_clips_changed(track, index):
+    # Called when clips are added to or removed from track at index, clips after that have moved.
+    global _dirty_start_frame
+    if track.id < 1 or track.id > len(track.sequence.tracks) - 2:
+        return # Black bg track and hidden track are not part of segment content.
+    frame = track.clip_start(index)
+    with _dirty_lock:
+        if _dirty_start_frame == None or frame < _dirty_start_frame:
+            _dirty_start_frame = frame
+
+def media_reloaded(media_path):
+    # Called when media file has changed on disk and clips using it are reloaded.
+    _media_descs.pop(media_path, None)
+    _set_all_dirty()
+
+def _set_all_dirty():
+    global _dirty_start_frame
+    with _dirty_lock:
+        _dirty_start_frame = 0
+
+def _get_dirty_ranges():
+    global _dirty_clip_ids, _dirty_start_frame
+    with _dirty_lock:
+        dirty_clip_ids = _dirty_clip_ids
+        dirty_start_frame = _dirty_start_frame
+        _dirty_clip_ids = set()
+        _dirty_start_frame = None
+
+    dirty_ranges = []
+    if dirty_start_frame != None:
+        dirty_ranges.append((dirty_start_frame, float("inf")))
+
+    seq = current_sequence()
+    for clip_id in dirty_clip_ids:
+        track, index = seq.get_track_and_index_for_id(clip_id)
+        if track == None:
+            continue # Clip was removed from timeline, position changes cover this.
+        clip_start = track.clip_start(index)
+        dirty_ranges.append((clip_start, clip_start + track.clips[index].clip_length()))
+
+    return dirty_ranges
+
 def update_renderer_to_mode(old_mode):
 
     global _timeline_renderer
@@ -192,6 +271,57 @@ def _get_tline_render_dir():
 def _get_session_dir():
     return _get_tline_render_dir() + "/" + _project_session_id
 
+def _get_tline_render_cache_dir():
+    return userfolders.get_data_dir() + appconsts.TLINE_RENDERS_CACHE_DIR
+
+def _get_segment_cache_key(content_hash):
+    # Same segment content gives different rendered clip with different profile, render size or encoding.
+    key_desc = content_hash + current_sequence().profile.description() \
+               + str(editorpersistance.prefs.tline_render_size) \
+               + str(editorpersistance.prefs.tline_render_encoding)
+    return hashlib.md5(key_desc.encode('utf-8')).hexdigest()
+
+def _touch_cached_segment(clip_path):
+    # Cache eviction is LRU by file modification time.
+    try:
+        os.utime(clip_path)
+    except OSError:
+        pass
+
+def _enforce_cache_size_limit(keep_paths):
+    """
+    Deletes least recently used rendered segments until cache size is below user set limit.
+    Clips in keep_paths are in use in current sequence and are never deleted.
+    """
+    cache_dir = _get_tline_render_cache_dir()
+    max_size = editorpersistance.prefs.tline_render_cache_size * 1000000
+
+    cached = []
+    cache_size = 0
+    for f in _get_folder_files(cache_dir):
+        clip_path = cache_dir + "/" + f
+        try:
+            stat = os.stat(clip_path)
+        except OSError:
+            continue
+        cached.append((stat.st_mtime, stat.st_size, clip_path))
+        cache_size += stat.st_size
+    
+    if cache_size <= max_size:
+        return
+    
+    cached.sort()
+    for mtime, size, clip_path in cached:
+        if cache_size <= max_size:
+            break
+        if clip_path in keep_paths:
+            continue
+        try:
+            os.remove(clip_path)
+            cache_size -= size
+        except OSError:
+            pass
+
 def _delete_session_dir():
     session_dir = _get_session_dir()
     _delete_dir_and_contents(session_dir)
@@ -394,8 +524,19 @@ class TimeLineRenderer:
         return (len(self.get_dirty_segments()) == 0)
 
     def update_segments(self):
+        with _update_lock:
+            dirty_ranges = _get_dirty_ranges()
+            tracks_desc = _get_tracks_state_desc()
+            for seg in self.segments:
+                seg.update_segment(dirty_ranges, tracks_desc)
+
+    def get_rendered_clip_paths(self):
+        paths = []
         for seg in self.segments:
-            seg.update_segment()
+            if seg.segment_state == SEGMENT_RENDERED and seg.content_hash != "-1":
+                paths.append(seg.get_clip_path())
+
+        return paths
 
     def get_dirty_segments(self):
         dirty = []
@@ -458,11 +599,14 @@ class TimeLineRenderer:
         self.segments = list(remaining_set)
 
     # ------------------------------------------------ RENDERING
-    def update_timeline_rendering_status(self, rendering_file, fract, render_completed, completed_segments):
+    def update_timeline_rendering_status(self, rendering_files, fractions, render_completed, completed_segments):
+        # Segments are rendered in parallel, so we get render fractions for all currently rendering files.
+        rendering_fractions = dict(zip(rendering_files, fractions))
         dirty = self.get_dirty_segments()
         for segment in dirty:
-            if segment.get_clip_path() == rendering_file:
-                segment.rendered_fract = fract
+            clip_path = segment.get_clip_path()
+            if clip_path in rendering_fractions:
+                segment.rendered_fract = rendering_fractions[clip_path]
             else:
                 segment.maybe_set_completed(completed_segments)
                 
@@ -511,6 +655,12 @@ class TimeLineSegment:
         self.selected = False
 
         self.content_hash = "-1"
+        self.hashed_range = None # (start_frame, end_frame) when clips hash was last computed
+        self.clips_hash = None # hash of clips in segment, compositors and track states are added to this to get content hash
+
+        # Cache key is computed again only when content hash or render settings change.
+        self.cache_key = None
+        self.cache_key_desc = None
 
         self.rendered_fract = 0.0
     
@@ -547,7 +697,11 @@ class TimeLineSegment:
 
     # -------------------------------------------- CLIP AND RENDERING
     def get_clip_path(self):
-        return _get_session_dir() + "/" + self.content_hash + "." + tlinerenderserver.get_encoding_extension()
+        key_desc = (self.content_hash, editorpersistance.prefs.tline_render_size, editorpersistance.prefs.tline_render_encoding)
+        if key_desc != self.cache_key_desc:
+            self.cache_key = _get_segment_cache_key(self.content_hash)
+            self.cache_key_desc = key_desc
+        return _get_tline_render_cache_dir() + "/" + self.cache_key + "." + tlinerenderserver.get_encoding_extension()
     
     def maybe_set_completed(self, completed_segments):
         if self.get_clip_path() in completed_segments:
@@ -583,8 +737,12 @@ class TimeLineSegment:
         return False
         
     # ----------------------------------------- CONTENT HASH
-    def update_segment(self):
-        new_hash = self.get_content_hash()
+    def update_segment(self, dirty_ranges, tracks_desc):
+        if self.hashed_range != (self.start_frame, self.end_frame) or self._overlaps(dirty_ranges):
+            self._update_clips_hash()
+
+        # Compositors and track states are not tracked for changes, they are few and cheap to hash.
+        new_hash = self._get_content_hash(tracks_desc)
         
         if new_hash != self.content_hash:
             if get_tline_rendering_mode() == appconsts.TLINE_RENDERING_AUTO:
@@ -600,8 +758,27 @@ class TimeLineSegment:
                 self.segment_state = SEGMENT_UNRENDERED
 
         self.content_hash = new_hash
+
+    def _overlaps(self, dirty_ranges):
+        for range_start, range_end in dirty_ranges:
+            if range_start < self.end_frame and range_end > self.start_frame:
+                return True
+        
+        return False
     
     def get_content_hash(self):
+        self._update_clips_hash()
+        return self._get_content_hash(_get_tracks_state_desc())
+
+    def _get_content_hash(self, tracks_desc):
+        content_strings = [self.clips_hash, tracks_desc]
+        for compositor in current_sequence().compositors:
+            if compositor.clip_in < self.end_frame and compositor.clip_out >= self.start_frame:
+                _get_compositor_content_strings(compositor, self.start_frame, content_strings)
+
+        return hashlib.md5("".join(content_strings).encode('utf-8')).hexdigest()
+
+    def _update_clips_hash(self):
         content_strings = []
         for i in range(1, len(current_sequence().tracks) - 1):
             track = current_sequence().tracks[i]
@@ -609,7 +786,8 @@ class TimeLineSegment:
         
         content_desc = "".join(content_strings)
         
-        return hashlib.md5(content_desc.encode('utf-8')).hexdigest()
+        self.clips_hash = hashlib.md5(content_desc.encode('utf-8')).hexdigest()
+        self.hashed_range = (self.start_frame, self.end_frame)
         
     def _get_track_segment_content_strings(self, track, content_strings):
         start_clip_index, clips = self._get_track_segment_clips(track, self.start_frame, self.end_frame)
@@ -642,9 +820,6 @@ class TimeLineSegment:
         return (start_clip_index, clips)
         
     def _get_clip_content_strings(self, track, clip, clip_index, content_strings):
-
-        length = clip.clip_out - clip.clip_in 
-    
         # Position and range data
         # offset from segment start + in, out
         clip_start_in_tline = track.clip_start(clip_index)
@@ -657,25 +832,79 @@ class TimeLineSegment:
             content_strings.append("##blank")
             return
 
-        if len(clip.filters) == 0:
-            content_strings.append("##no_filters")
-        else:
-            for filter_object in clip.filters:
-                self._get_filter_content_strings(filter_object, content_strings)
-        
-        if clip.mute_filter == None:
-            content_strings.append("##no_mute")
-        else:
-            self._get_filter_content_strings(clip.mute_filter, content_strings)
+        content_strings.append(_get_clip_media_desc(clip))
+        content_strings.append(_get_clip_content_hash(clip))
 
-    def _get_filter_content_strings(self, filter_object, content_strings):
-        for i in range(0, len(filter_object.properties)):
-            p_name, p_value, p_type = filter_object.properties[i]
-            content_strings.append(p_name)
-            content_strings.append(str(p_type))
-            content_strings.append(str(p_value))
 
-        
+def _get_clip_media_desc(clip):
+    # Cache is kept between sessions, so media file changes on disk must change segment content.
+    try:
+        return _media_descs[clip.path]
+    except (KeyError, TypeError):
+        pass
+
+    media_desc = str(clip.path)
+    try:
+        stat = os.stat(clip.path)
+        media_desc += str(stat.st_size) + str(stat.st_mtime)
+    except (OSError, TypeError):
+        pass # Pattern producers and image sequences have no single media file.
+    try:
+        _media_descs[clip.path] = media_desc
+    except TypeError:
+        pass
+    return media_desc
+
+def _get_tracks_state_desc():
+    seq = current_sequence()
+    content_strings = [str(seq.compositing_mode), str(seq.master_audio_gain), str(seq.master_audio_pan)]
+    for i in range(1, len(seq.tracks) - 1):
+        track = seq.tracks[i]
+        content_strings.append(str(track.mute_state))
+        content_strings.append(str(track.audio_gain))
+        content_strings.append(str(track.audio_pan))
+    return "".join(content_strings)
+
+def _get_compositor_content_strings(compositor, segment_start, content_strings):
+    # Position relative to segment start like with clips.
+    content_strings.append(str(compositor.clip_in - segment_start))
+    content_strings.append(str(compositor.clip_out - segment_start))
+    content_strings.append(compositor.transition.info.mlt_service_id)
+    content_strings.append(str(compositor.transition.a_track))
+    content_strings.append(str(compositor.transition.b_track))
+    _get_filter_content_strings(compositor.transition, content_strings)
+
+
+def _get_clip_content_hash(clip):
+    # Filter stack hash is only recomputed if filters of clip have changed since last time.
+    try:
+        return _clip_content_hashes[clip.id]
+    except KeyError:
+        pass
+
+    content_strings = []
+    if len(clip.filters) == 0:
+        content_strings.append("##no_filters")
+    else:
+        for filter_object in clip.filters:
+            _get_filter_content_strings(filter_object, content_strings)
+    
+    if clip.mute_filter == None:
+        content_strings.append("##no_mute")
+    else:
+        _get_filter_content_strings(clip.mute_filter, content_strings)
+
+    content_hash = hashlib.md5("".join(content_strings).encode('utf-8')).hexdigest()
+    _clip_content_hashes[clip.id] = content_hash
+    return content_hash
+
+def _get_filter_content_strings(filter_object, content_strings):
+    for i in range(0, len(filter_object.properties)):
+        p_name, p_value, p_type = filter_object.properties[i]
+        content_strings.append(p_name)
+        content_strings.append(str(p_type))
+        content_strings.append(str(p_value))
+
 
 
 #--------------------------------------- worker threads
@@ -732,12 +961,15 @@ class TimeLineUpdateThread(threading.Thread):
                 segment.segment_state = SEGMENT_RENDERED
                 segment.rendered_fract = 0.0
                 segment.content_hash = "-1"
+                segment.hashed_range = None
                 segment.producer = None # any attempt to display segments after sequence end should crash immediately, this will not be displayed.
                 continue # there can be myltple of these
                 
             clip_path = segment.get_clip_path()
             if os.path.isfile(clip_path) == True:
-                # We came here with undo or redo or new edit that recreates existing content for segment
+                # We came here with undo or redo or new edit that recreates existing content for segment,
+                # or content was rendered earlier in this or some previous session.
+                _touch_cached_segment(clip_path)
                 segment.update_segment_as_rendered()
             else:
                 # Clip for this content does not exist.
@@ -784,8 +1016,8 @@ class TimeLineStatusPollingThread(threading.Thread):
         running = True
         
         while running:
-            rendering_file, fract, render_completed, completed_segments = tlinerenderserver.get_render_status()
-            get_renderer().update_timeline_rendering_status(rendering_file, fract, render_completed, completed_segments)
+            rendering_files, fractions, render_completed, completed_segments = tlinerenderserver.get_render_status()
+            get_renderer().update_timeline_rendering_status(rendering_files, fractions, render_completed, completed_segments)
 
             Gdk.threads_enter()
             gui.tline_render_strip.widget.queue_draw()
@@ -801,6 +1033,8 @@ class TimeLineStatusPollingThread(threading.Thread):
             
         current_sequence().update_hidden_track_for_timeline_rendering() # We should have correct sequence length known because this always comes after edits.
 
+        _enforce_cache_size_limit(get_renderer().get_rendered_clip_paths())
+
 
 
 # ---------------------------------------------------------------- settings
@@ -851,10 +1085,41 @@ class TLineSettingsRenderDialog:
         
         panel_encoding = guiutils.get_named_frame(_("Render Encoding"), vbox_enc)
 
+        # Render processes
+        spin_adj = Gtk.Adjustment(value=editorpersistance.prefs.tline_render_processes, lower=1, upper=multiprocessing.cpu_count(), step_incr=1)
+        self.processes_spin = Gtk.SpinButton(adjustment=spin_adj)
+        self.processes_spin.set_numeric(True)
+        self.processes_spin.set_tooltip_text(_("Number of segments rendered in parallel, between 1 and the number of CPU Cores"))
+        self.processes_spin.connect("value-changed", lambda w: self.processes_changed(w.get_value_as_int()))
+        
+        row_processes = guiutils.get_two_column_box(Gtk.Label(label=_("Render Processes:")), self.processes_spin, 200)
+        
+        vbox_processes = Gtk.VBox(False, 2)
+        vbox_processes.pack_start(row_processes, False, False, 0)
+        vbox_processes.pack_start(guiutils.pad_label(8, 12), False, False, 0)
+
+        panel_processes = guiutils.get_named_frame(_("Performance"), vbox_processes)
+
+        # Cache size
+        cache_adj = Gtk.Adjustment(value=editorpersistance.prefs.tline_render_cache_size, lower=100, upper=100000, step_incr=100)
+        self.cache_size_spin = Gtk.SpinButton(adjustment=cache_adj)
+        self.cache_size_spin.set_numeric(True)
+        self.cache_size_spin.set_tooltip_text(_("Least recently used rendered segments are deleted when cache grows larger then this"))
+        self.cache_size_spin.connect("value-changed", lambda w: self.cache_size_changed(w.get_value_as_int()))
+        
+        row_cache = guiutils.get_two_column_box(Gtk.Label(label=_("Max. Cache Size (MB):")), self.cache_size_spin, 200)
+        
+        vbox_cache = Gtk.VBox(False, 2)
+        vbox_cache.pack_start(row_cache, False, False, 0)
+        vbox_cache.pack_start(guiutils.pad_label(8, 12), False, False, 0)
+
+        panel_cache = guiutils.get_named_frame(_("Rendered Segments Cache"), vbox_cache)
 
         # Pane
         vbox = Gtk.VBox(False, 2)
         vbox.pack_start(panel_encoding, False, False, 0)
+        vbox.pack_start(panel_processes, False, False, 0)
+        vbox.pack_start(panel_cache, False, False, 0)
         guiutils.set_margins(vbox, 8, 12, 12, 12)
 
         self.dialog.vbox.pack_start(vbox, True, True, 0)
@@ -871,4 +1136,12 @@ class TLineSettingsRenderDialog:
     def size_changed(self, size_index):
         editorpersistance.prefs.tline_render_size = size_index
         editorpersistance.save()
+
+    def processes_changed(self, processes_count):
+        editorpersistance.prefs.tline_render_processes = processes_count
+        editorpersistance.save()
+
+    def cache_size_changed(self, cache_size):
+        editorpersistance.prefs.tline_render_cache_size = cache_size
+        editorpersistance.save()
     
@@ -33,7 +33,9 @@ import dbus.service
 from dbus.mainloop.glib import DBusGMainLoop
 import locale
 import mlt
+import multiprocessing
 import os
+import queue
 import subprocess
 import sys
 import threading
@@ -57,7 +59,12 @@ import userfolders
 TLINE_RENDER_ENCODING_INDEX = 0
 RENDERING_PAD_FRAMES = 3
 
+# Messages from segment render worker processes.
+SEGMENT_PROGRESS = 0
+SEGMENT_COMPLETED = 1
+
 _dbus_service = None
+_root_path = None
 
 
 # --------------------------------------------------------------- interface
@@ -109,6 +116,20 @@ def _get_iface(method_name):
 
 # ---------------------------------------------------------------- server
 def main(root_path, force_launch=False):
+    global _root_path
+    _root_path = root_path
+
+    _init_mlt_env(root_path)
+
+    # Launch server
+    DBusGMainLoop(set_as_default=True)
+    loop = GLib.MainLoop()
+    global _dbus_service
+    _dbus_service = TLineRenderDBUSService(loop)
+    loop.run()
+
+def _init_mlt_env(root_path):
+    # This is done both by server process and by segment render worker processes.
     try:
         editorstate.mlt_version = mlt.LIBMLT_VERSION
     except:
@@ -127,8 +148,6 @@ def main(root_path, force_launch=False):
     translations.init_languages()
     translations.load_filters_translations()
     mlttransitions.init_module()
-       
-    editorpersistance.load()
 
     repo = mlt.Factory().init()
     processutils.prepare_mlt_repo(repo)
@@ -147,14 +166,6 @@ def main(root_path, force_launch=False):
     # Create list of available mlt profiles
     mltprofiles.load_profile_list()
 
-    # Launch server
-    DBusGMainLoop(set_as_default=True)
-    loop = GLib.MainLoop()
-    global _dbus_service
-    _dbus_service = TLineRenderDBUSService(loop)
-    loop.run()
-
-
 
 class TLineRenderDBUSService(dbus.service.Object):
     def __init__(self, loop):
@@ -179,15 +190,22 @@ class TLineRenderDBUSService(dbus.service.Object):
 
     @dbus.service.method('flowblade.movie.editor.tlinerenderserver')
     def get_render_status(self):
+        # Returns paths and render fractions for all segments currently being rendered.
+        # DBus can't figure out types for empty lists, so we're using dummy values when nothing is being rendered.
         dummy_list = ["nothing"]
+        dummy_fractions = [1.0]
         if self.render_runner_thread == None:
-            return ("none", 1.0,  False, dummy_list)
+            return (dummy_list, dummy_fractions,  False, dummy_list)
         
         if self.render_runner_thread.render_complete:
-            return ("none", 1.0, self.render_runner_thread.render_complete, self.render_runner_thread.completed_segments)
+            return (dummy_list, dummy_fractions, self.render_runner_thread.render_complete, self.render_runner_thread.completed_segments)
         
-        return ( self.render_runner_thread.current_render_file_path, self.render_runner_thread.get_fraction(), 
-                  self.render_runner_thread.render_complete, self.render_runner_thread.completed_segments)
+        rendering_paths, fractions = self.render_runner_thread.get_fractions()
+        if len(rendering_paths) == 0:
+            rendering_paths = dummy_list
+            fractions = dummy_fractions
+            
+        return (rendering_paths, fractions, self.render_runner_thread.render_complete, self.render_runner_thread.completed_segments)
 
     @dbus.service.method('flowblade.movie.editor.tlinerenderserver')
     def abort_renders(self):
@@ -211,7 +229,8 @@ class TLineRenderDBUSService(dbus.service.Object):
 # --------------------------------------------------------------------- rendering
 class TLineRenderRunnerThread(threading.Thread):
     """
-    SINGLE THREADED RENDERING, SHOULD WE GET MULTIPLE PROCESSES GOING FOR MULTIPLE CLIPS LATER IN MODERN MULTICORE MACHINES?
+    Renders segments in a pool of worker processes, segments are independent of each other
+    so they can be rendered in parallel. Number of worker processes is set by user preference.
     """
     def __init__(self, dbus_service, sequence_xml_path, segments, profile_name):
         threading.Thread.__init__(self)
@@ -219,104 +238,188 @@ class TLineRenderRunnerThread(threading.Thread):
         self.dbus_service = dbus_service
         self.sequence_xml_path = sequence_xml_path
         self.render_folder = os.path.dirname(sequence_xml_path)
-        self.current_render_file_path = None
+        self.profile_name = profile_name
         self.profile = mltprofiles.get_profile(profile_name)
         self.segments = segments
         self.completed_segments =  ["nothing"]
+        self.render_fractions = {} # clip_file_path -> fraction, for segments being currently rendered
+        self.fractions_lock = threading.Lock()
         self.render_complete = False
-        self.render_thread = None
-
+        self.workers = []
+        
         self.aborted = False
 
     def run(self):
         editorpersistance.load() # to apply possible chnages on timeline rendering
         
         start_time = time.monotonic()
- 
-        width, height = _get_render_dimensions(self.profile, editorpersistance.prefs.tline_render_size)
-        encoding = _get_render_encoding()
-        self.render_profile = _get_render_profile(self.profile, editorpersistance.prefs.tline_render_size, self.render_folder)
-        
-        self.current_render_file_path = None
+
+        render_profile_path = _write_render_profile(self.profile, editorpersistance.prefs.tline_render_size, self.render_folder)
+
+        # Workers need to be spawned, not forked, we don't want them to inherit DBus connection and GLib main loop.
+        context = multiprocessing.get_context("spawn")
+        jobs_queue = context.Queue()
+        status_queue = context.Queue()
+        self.abort_event = context.Event()
         
-        sequence_xml_producer = mlt.Producer(self.profile, str(self.sequence_xml_path))
+        workers_count = max(1, min(editorpersistance.prefs.tline_render_processes, len(self.segments)))
         
         for segment in self.segments:
-            if self.aborted == True:
-                break
-                
-            clip_file_path, clip_range_in, clip_range_out = segment
-
-            # Create render objects
-            self.current_render_file_path = clip_file_path
-            renderconsumer.performance_settings_enabled = False
-            
-            consumer = renderconsumer.get_render_consumer_for_encoding( clip_file_path,
-                                                                        self.render_profile, 
-                                                                        encoding)
-            renderconsumer.performance_settings_enabled = True
-            
-            # We are using proxy file rendering code here mostly, didn't vhange all names.
-            # Bit rates for proxy files are counted using 2500kbs for 
-            # PAL size image as starting point.
-            pal_pix_count = 720.0 * 576.0
-            pal_proxy_rate = 2500.0
-            proxy_pix_count = float(width * height)
-            proxy_rate = pal_proxy_rate * (proxy_pix_count / pal_pix_count)
-            proxy_rate = int(proxy_rate / 100) * 100 # Make proxy rate even hundred
-            # There are no practical reasons to have bitrates lower than 500kbs.
-            if proxy_rate < 500:
-                proxy_rate = 500
-            consumer.set("vb", str(int(proxy_rate)) + "k")
-
-            consumer.set("rescale", "nearest")
-
-            start_frame = clip_range_in 
+            jobs_queue.put(segment)
+        for i in range(0, workers_count):
+            jobs_queue.put(None) # Worker exits when it gets this.
+
+        for i in range(0, workers_count):
+            worker = context.Process(target=_segment_render_worker, 
+                                     args=(_root_path, self.sequence_xml_path, self.profile_name, render_profile_path,
+                                           editorpersistance.prefs.tline_render_size, editorpersistance.prefs.tline_render_encoding,
+                                           jobs_queue, status_queue, self.abort_event))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+        # Collect status messages until all workers have exited
+        while self.aborted == False:
+            self._read_status_messages(status_queue)
             
-            stop_frame = clip_range_out + RENDERING_PAD_FRAMES
-            if stop_frame > sequence_xml_producer.get_length() - 1:
-                stop_frame = sequence_xml_producer.get_length() - 1
-
-            # Create and launch render thread
-            self.render_thread = renderconsumer.FileRenderPlayer(None, sequence_xml_producer, consumer, start_frame, stop_frame)
-            self.render_thread.wait_for_producer_end_stop = False
-            self.render_thread.start()
-
-            # Render view update loop
-            self.render_in_progress = True
-            self.aborted = False
-            while self.render_in_progress:
-                if self.aborted == True:
-                    break
-
-                if self.render_thread.running == False: # Rendering has reached end
-                    self.render_in_progress = False
-                    self.current_render_file_path = None
-                else:
-                    time.sleep(0.1)
-
-            if self.aborted:
-                self.render_thread.shutdown()
+            if self._workers_running() == False:
+                self._read_status_messages(status_queue) # Get messages sent just before worker exit.
                 break
 
-            self.completed_segments.append(clip_file_path)
+            time.sleep(0.1)
+
+        if self.aborted == True:
+            self._stop_workers()
 
-            self.render_thread.shutdown()
+        with self.fractions_lock:
+            self.render_fractions = {}
         
         self.render_complete = True
         print("tline render done, time:", time.monotonic() - start_time)
 
-    def get_fraction(self):
-        return self.render_thread.get_render_fraction()
+    def _read_status_messages(self, status_queue):
+        while True:
+            try:
+                msg, clip_file_path, fraction = status_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            with self.fractions_lock:
+                if msg == SEGMENT_PROGRESS:
+                    self.render_fractions[clip_file_path] = fraction
+                else: # SEGMENT_COMPLETED
+                    self.render_fractions.pop(clip_file_path, None)
+                    self.completed_segments.append(clip_file_path)
+
+    def _workers_running(self):
+        for worker in self.workers:
+            if worker.is_alive():
+                return True
+        
+        return False
+
+    def _stop_workers(self):
+        self.abort_event.set()
+        for worker in self.workers:
+            worker.join(2.0)
+            if worker.is_alive():
+                # Worker did not stop in time after abort, most likely blocked in MLT.
+                worker.terminate()
+                worker.join()
+
+    def get_fractions(self):
+        with self.fractions_lock:
+            rendering_paths = list(self.render_fractions.keys())
+            fractions = list(self.render_fractions.values())
+        return (rendering_paths, fractions)
 
     def abort(self):
-        self.render_thread.shutdown()
         self.aborted = True
-        self.thread_running = False
 
 
-def _get_render_encoding():
-    return renderconsumer.proxy_encodings[editorpersistance.prefs.tline_render_encoding]
+def _segment_render_worker(root_path, sequence_xml_path, profile_name, render_profile_path, 
+                           render_size, encoding_index, jobs_queue, status_queue, abort_event):
+    """
+    Entry point of segment render worker process. Renders segments from jobs_queue until it gets None.
+    """
+    _init_mlt_env(root_path)
+
+    profile = mltprofiles.get_profile(profile_name)
+    render_profile = mlt.Profile(render_profile_path)
+    encoding = renderconsumer.proxy_encodings[encoding_index]
+    width, height = _get_render_dimensions(profile, render_size)
+
+    sequence_xml_producer = mlt.Producer(profile, str(sequence_xml_path))
+    
+    while abort_event.is_set() == False:
+        segment = jobs_queue.get()
+        if segment == None:
+            break
+
+        clip_file_path, clip_range_in, clip_range_out = segment
+
+        # Segments are kept in a persistent cache and existence of file means that segment is rendered,
+        # so we render into a temp file and only move it to final path when render is complete.
+        render_file_path = _get_partial_render_path(clip_file_path)
+        consumer = _get_segment_consumer(render_file_path, render_profile, encoding, width, height)
+
+        start_frame = clip_range_in 
+        
+        stop_frame = clip_range_out + RENDERING_PAD_FRAMES
+        if stop_frame > sequence_xml_producer.get_length() - 1:
+            stop_frame = sequence_xml_producer.get_length() - 1
+
+        # Create and launch render thread
+        render_thread = renderconsumer.FileRenderPlayer(None, sequence_xml_producer, consumer, start_frame, stop_frame)
+        render_thread.wait_for_producer_end_stop = False
+        render_thread.start()
+
+        # Render progress update loop
+        while render_thread.running == True: # Becomes False when rendering has reached end
+            if abort_event.is_set():
+                render_thread.shutdown()
+                _remove_partial_render(render_file_path)
+                return
+
+            status_queue.put((SEGMENT_PROGRESS, clip_file_path, render_thread.get_render_fraction()))
+            time.sleep(0.1)
+
+        render_thread.shutdown()
+        os.replace(render_file_path, clip_file_path)
+        status_queue.put((SEGMENT_COMPLETED, clip_file_path, 1.0))
+
+def _get_partial_render_path(clip_file_path):
+    return os.path.dirname(clip_file_path) + "/partial_" + os.path.basename(clip_file_path)
+
+def _remove_partial_render(render_file_path):
+    try:
+        os.remove(render_file_path)
+    except OSError:
+        pass
+
+def _get_segment_consumer(clip_file_path, render_profile, encoding, width, height):
+    renderconsumer.performance_settings_enabled = False
+    consumer = renderconsumer.get_render_consumer_for_encoding( clip_file_path,
+                                                                render_profile, 
+                                                                encoding)
+    renderconsumer.performance_settings_enabled = True
+    
+    # We are using proxy file rendering code here mostly, didn't vhange all names.
+    # Bit rates for proxy files are counted using 2500kbs for 
+    # PAL size image as starting point.
+    pal_pix_count = 720.0 * 576.0
+    pal_proxy_rate = 2500.0
+    proxy_pix_count = float(width * height)
+    proxy_rate = pal_proxy_rate * (proxy_pix_count / pal_pix_count)
+    proxy_rate = int(proxy_rate / 100) * 100 # Make proxy rate even hundred
+    # There are no practical reasons to have bitrates lower than 500kbs.
+    if proxy_rate < 500:
+        proxy_rate = 500
+    consumer.set("vb", str(int(proxy_rate)) + "k")
+
+    consumer.set("rescale", "nearest")
+    
+    return consumer
 
 def _get_render_dimensions(project_profile, proxy_size):
     # Get new dimension that are about half of previous and diviseble by eight
@@ -333,7 +436,7 @@ def _get_render_dimensions(project_profile, proxy_size):
     new_height = old_height_half - old_height_half % 2
     return (new_width, new_height)
 
-def _get_render_profile(project_profile, render_size, render_folder):
+def _write_render_profile(project_profile, render_size, render_folder):
     new_width, new_height = _get_render_dimensions(project_profile, render_size)
     
     file_contents = "description=" + "proxy render profile" + "\n"
@@ -354,6 +457,5 @@ def _get_render_profile(project_profile, render_size, render_folder):
         profile_file = afw.get_file()
         profile_file.write(file_contents)
 
-    render_profile = mlt.Profile(render_profile_path)
-    return render_profile
+    return render_profile_path
 
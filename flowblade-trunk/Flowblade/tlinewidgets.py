@@ -47,6 +47,7 @@ from editorstate import current_proxy_media_paths
 import editorstate
 import gui
 import guiutils
+import memorycache
 import respaths
 import sequence
 import snapping
@@ -316,8 +317,14 @@ fake_current_frame = None
 # Used to draw indicators that tell if more frames are available while trimming
 trim_status = appconsts.ON_BETWEEN_FRAME
 
-# Dict for clip thumbnails path -> image
-clip_thumbnails = {}
+# Memory cache for clip thumbnails path -> image
+def _get_thumbnail_size(surface):
+    try:
+        return surface.get_stride() * surface.get_height()
+    except:
+        return appconsts.THUMB_WIDTH * appconsts.THUMB_HEIGHT * 4
+
+clip_thumbnails = memorycache.get_cache("clip_thumbnails", _get_thumbnail_size)
 
 # Timeline match image
 match_frame = -1
@@ -1717,8 +1724,7 @@ class TimeLineCanvas:
 
         proxy_paths = current_proxy_media_paths()
 
-        global clip_thumbnails
-                
+
         # Draw clips in draw range
         for i in range(start, end):
 
@@ -1881,13 +1887,13 @@ class TimeLineCanvas:
                         
                     text_x_add = 115
                     cr.save()
-                    try: # paint thumbnail
-                        thumb_img = clip_thumbnails[clip.path]
+                    thumb_img = clip_thumbnails.get(clip.path)
+                    if thumb_img != None: # paint thumbnail
                         self.create_round_rect_path(cr, scale_in + 5, y + 4.5, scale_length - 10, track_height - 8, 3.0)
                         cr.clip()
                         cr.set_source_surface(thumb_img,scale_in, y - 20)
                         cr.paint()
-                    except: # thumbnail not found  in dict, get it and  paint it
+                    else: # thumbnail not found in cache, get it and paint it
                         try:
                             if clip.container_data == None:
                                 media_file = PROJECT().get_media_file_for_path(clip.path)
@@ -1903,7 +1909,7 @@ class TimeLineCanvas:
                             cr.clip()
                             cr.set_source_surface(thumb_img, scale_in, y - 20)
                             cr.paint()
-                            clip_thumbnails[clip.path] = thumb_img
+                            clip_thumbnails.put(clip.path, thumb_img)
                         except:
                             pass # This fails for rendered fades and transitions
                     
@@ -2018,12 +2024,11 @@ class TimeLineCanvas:
                 self.sync_children.append((clip, track, scale_in))
 
             # Draw audio level data if needed.
-            # Init data rendering if data needed and not available
-            if clip.is_blanck_clip == False and clip.waveform_data == None and editorstate.display_all_audio_levels == True \
-                and clip.media_type != appconsts.IMAGE_SEQUENCE and clip.media_type != appconsts.PATTERN_PRODUCER:
-                 clip.waveform_data = audiowaveformrenderer.get_waveform_data(clip)
+            # Init data rendering if data needed and not available.
+            # Data is not kept in clip if displayed for all clips so that it can be dropped from memory cache.
+            waveform_data = audiowaveformrenderer.get_clip_waveform_data(clip)
             # Draw data if available large enough scale
-            if clip.is_blanck_clip == False and clip.waveform_data != None and scale_length > FILL_MIN:
+            if clip.is_blanck_clip == False and waveform_data != None and scale_length > FILL_MIN:
                 r, g, b = clip_bg_col
                 cr.set_source_rgb(r * 1.9, g * 1.9, b * 1.9)
                 
@@ -2063,11 +2068,14 @@ class TimeLineCanvas:
                 # Get media frame 0 position in screen pixels
                 media_start_pos_pix = scale_in - clip_in * pix_per_frame
                 
+                # Get levels with decimation matching zoom level
+                decimation, levels_first, levels = waveform_data.get_draw_levels(draw_first, draw_last, step)
+
                 # Draw level bar for each frame in draw range
                 for f in range(draw_first, draw_last, step):
                     try:
                         x = media_start_pos_pix + f * pix_per_frame
-                        h = bar_height * clip.waveform_data[f]
+                        h = bar_height * levels[f // decimation - levels_first]
                         if h < 1:
                             h = 1
                         cr.rectangle(x, y + y_pad + (bar_height - h), draw_pix_per_frame, h)
@@ -2109,7 +2117,7 @@ class TimeLineCanvas:
                         cr.move_to(scale_in + TEXT_X, y + track_height - 2)
                         cr.show_text(str(clip.sync_diff))
 
-            if clip.waveform_data == None and editorstate.display_all_audio_levels == True and scale_length > FILL_MIN:
+            if waveform_data == None and editorstate.display_all_audio_levels == True and scale_length > FILL_MIN:
                 if clip.media_type != appconsts.IMAGE_SEQUENCE and clip.media_type != appconsts.PATTERN_PRODUCER:
                     cr.set_source_surface(LEVELS_RENDER_ICON, int(scale_in) + 4, y + 8)
                     cr.paint()
@@ -79,6 +79,9 @@ QUEUE_HEIGHT = 400
 
 SINGLE_WINDOW_WIDTH = 600
 
+RENDER_MEMORY_KB = 2000000 # estimated memory use of one render, used to limit default number of parallel renders
+MAX_PARALLEL_RENDERS = 16
+
 IN_QUEUE = 0
 RENDERING = 1
 RENDERED = 2
@@ -87,8 +90,8 @@ ABORTED = 4
 
 render_queue = []
 batch_window = None
-render_thread = None
 queue_runner_thread = None
+parallel_renders = 1 # number of items rendered at the same time, set from batch render window
 
 timeout_id = None
 
@@ -102,108 +105,213 @@ single_render_thread = None
 
 # -------------------------------------------------------- render thread
 class QueueRunnerThread(threading.Thread):
+    """
+    Renders queued items, running up to get_parallel_renders_count() renders at the same time.
+    
+    Items with same project file contents share a loaded project. Its current sequence is 
+    written once as MLT XML and every item renders its own producer loaded from that file,
+    because a producer can not be rendered by two consumers at the same time.
+    """
     def __init__(self):
         threading.Thread.__init__(self)
+        self.item_renders = {} # render item -> ItemRender for running renders
+        self.lock = threading.Lock()
     
     def run(self):        
         self.running = True
         items = 0
         global render_queue, batch_window
-        for render_item in render_queue.queue:
-            if self.running == False:
-                break
-            if render_item.render_this_item == False:
-                continue
-            
-            current_render_time = 0
 
-            # Create render objects
-            identifier = render_item.generate_identifier()
-            project_file_path = get_projects_dir() + identifier + ".flb"
+        queue_start_time = time.time()
+        waiting = [render_item for render_item in render_queue.queue if render_item.render_this_item == True]
+        items_count = len(waiting)
+        
+        # Project file hash -> [XML file path, number of waiting items using it]
+        sequence_snapshots = {}
+        self.project_hashes = {}
+        for render_item in waiting:
+            project_hash = _get_file_hash(render_item.get_project_filepath())
+            self.project_hashes[render_item] = project_hash
+            try:
+                sequence_snapshots[project_hash][1] += 1
+            except KeyError:
+                sequence_snapshots[project_hash] = [None, 1]
+
+        while (self.running and len(waiting) > 0) or len(self.item_renders) > 0:
+            # Launch renders
+            while self.running and len(waiting) > 0 and len(self.item_renders) < parallel_renders:
+                render_item = waiting.pop(0)
+                self.start_item_render(render_item, sequence_snapshots)
+
+            # Handle ended renders
+            with self.lock:
+                ended = [item_render for item_render in self.item_renders.values() if item_render.has_ended()]
+            for item_render in ended:
+                with self.lock:
+                    del self.item_renders[item_render.render_item]
+                item_render.render_thread.shutdown()
+                if item_render.aborted == True:
+                    item_render.render_item.render_aborted()
+                else:
+                    item_render.render_item.render_completed()
+                    items = items + 1
+
+            # Update view
+            with self.lock:
+                running = list(self.item_renders.values())
+            fractions_sum = items + sum([item_render.get_render_fraction() for item_render in running])
+            fraction = min(1.0, fractions_sum / float(max(1, items_count)))
+            if len(running) == 1:
+                current_name = running[0].render_item.get_display_name()
+            else:
+                current_name = str(len(running)) + _(" items")
+
+            Gdk.threads_enter()
+            batch_window.update_render_progress(fraction, items, current_name, time.time() - queue_start_time)
+            if len(ended) > 0:
+                batch_window.update_queue_view()
+            batch_window.queue_view.update_progress(self.get_render_progress)
+            Gdk.threads_leave()
+
+            time.sleep(0.33)
+
+        # Waiting items are left queued when queue is aborted. 
+        for project_hash in sequence_snapshots:
+            _delete_sequence_snapshot(sequence_snapshots[project_hash][0])
+
+        # Update view for render end
+        Gdk.threads_enter()
+        batch_window.reload_queue() # item may havee added to queue while rendering
+        batch_window.render_queue_stopped()
+        Gdk.threads_leave()
+
+    def start_item_render(self, render_item, sequence_snapshots):
+        project_hash = self.project_hashes[render_item]
+        snapshot = sequence_snapshots[project_hash]
+        if snapshot[0] == None:
+            # Project is loaded only once for all items with same project file.
             persistance.show_messages = False
+            project = persistance.load_project(render_item.get_project_filepath(), False)
+            snapshot[0] = get_projects_dir() + project_hash + ".xml"
+            _write_sequence_snapshot(project, snapshot[0])
 
-            project = persistance.load_project(project_file_path, False)
+        maybe_create_render_folder(render_item.render_path)
+    
+        profile = mltprofiles.get_profile(render_item.render_data.profile_name)
+        producer = mlt.Producer(profile, str(snapshot[0]))
+        consumer = renderconsumer.get_mlt_render_consumer(render_item.render_path, 
+                                                          profile,
+                                                          render_item.args_vals_list)
 
-            maybe_create_render_folder(render_item.render_path)
+        # Snapshot file is not needed after all items using it have loaded their producers.
+        snapshot[1] -= 1
+        if snapshot[1] == 0:
+            _delete_sequence_snapshot(snapshot[0])
+            snapshot[0] = None
+
+        # Get render range
+        start_frame, end_frame, wait_for_stop_render = get_render_range(render_item)
         
-            producer = project.c_seq.tractor
-            profile = mltprofiles.get_profile(render_item.render_data.profile_name)
-            consumer = renderconsumer.get_mlt_render_consumer(render_item.render_path, 
-                                                              profile,
-                                                              render_item.args_vals_list)
+        # Create and launch render thread
+        render_thread = renderconsumer.FileRenderPlayer(None, producer, consumer, start_frame, end_frame) # None == file name not needed this time when using FileRenderPlayer because callsite keeps track of things
+        render_thread.wait_for_producer_end_stop = wait_for_stop_render
 
-            # Get render range
-            start_frame, end_frame, wait_for_stop_render = get_render_range(render_item)
-            
-            # Create and launch render thread
-            global render_thread 
-            render_thread = renderconsumer.FileRenderPlayer(None, producer, consumer, start_frame, end_frame) # None == file name not needed this time when using FileRenderPlayer because callsite keeps track of things
-            render_thread.wait_for_producer_end_stop = wait_for_stop_render
-            render_thread.start()
+        # Item render is registered before render is started so that abort() always finds it.
+        item_render = ItemRender(render_item, render_thread)
+        with self.lock:
+            if self.running == False:
+                return # Queue was aborted, item is left queued.
+            self.item_renders[render_item] = item_render
 
-            # Set render start time and item state
-            render_item.render_started()
+        render_thread.start()
 
-            Gdk.threads_enter()
-            batch_window.update_queue_view()
-            batch_window.current_render.set_text("  " + render_item.get_display_name())
-            Gdk.threads_leave()
+        # Set render start time and item state
+        render_item.render_started()
 
-            # Make sure that render thread is actually running before
-            # testing render_thread.running value later
-            while render_thread.has_started_running == False:
-                time.sleep(0.05)
-
-            # View update loop
-            self.thread_running = True
-            self.aborted = False
-            while self.thread_running:
-                if self.aborted == True:
-                    break        
-                render_fraction = render_thread.get_render_fraction()
-                now = time.time()
-                current_render_time = now - render_item.start_time
-                
-                Gdk.threads_enter()
-                batch_window.update_render_progress(render_fraction, items, render_item.get_display_name(), current_render_time)
-                Gdk.threads_leave()
-                
-                if render_thread.running == False: # Rendering has reached end
-                    self.thread_running = False
-                    
-                    Gdk.threads_enter()
-                    batch_window.render_progress_bar.set_fraction(1.0)
-                    Gdk.threads_leave()
-                                    
-                    render_item.render_completed()
-                else:
-                    time.sleep(0.33)
-                    
-            if not self.aborted:
-                items = items + 1
-                Gdk.threads_enter()
-                batch_window.update_render_progress(0, items, render_item.get_display_name(), 0)
-                Gdk.threads_leave()
-            else:
-                if render_item != None:
-                    render_item.render_aborted()
-                    break
+        # Make sure that render thread is actually running before
+        # testing render_thread.running value later
+        while render_thread.has_started_running == False:
+            time.sleep(0.05)
+
+        # Render thread sets itself running when started, so abort done before that is done again.
+        if item_render.aborted == True:
             render_thread.shutdown()
-        
-        # Update view for render end
+
         Gdk.threads_enter()
-        batch_window.reload_queue() # item may havee added to queue while rendering
-        batch_window.render_queue_stopped()
+        batch_window.update_queue_view()
         Gdk.threads_leave()
-                    
+
+    def get_render_progress(self, render_item):
+        # Returns render fraction for running items and None for others.
+        with self.lock:
+            try:
+                return self.item_renders[render_item].get_render_fraction()
+            except KeyError:
+                return None
+
+    def abort_item(self, render_item):
+        # Other running renders continue.
+        with self.lock:
+            try:
+                item_render = self.item_renders[render_item]
+            except KeyError:
+                return
+        item_render.abort()
+
     def abort(self):
-        render_thread.shutdown()
-        # It may be that 'aborted' and 'running' could combined into single flag, but whatevaar
-        self.aborted = True
         self.running = False
-        self.thread_running = False
-        
-        batch_window.reload_queue() # item may havee added to queue while rendering
+        with self.lock:
+            item_renders = list(self.item_renders.values())
+        for item_render in item_renders:
+            item_render.abort()
+
+
+class ItemRender:
+
+    def __init__(self, render_item, render_thread):
+        self.render_item = render_item
+        self.render_thread = render_thread
+        self.aborted = False
+
+    def get_render_fraction(self):
+        if self.render_thread.running == False:
+            return 1.0
+        return self.render_thread.get_render_fraction()
+
+    def has_ended(self):
+        return self.aborted == True or self.render_thread.running == False
+
+    def abort(self):
+        self.aborted = True
+        self.render_thread.shutdown()
+
+
+def get_default_parallel_renders_count():
+    # Every render decodes all media of its sequence, so available memory limits parallel renders as well as CPU count.
+    cpu_limit = max(1, os.cpu_count() // 2)
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return max(1, min(cpu_limit, int(line.split()[1]) // RENDER_MEMORY_KB))
+    except (OSError, ValueError):
+        pass
+    return cpu_limit
+
+def _get_file_hash(file_path):
+    with open(file_path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def _write_sequence_snapshot(project, xml_path):
+    xml_consumer = mlt.Consumer(project.profile, "xml", str(xml_path))
+    xml_consumer.connect(project.c_seq.tractor)
+    xml_consumer.start()
+    while xml_consumer.is_stopped() == False:
+        time.sleep(0.01)
+
+def _delete_sequence_snapshot(xml_path):
+    if xml_path != None and os.path.exists(xml_path):
+        os.remove(xml_path)
 
 
 class BatchRenderDBUSService(dbus.service.Object):
@@ -585,10 +693,6 @@ class BatchRenderItemData:
         self.render_time = -1
         self.save()
 
-        global queue_runner_thread, render_thread
-        render_thread = None
-        queue_runner_thread = None      
-
     def get_status_string(self):
         if self.status == IN_QUEUE:
             return _("Queued")
@@ -676,6 +780,14 @@ class BatchRenderWindow:
         bottom_info_vbox = Gtk.HBox(True, 0)
         bottom_info_vbox.pack_start(guiutils.get_left_justified_box([items_r, self.items_rendered]), True, True, 0)
         bottom_info_vbox.pack_start(guiutils.get_left_justified_box([started_r, self.render_started_label]), True, True, 0)
+
+        global parallel_renders
+        parallel_renders = get_default_parallel_renders_count()
+        parallel_r = Gtk.Label(label=_("Parallel Renders:"))
+        self.parallel_renders_spin = Gtk.SpinButton.new_with_range(1, MAX_PARALLEL_RENDERS, 1)
+        self.parallel_renders_spin.set_value(parallel_renders)
+        self.parallel_renders_spin.connect("value-changed", self.parallel_renders_changed)
+        bottom_info_vbox.pack_start(guiutils.get_left_justified_box([parallel_r, self.parallel_renders_spin]), True, True, 0)
         
         self.not_rendering_txt = _("Not Rendering")
         self.render_progress_bar = Gtk.ProgressBar()
@@ -741,6 +853,11 @@ class BatchRenderWindow:
         self.window.set_position(Gtk.WindowPosition.CENTER)  
         self.window.show_all()
 
+    def parallel_renders_changed(self, spin):
+        # Queue runner starts more items or lets running items finish before starting new ones.
+        global parallel_renders
+        parallel_renders = int(spin.get_value())
+
     def remove_finished_clicked(self):
         delete_list = []
         for render_item in render_queue.queue:
@@ -826,6 +943,7 @@ class BatchRenderWindow:
 
         progress_str = str(int(fraction * 100)) + " %"
         self.render_progress_bar.set_text(progress_str)
+        self.current_render.set_text("  " + current_name)
 
         if fraction != 0:
             full_time_est = (1.0 / fraction) * current_render_time_passed
@@ -846,6 +964,10 @@ class BatchRenderWindow:
     def abort_render(self):
         global queue_runner_thread
         queue_runner_thread.abort()
+
+    def abort_item_render(self, render_item):
+        if queue_runner_thread != None:
+            queue_runner_thread.abort_item(render_item)
     
     def render_queue_stopped(self):
         self.render_progress_bar.set_fraction(0.0)
@@ -857,8 +979,7 @@ class BatchRenderWindow:
         self.remove_selected.set_sensitive(True)
         self.remove_finished.set_sensitive(True)
 
-        global queue_runner_thread, render_thread
-        render_thread = None
+        global queue_runner_thread
         queue_runner_thread = None        
 
 
@@ -964,7 +1085,8 @@ class RenderQueueView(Gtk.VBox):
                 path, col, cellx, celly = pthinfo
                 treeview.grab_focus()
                 treeview.set_cursor(path, col, 0)
-                display_render_item_popup_menu(self.item_menu_item_selected, event)
+                render_item = render_queue.queue[max(path)]
+                display_render_item_popup_menu(self.item_menu_item_selected, event, render_item.status == RENDERING)
             return True
         else:
             return False
@@ -982,6 +1104,8 @@ class RenderQueueView(Gtk.VBox):
                 copy_project(render_item, file_name)
         elif msg == "changepath":
             show_change_render_item_path_dialog(_change_render_item_path_callback, render_item)
+        elif msg == "stopitem":
+            batch_window.abort_item_render(render_item)
 
     def fill_data_model(self, render_queue):
         self.storemodel.clear()        
@@ -995,6 +1119,13 @@ class RenderQueueView(Gtk.VBox):
             self.storemodel.append(row_data)
             self.scroll.queue_draw()
 
+    def update_progress(self, get_render_progress_func):
+        # Rows are in render queue order.
+        for render_item, row in zip(render_queue.queue, self.storemodel):
+            fraction = get_render_progress_func(render_item)
+            if fraction != None:
+                row[2] = _("Rendering") + " " + str(int(fraction * 100)) + "%"
+
 
 def run_save_project_as_dialog(project_name):
     dialog = Gtk.FileChooserDialog(_("Save Render Item Project As"), None, 
@@ -1125,7 +1256,7 @@ def _change_render_item_path_callback(dialog, response_id, data):
     else:
         dialog.destroy()
         
-def display_render_item_popup_menu(callback, event):
+def display_render_item_popup_menu(callback, event, rendering):
     menu = render_item_menu
     guiutils.remove_children(menu)
     
@@ -1133,6 +1264,8 @@ def display_render_item_popup_menu(callback, event):
     menu.add(_get_menu_item(_("Save Item Project As..."), callback,"saveas"))
     menu.add(_get_menu_item(_("Render Properties"), callback,"renderinfo")) 
     _add_separetor(menu)
+    menu.add(_get_menu_item(_("Stop Render"), callback,"stopitem", rendering))
+    _add_separetor(menu)
     menu.add(_get_menu_item(_("Delete"), callback,"delete"))
     menu.popup(None, None, None, None, event.button, event.time)
     
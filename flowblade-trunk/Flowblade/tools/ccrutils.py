@@ -21,10 +21,16 @@
 """
 Module provides utility methods for moduless creating headless render procesesses.
 Used mostly for container clips rendering, hence ContainerClipsRenderingUTILS.
+
+Render processes send status and completion messages to application and receive abort messages
+over a local socket if application has started sessions server. Message files in session folders 
+are used if socket is not available, and they are still used to pass render data to processes.
 """
 import os
 import pickle
+import socket
 import sys
+import threading
 
 import appconsts
 import atomicfile
@@ -40,6 +46,17 @@ STATUS_MSG_FILE = "status"
 ABORT_MSG_FILE = "abort"
 RENDER_DATA_FILE = "render_data"
 
+SESSIONS_SOCKET_ENV = "FLOWBLADE_RENDER_SESSIONS_SOCKET" # render processes inherit socket path from application enviroment
+SESSIONS_SOCKET_NAME = "render_sessions_"
+CONNECT_TIMEOUT = 5.0 # seconds
+
+# Socket messages, one per line.
+MSG_SESSION = "session" # process -> app, first message with session id
+MSG_READY = "ready" # app -> process, reply to MSG_SESSION
+MSG_STATUS = "status" # process -> app, followed by status message
+MSG_COMPLETED = "completed" # process -> app
+MSG_ABORT = "abort" # app -> process
+
 
 _session_folder = None
 _clip_frames_folder_internal = None
@@ -47,10 +64,24 @@ _rendered_frames_folder_internal = None
 
 _render_data = None
 
+# Application side
+_server_socket = None
+_server_socket_path = None
+_sessions = {} # session id -> _SessionState
+_sessions_lock = threading.Lock()
+_session_message_listener = None # called from socket threads after every message received from render processes
+
+# Render process side
+_channel = None # socket connected to application, None if message files are used
+_channel_lock = threading.Lock()
+_abort_received = False
+
 
 # ----------------------------------------------------- interface with message files, used by main appp
 # We are using message files to communicate with application.
 def clear_flag_files(session_id):
+    delete_session_data(session_id)
+
     folder = _get_session_folder(session_id)
     
     completed_msg = folder + "/" + COMPLETED_MSG_FILE
@@ -77,6 +108,14 @@ def set_render_data(session_id, video_render_data):
         pickle.dump(video_render_data, outfile)
     
 def session_render_complete(session_id):
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session != None:
+            if session.completed == True:
+                return True
+            if session.connection != None:
+                return False
+
     folder = _get_session_folder(session_id)
     completed_msg_path = folder + "/" + COMPLETED_MSG_FILE
 
@@ -94,6 +133,12 @@ def get_session_status(session_id):
     return (step, frame, length, elapsed)
 
 def get_session_status_message(session_id):
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session != None:
+            if session.status_msg != None or session.connection != None:
+                return session.status_msg
+
     try:
         status_msg_file = _get_session_folder(session_id) + "/" + STATUS_MSG_FILE
         with open(status_msg_file) as f:
@@ -103,15 +148,197 @@ def get_session_status_message(session_id):
         return None
         
 def abort_render(session_id):
+    # Lock is held while writing abort file so that a process connecting at the same time 
+    # either gets abort message or sees the file after it has been registered.
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session != None and session.connection != None:
+            try:
+                session.connection.sendall((MSG_ABORT + "\n").encode("utf-8"))
+                return
+            except OSError:
+                pass # Process has exited or is exiting, write file.
+
+        folder = _get_session_folder(session_id)
+        abort_msg_file = folder + "/" +  ABORT_MSG_FILE
+        with atomicfile.AtomicFileWriter(abort_msg_file, "wb") as afw:
+            outfile = afw.get_file()
+            pickle.dump("##abort", outfile)
+
+def create_session_folder(session_id):
+    # Render processes create session folders, this is for passing data that needs to exist before launch.
     folder = _get_session_folder(session_id)
-    abort_msg_file = folder + "/" +  ABORT_MSG_FILE
-    with atomicfile.AtomicFileWriter(abort_msg_file, "wb") as afw:
-        outfile = afw.get_file()
-        pickle.dump("##abort", outfile)
-        
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return folder
+
+def delete_session_data(session_id):
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
 def _get_session_folder(session_id):
     return userfolders.get_data_dir() + appconsts.CONTAINER_CLIPS_DIR +  "/" + session_id
-    
+
+
+# ----------------------------------------------------- sessions server, used by main app
+def start_sessions_server():
+    """
+    Render processes launched after this send messages over socket. 
+    If server can't be started message files are used.
+    """
+    global _server_socket, _server_socket_path
+    if _server_socket != None:
+        return
+
+    socket_path = userfolders.get_cache_dir() + SESSIONS_SOCKET_NAME + str(os.getpid())
+    try:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server_socket.bind(socket_path)
+        server_socket.listen(16)
+    except OSError as e:
+        print("Render sessions server could not be started, using message files: " + str(e))
+        return
+
+    _server_socket = server_socket
+    _server_socket_path = socket_path
+    os.environ[SESSIONS_SOCKET_ENV] = socket_path
+
+    accept_thread = threading.Thread(target=_accept_connections, args=(server_socket,))
+    accept_thread.daemon = True
+    accept_thread.start()
+
+def stop_sessions_server():
+    global _server_socket, _server_socket_path
+    if _server_socket == None:
+        return
+
+    os.environ.pop(SESSIONS_SOCKET_ENV, None)
+    try:
+        _server_socket.close()
+        os.remove(_server_socket_path)
+    except OSError:
+        pass
+
+    _server_socket = None
+    _server_socket_path = None
+
+def set_session_message_listener(listener):
+    global _session_message_listener
+    _session_message_listener = listener
+
+def _accept_connections(server_socket):
+    while True:
+        try:
+            connection, address = server_socket.accept()
+        except OSError:
+            return # Server socket closed.
+
+        read_thread = threading.Thread(target=_read_session_messages, args=(connection,))
+        read_thread.daemon = True
+        read_thread.start()
+
+def _read_session_messages(connection):
+    session = None
+    try:
+        with connection.makefile("r", encoding="utf-8") as messages:
+            for line in messages:
+                msg_type, sep, msg = line.rstrip("\n").partition(" ")
+                if msg_type == MSG_SESSION:
+                    session = _SessionState(connection)
+                    with _sessions_lock:
+                        _sessions[msg] = session
+                    connection.sendall((MSG_READY + "\n").encode("utf-8"))
+                elif session == None:
+                    return # Not a render process.
+                elif msg_type == MSG_STATUS:
+                    session.status_msg = msg
+                elif msg_type == MSG_COMPLETED:
+                    session.completed = True
+
+                if _session_message_listener != None:
+                    _session_message_listener()
+    except OSError:
+        pass
+    finally:
+        with _sessions_lock:
+            if session != None:
+                session.connection = None # Message files are checked for sessions without connection.
+        connection.close()
+
+
+class _SessionState:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.status_msg = None
+        self.completed = False
+
+
+# ----------------------------------------------------- socket connection, used by render processes
+def _connect_to_sessions_server(session_id):
+    global _channel, _abort_received
+    socket_path = os.environ.get(SESSIONS_SOCKET_ENV)
+    if socket_path == None:
+        return
+
+    try:
+        channel = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        channel.settimeout(CONNECT_TIMEOUT)
+        channel.connect(socket_path)
+        channel.sendall((MSG_SESSION + " " + session_id + "\n").encode("utf-8"))
+        messages = channel.makefile("r", encoding="utf-8")
+        if messages.readline().rstrip("\n") != MSG_READY:
+            channel.close()
+            return
+        channel.settimeout(None)
+    except OSError as e:
+        print("Render sessions server not available, using message files: " + str(e))
+        return
+
+    # Abort may have been requested before session was registered.
+    _abort_received = os.path.exists(session_folder() + "/" + ABORT_MSG_FILE)
+    _channel = channel
+
+    read_thread = threading.Thread(target=_read_app_messages, args=(messages,))
+    read_thread.daemon = True
+    read_thread.start()
+
+def _read_app_messages(messages):
+    global _abort_received
+    try:
+        for line in messages:
+            if line.rstrip("\n") == MSG_ABORT:
+                _abort_received = True
+    except OSError:
+        pass
+
+    _close_channel() # Application closed connection, use message files.
+
+def _send_message(msg):
+    with _channel_lock:
+        if _channel == None:
+            return False
+        try:
+            _channel.sendall((msg + "\n").encode("utf-8"))
+            return True
+        except OSError:
+            pass
+
+    _close_channel()
+    return False
+
+def _close_channel():
+    global _channel
+    with _channel_lock:
+        if _channel != None:
+            try:
+                _channel.close()
+            except OSError:
+                pass
+        _channel = None
+
 
 # ------------------------------------------------------ headless session folders and files, used by render processes
 def init_session_folders(session_id):
@@ -128,10 +355,14 @@ def init_session_folders(session_id):
     if not os.path.exists(_rendered_frames_folder_internal):
         os.mkdir(_rendered_frames_folder_internal)
 
+    _connect_to_sessions_server(session_id)
+
 def delete_internal_folders(session_id):
     # This works only if clip frames and rendered frames folder are empty already.
     # This is used my motinheadless.py that uses container clips folders only to communicate render status
     # back and forth.
+    delete_session_data(session_id)
+
     _session_folder = _get_session_folder(session_id)
     _clip_frames_folder_internal = _session_folder + CLIP_FRAMES_DIR
     _rendered_frames_folder_internal = _session_folder + RENDERED_FRAMES_DIR
@@ -173,6 +404,9 @@ def rendered_frames_folder():
         return _render_data.render_dir + RENDERED_FRAMES_DIR
 
 def write_status_message(msg):
+    if _send_message(MSG_STATUS + " " + msg) == True:
+        return
+
     try:
         status_msg_file = session_folder() + "/" + STATUS_MSG_FILE
         with atomicfile.AtomicFileWriter(status_msg_file, "w") as afw:
@@ -182,6 +416,9 @@ def write_status_message(msg):
         pass # this failing because we can't get file access will show as progress hickup to user, we don't care
 
 def write_completed_message():
+    if _send_message(MSG_COMPLETED) == True:
+        return
+
     completed_msg_file = session_folder() + "/" + COMPLETED_MSG_FILE
     script_text = "##completed##" # let's put something in here
     with atomicfile.AtomicFileWriter(completed_msg_file, "w") as afw:
@@ -214,6 +451,9 @@ def delete_rendered_frames():
         os.remove(file_path)
 
 def abort_requested():
+    if _channel != None:
+        return _abort_received
+
     abort_file = session_folder() + "/" + ABORT_MSG_FILE
     if os.path.exists(abort_file):
         return True
@@ -0,0 +1,200 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module runs headless workers server and launches headless render processes from it.
+
+Server process initializes MLT enviroment with mltheadlessutils.init_mlt_env() and imports
+headless tool modules once at application start. Application sends jobs to it over a local socket.
+Job is a launch script name with its command line args. Server forks a process for every job
+and the forked process runs the launch script with given args, mltheadlessutils.mlt_env_init()
+then only inits session data.
+
+Server runs in a single thread so that it can be forked safely. It exits when application exits.
+If server is not available jobs are launched as new processes from launch scripts.
+"""
+
+import json
+import os
+import runpy
+import socket
+import subprocess
+import sys
+import threading
+
+import mltheadlessutils
+import respaths
+import userfolders
+
+WORKERS_SOCKET_NAME = "headless_workers_"
+ACCEPT_TIMEOUT = 1.0 # seconds, finished processes are reaped and application is checked this often
+CONNECT_TIMEOUT = 2.0 # seconds
+
+# Launch scripts of tools that use mltheadlessutils.mlt_env_init() and their modules.
+POOLED_LAUNCHERS = {"flowbladeproxyheadless":"proxyheadless",
+                    "flowblademotionheadless":"motionheadless",
+                    "flowblademltxmlheadless":"mltxmlheadless",
+                    "flowbladerenderheadless":"renderheadless"}
+
+_workers_socket_path = None
+_workers_process = None
+
+
+# ----------------------------------------------------- application interface
+def start_workers_server():
+    global _workers_socket_path, _workers_process
+    if _workers_process != None:
+        return
+
+    socket_path = userfolders.get_cache_dir() + WORKERS_SOCKET_NAME + str(os.getpid())
+    args = ["nice", "-n", str(10), respaths.LAUNCH_DIR + "flowbladeheadlessworkers",
+            "app_pid:" + str(os.getpid()), "socket_path:" + socket_path]
+    try:
+        _workers_process = subprocess.Popen(args)
+    except OSError as e:
+        print("Headless workers server could not be started: " + str(e))
+        return
+
+    _workers_socket_path = socket_path
+
+def launch_headless_process(launcher, args):
+    """
+    Runs launch script with args in process forked from workers server,
+    or in a new process if server is not available.
+    """
+    if _launch_in_workers_server(launcher, args) == True:
+        return
+
+    # Run with nice to lower priority so that editing and playback are not slowed down
+    nice_command = "nice -n " + str(10) + " " + respaths.LAUNCH_DIR + launcher
+    for arg in args:
+        nice_command += " "
+        nice_command += arg
+
+    subprocess.Popen([nice_command], shell=True)
+
+def _launch_in_workers_server(launcher, args):
+    # Server is not ready to take jobs until MLT enviroment has been initialized and it is listening.
+    if _workers_socket_path == None or not(launcher in POOLED_LAUNCHERS):
+        return False
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as channel:
+            channel.settimeout(CONNECT_TIMEOUT)
+            channel.connect(_workers_socket_path)
+            # Args are not passed through shell, so spaces escaped for it are unescaped here.
+            job_args = [arg.replace("\\ ", " ") for arg in args]
+            job = {"launcher":launcher, "args":job_args, "env":dict(os.environ)}
+            channel.sendall((json.dumps(job) + "\n").encode("utf-8"))
+            with channel.makefile("r", encoding="utf-8") as reply:
+                return reply.readline().startswith("started")
+    except (OSError, ValueError):
+        return False
+
+
+# ----------------------------------------------------- workers server
+def main(root_path, app_pid, socket_path):
+    mltheadlessutils.init_mlt_env(root_path)
+
+    # Tool modules are imported before forking so that processes do not need to do it.
+    for module_name in POOLED_LAUNCHERS.values():
+        __import__(module_name)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.bind(socket_path)
+    server_socket.listen(16)
+    server_socket.settimeout(ACCEPT_TIMEOUT)
+
+    print("Headless workers server ready")
+
+    try:
+        while os.getppid() == int(app_pid):
+            _reap_finished_processes()
+            try:
+                connection, address = server_socket.accept()
+            except socket.timeout:
+                continue
+
+            with connection:
+                connection.settimeout(CONNECT_TIMEOUT)
+                try:
+                    with connection.makefile("r", encoding="utf-8") as messages:
+                        job = json.loads(messages.readline())
+                except (OSError, ValueError):
+                    continue
+
+                if not(job.get("launcher") in POOLED_LAUNCHERS):
+                    connection.sendall("unknown launcher\n".encode("utf-8"))
+                    continue
+
+                pid = os.fork()
+                if pid == 0:
+                    server_socket.close()
+                    connection.close()
+                    _run_job(job)
+
+                connection.sendall(("started " + str(pid) + "\n").encode("utf-8"))
+    finally:
+        server_socket.close()
+        os.remove(socket_path)
+
+def _reap_finished_processes():
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+def _run_job(job):
+    """
+    Runs in forked process and never returns.
+    """
+    exit_code = 0
+    try:
+        # Application enviroment has render sessions socket path that may have changed since server was launched.
+        os.environ.clear()
+        os.environ.update(job["env"])
+
+        launcher_path = respaths.LAUNCH_DIR + job["launcher"]
+        sys.argv = [launcher_path] + job["args"]
+        runpy.run_path(launcher_path, run_name="__main__")
+
+        # Launch scripts return after starting render thread.
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and thread.daemon == False:
+                thread.join()
+    except SystemExit as e:
+        if e.code == None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            exit_code = 1
+    except Exception as e:
+        print("Headless worker job " + job["launcher"] + " failed: " + str(e))
+        exit_code = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(exit_code)
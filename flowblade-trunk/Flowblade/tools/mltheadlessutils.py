@@ -21,6 +21,9 @@
 """
 Module provides utility methods for moduless creating headless render procesesses
 in initialized Flowblade/MLT enviroment.
+
+MLT enviroment is initialized only once per process. Processes forked from 
+headless workers server have it initialized already and only init session data.
 """
 
 import locale
@@ -40,10 +43,58 @@ import respaths
 import translations
 import userfolders
 
+_env_initialized = False
+
+
+def mlt_env_init(root_path, session_id, render_env_only=False):
+    if _env_initialized == False and render_env_only == True:
+        init_mlt_render_env(root_path)
+    elif _env_initialized == False:
+        init_mlt_env(root_path)
+    else:
+        editorpersistance.load() # prefs may have changed after enviroment was initialized
+
+    ccrutils.init_session_folders(session_id)
+    
+    ccrutils.load_render_data()
+    render_data = ccrutils.get_render_data()
+    
+    # This needs to have render data loaded to know if we are using external folders.
+    ccrutils.maybe_init_external_session_folders()
+    
+    return render_data
 
-def mlt_env_init(root_path, session_id):
+def init_mlt_env(root_path):
+    global _env_initialized
     os.nice(10) # make user configurable
 
+    repo = _init_render_env(root_path)
+
+    # Init translations module with translations data
+    translations.init_languages()
+    translations.load_filters_translations()
+    mlttransitions.init_module()
+
+    # Check for codecs and formats on the system
+    mltenv.check_available_features(repo)
+    renderconsumer.load_render_profiles()
+
+    # Load filter and compositor descriptions from xml files.
+    mltfilters.load_filters_xml(mltenv.services)
+    mlttransitions.load_compositors_xml(mltenv.transitions)
+
+    _env_initialized = True
+
+def init_mlt_render_env(root_path):
+    """
+    Inits only what is needed to render MLT XML files with given consumer args.
+    Used by processes launched from headless render processes, these already have lowered priority.
+    """
+    global _env_initialized
+    _init_render_env(root_path)
+    _env_initialized = True
+
+def _init_render_env(root_path):
     try:
         editorstate.mlt_version = mlt.LIBMLT_VERSION
     except:
@@ -55,36 +106,15 @@ def mlt_env_init(root_path, session_id):
     userfolders.init()
     editorpersistance.load()
 
-    # Init translations module with translations data
-    translations.init_languages()
-    translations.load_filters_translations()
-    mlttransitions.init_module()
-
     repo = mlt.Factory().init()
     processutils.prepare_mlt_repo(repo)
     
     # Set numeric locale to use "." as radix, MLT initilizes this to OS locale and this causes bugs 
     locale.setlocale(locale.LC_NUMERIC, 'C')
 
-    # Check for codecs and formats on the system
-    mltenv.check_available_features(repo)
-    renderconsumer.load_render_profiles()
-
-    # Load filter and compositor descriptions from xml files.
-    mltfilters.load_filters_xml(mltenv.services)
-    mlttransitions.load_compositors_xml(mltenv.transitions)
-
     # Create list of available mlt profiles
     mltprofiles.load_profile_list()
-    
-    ccrutils.init_session_folders(session_id)
-    
-    ccrutils.load_render_data()
-    render_data = ccrutils.get_render_data()
-    
-    # This needs to have render data loaded to know if we are using external folders.
-    ccrutils.maybe_init_external_session_folders()
-    
-    return render_data
+
+    return repo
 
 
@@ -0,0 +1,385 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module renders timeline in a separate process from MLT XML snapshot of the sequence
+written when render was launched, so that editing and playback stay available and 
+later edits do not affect render.
+
+Render range can be split into chunks that are rendered by parallel worker processes 
+from the same snapshot. Chunks are then joined with ffmpeg concat demuxer without re-encoding.
+Chunk lengths are multiples of encoder GOP size if it is set in render args, so that
+joined file has same keyframe interval as a linear render.
+
+Chunks are rendered without audio and audio is rendered once for the whole range by
+another worker, and muxed into joined file. Joining encoded audio chunks would leave gaps
+at chunk boundaries from encoder priming and padding, and audio would drift.
+"""
+
+import mlt
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import ccrutils
+import mltheadlessutils
+import mltprofiles
+import renderconsumer
+import respaths
+
+SNAPSHOT_FILE = "snapshot.xml"
+CHUNK_FILE = "chunk_"
+CHUNKS_LIST_FILE = "chunks.txt"
+AUDIO_CHUNK = "audio" # chunk worker arg for worker rendering audio of whole range
+
+MIN_CHUNK_FRAMES = 250 # shorter chunks are not worth the cost of starting worker processes
+FRAME_SEQUENCE_CODECS = ["png","bmp","dpx","ppm","targa","tiff"]
+CMD_FFMPEG = "ffmpeg"
+
+PROGRESS_MSG = "progress" # chunk worker -> render process, followed by number of frames rendered
+
+_render_thread = None
+
+
+# ----------------------------------------------------- render data
+class TimelineRenderData:
+    """
+    Passed to render process in session folder render data file.
+    """
+    def __init__(self, render_path, args_vals_list, profile_desc, start_frame, end_frame, wait_for_producer_end_stop,
+                 chunks=1, chunk_workers=1):
+        self.render_path = render_path
+        self.args_vals_list = args_vals_list
+        self.profile_desc = profile_desc
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.wait_for_producer_end_stop = wait_for_producer_end_stop
+        self.chunks = chunks # 1 for linear render
+        self.chunk_workers = chunk_workers
+        self.save_internally = True # Session folders are only used for messages, snapshot and chunks.
+
+    def get_argval(self, arg_key):
+        for arg, val in self.args_vals_list:
+            if arg == arg_key:
+                return val
+        return None
+
+    def has_audio(self):
+        return self.get_argval("an") == None
+
+    def is_frame_sequence_render(self):
+        return self.get_argval("vcodec") in FRAME_SEQUENCE_CODECS and self.get_argval("f") == None
+
+    def get_gop_size(self):
+        try:
+            return max(1, int(self.get_argval("g")))
+        except (TypeError, ValueError):
+            return 1 # No GOP size in args, encoder starts every chunk with a keyframe anyway.
+
+    def get_chunk_ranges(self, producer_length):
+        end_frame = self.end_frame
+        if self.wait_for_producer_end_stop == True:
+            end_frame = producer_length - 1 # Full length renders include last frame of producer.
+        return get_chunk_ranges(self.start_frame, end_frame, self.chunks, self.get_gop_size())
+
+
+# ----------------------------------------------------- module interface with message files
+# We are using message files to communicate with application.
+def create_session_folder(session_id):
+    ccrutils.create_session_folder(session_id)
+
+def set_render_data(session_id, render_data):
+    ccrutils.set_render_data(session_id, render_data)
+
+def session_render_complete(session_id):
+    return ccrutils.session_render_complete(session_id)
+
+def get_session_status(session_id):
+    msg = ccrutils.get_session_status_message(session_id)
+    if msg == None:
+        return None
+    fraction, elapsed = msg.split(" ")
+    return (fraction, elapsed)
+    
+def abort_render(session_id):
+    ccrutils.abort_render(session_id)
+
+def delete_session_folders(session_id):
+     ccrutils.delete_internal_folders(session_id)
+
+def get_snapshot_path(session_id):
+    return ccrutils._get_session_folder(session_id) + "/" + SNAPSHOT_FILE
+
+def get_chunk_ranges(start_frame, end_frame, chunks, gop_size):
+    """
+    Returns list of (first frame, last frame) tuples covering range, or one range if it is too short to split.
+    Chunk boundaries are at multiples of gop_size from start frame.
+    """
+    length = end_frame - start_frame + 1
+    chunks = min(chunks, length // MIN_CHUNK_FRAMES)
+    if chunks <= 1:
+        return [(start_frame, end_frame)]
+
+    chunk_length = -(-length // chunks)
+    chunk_length = -(-chunk_length // gop_size) * gop_size
+    
+    ranges = []
+    for chunk_start in range(start_frame, end_frame + 1, chunk_length):
+        ranges.append((chunk_start, min(chunk_start + chunk_length - 1, end_frame)))
+    return ranges
+
+
+# --------------------------------------------------- render thread launch
+def main(root_path, session_id, chunk_index=None):
+    
+    # Chunk workers inherit priority from render process and only need enviroment for rendering.
+    render_data = mltheadlessutils.mlt_env_init(root_path, session_id, chunk_index != None)
+
+    global _render_thread
+    if chunk_index == None:
+        _render_thread = TimelineRenderThread(render_data, get_snapshot_path(session_id), session_id)
+    elif chunk_index == AUDIO_CHUNK:
+        _render_thread = ChunkRenderThread(render_data, get_snapshot_path(session_id), AUDIO_CHUNK)
+    else:
+        _render_thread = ChunkRenderThread(render_data, get_snapshot_path(session_id), int(chunk_index))
+    _render_thread.start()
+
+
+
+class TimelineRenderThread(threading.Thread):
+
+    def __init__(self, render_data, xml_file_path, session_id):
+        threading.Thread.__init__(self)
+
+        self.render_data = render_data # TimelineRenderData object
+        self.xml_file_path = xml_file_path
+        self.session_id = session_id
+        self.abort = False
+
+    def run(self):
+        self.start_time = time.monotonic()
+
+        if self.chunked_render_possible() == True:
+            if self.render_chunks() == True:
+                ccrutils.write_completed_message()
+                return
+            if self.abort == True:
+                return
+            # Range too short to split or worker failed.
+
+        profile = mltprofiles.get_profile(self.render_data.profile_desc)
+        producer = mlt.Producer(profile, str(self.xml_file_path))
+
+        vcodec = self.render_data.get_argval("vcodec")
+        if self.render_data.is_frame_sequence_render() == True:
+            # Frame sequence render
+            ext = vcodec
+            if vcodec == "targa":
+                ext = "tga"
+            consumer = renderconsumer.get_img_seq_render_consumer_codec_ext(self.render_data.render_path, profile, vcodec, ext)
+        else:
+            consumer = renderconsumer.get_mlt_render_consumer(self.render_data.render_path, profile, self.render_data.args_vals_list)
+
+        self.render_player = renderconsumer.FileRenderPlayer(None, producer, consumer, self.render_data.start_frame, self.render_data.end_frame)
+        self.render_player.wait_for_producer_end_stop = self.render_data.wait_for_producer_end_stop
+        self.render_player.start()
+
+        while self.render_player.stopped == False:
+            
+            self.check_abort_requested()
+            
+            if self.abort == True:
+                self.render_player.shutdown()
+                return
+            
+            fraction = self.render_player.get_render_fraction()
+            self.render_update(fraction)
+
+            time.sleep(0.3)
+
+        # Write out completed flag file.
+        ccrutils.write_completed_message()
+
+    def chunked_render_possible(self):
+        # Frame sequences are written as separate files and can't be joined.
+        if self.render_data.chunks <= 1 or self.render_data.is_frame_sequence_render() == True:
+            return False
+        return shutil.which(CMD_FFMPEG) != None
+
+    def render_chunks(self):
+        """
+        Returns True if all chunks were rendered and joined to render file.
+        """
+        profile = mltprofiles.get_profile(self.render_data.profile_desc)
+        producer_length = mlt.Producer(profile, str(self.xml_file_path)).get_length()
+        ranges = self.render_data.get_chunk_ranges(producer_length)
+        if len(ranges) == 1:
+            return False
+
+        # Workers must not connect to sessions server, only this process reports to application.
+        worker_env = dict(os.environ)
+        worker_env.pop(ccrutils.SESSIONS_SOCKET_ENV, None)
+
+        # Progress is shown for video chunks, audio render is much faster.
+        total_frames = ranges[-1][1] - ranges[0][0] + 1
+        frames_done = {} # chunk index -> frames rendered
+        waiting = list(range(0, len(ranges)))
+        if self.render_data.has_audio() == True:
+            waiting.insert(0, AUDIO_CHUNK)
+        workers = {} # chunk index -> worker process
+        
+        while len(waiting) > 0 or len(workers) > 0:
+            self.check_abort_requested()
+            if self.abort == True:
+                self.stop_workers(workers)
+                return False
+
+            while len(waiting) > 0 and len(workers) < self.render_data.chunk_workers:
+                chunk_index = waiting.pop(0)
+                workers[chunk_index] = self.launch_chunk_worker(chunk_index, worker_env, frames_done)
+
+            for chunk_index, worker in list(workers.items()):
+                if worker.poll() == None:
+                    continue
+                del workers[chunk_index]
+                if worker.returncode != 0:
+                    print("Chunk " + str(chunk_index) + " render failed")
+                    self.stop_workers(workers)
+                    return False
+                if chunk_index != AUDIO_CHUNK:
+                    first, last = ranges[chunk_index]
+                    frames_done[chunk_index] = last - first + 1
+
+            video_frames_done = sum([frames for chunk_index, frames in list(frames_done.items()) if chunk_index != AUDIO_CHUNK])
+            self.render_update(float(video_frames_done) / float(total_frames))
+            time.sleep(0.3)
+
+        return self.join_chunks(len(ranges))
+
+    def launch_chunk_worker(self, chunk_index, worker_env, frames_done):
+        worker = subprocess.Popen([sys.executable, respaths.LAUNCH_DIR + "flowbladerenderheadless", 
+                                   "session_id:" + self.session_id, "chunk:" + str(chunk_index)],
+                                   stdout=subprocess.PIPE, universal_newlines=True, env=worker_env)
+
+        progress_thread = threading.Thread(target=_read_chunk_progress, args=(worker, chunk_index, frames_done))
+        progress_thread.daemon = True
+        progress_thread.start()
+
+        return worker
+
+    def stop_workers(self, workers):
+        for worker in workers.values():
+            worker.kill()
+            worker.wait()
+
+    def join_chunks(self, chunks_count):
+        list_path = ccrutils.session_folder() + "/" + CHUNKS_LIST_FILE
+        with open(list_path, "w") as f:
+            for chunk_index in range(0, chunks_count):
+                chunk_path = get_chunk_path(self.render_data, chunk_index)
+                f.write("file '" + chunk_path.replace("'", "'\\''") + "'\n")
+
+        ffmpeg_call = [CMD_FFMPEG, "-v", "error", "-nostdin", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        audio_path = get_chunk_path(self.render_data, AUDIO_CHUNK)
+        if self.render_data.has_audio() == True:
+            ffmpeg_call += ["-i", audio_path, "-map", "0:v", "-map", "1:a?"]
+        else:
+            ffmpeg_call += ["-map", "0"]
+        ffmpeg_call += ["-c", "copy"]
+        container_format = self.render_data.get_argval("f")
+        if container_format != None:
+            ffmpeg_call += ["-f", container_format]
+        ffmpeg_call.append(self.render_data.render_path)
+        
+        try:
+            joined = subprocess.call(ffmpeg_call) == 0
+        except OSError:
+            joined = False
+
+        for chunk_index in range(0, chunks_count):
+            chunk_path = get_chunk_path(self.render_data, chunk_index)
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+        os.remove(list_path)
+
+        return joined
+
+    def check_abort_requested(self):
+        self.abort = ccrutils.abort_requested()
+
+    def render_update(self, fraction):
+        elapsed = time.monotonic() - self.start_time
+        msg = str(fraction) + " " + str(elapsed)
+        ccrutils.write_status_message(msg)
+
+
+def _read_chunk_progress(worker, chunk_index, frames_done):
+    for line in worker.stdout:
+        msg_type, sep, frames = line.strip().partition(" ")
+        if msg_type == PROGRESS_MSG:
+            frames_done[chunk_index] = int(frames)
+
+def get_chunk_path(render_data, chunk_index):
+    # Chunks have same extension as render file so that they are written in same container format.
+    name, ext = os.path.splitext(render_data.render_path)
+    return ccrutils.session_folder() + "/" + CHUNK_FILE + str(chunk_index) + ext
+
+
+class ChunkRenderThread(threading.Thread):
+    """
+    Renders one chunk without audio, or audio of whole range, in worker process
+    and writes progress to stdout for render process.
+    """
+    def __init__(self, render_data, xml_file_path, chunk_index):
+        threading.Thread.__init__(self)
+
+        self.render_data = render_data # TimelineRenderData object
+        self.xml_file_path = xml_file_path
+        self.chunk_index = chunk_index
+
+    def run(self):
+        profile = mltprofiles.get_profile(self.render_data.profile_desc)
+        producer = mlt.Producer(profile, str(self.xml_file_path))
+
+        ranges = self.render_data.get_chunk_ranges(producer.get_length())
+        if self.chunk_index == AUDIO_CHUNK:
+            first = ranges[0][0]
+            last = ranges[-1][1]
+            args_vals_list = self.render_data.args_vals_list + [("vn", "1"), ("video_off", "1")]
+        else:
+            first, last = ranges[self.chunk_index]
+            args_vals_list = self.render_data.args_vals_list + [("an", "1"), ("audio_off", "1")]
+
+        # Rendering a cut until producer end gives exact chunk range.
+        chunk_producer = producer.cut(first, last)
+        consumer = renderconsumer.get_mlt_render_consumer(get_chunk_path(self.render_data, self.chunk_index), profile, args_vals_list)
+        
+        render_player = renderconsumer.FileRenderPlayer(None, chunk_producer, consumer, 0, last - first)
+        render_player.wait_for_producer_end_stop = True
+        render_player.start()
+
+        while render_player.stopped == False:
+            print(PROGRESS_MSG + " " + str(chunk_producer.frame()), flush=True)
+            time.sleep(0.3)
@@ -22,6 +22,10 @@
 Module handles user edit events for trim, roll and slip trim modes. 
 """
 
+import threading
+
+from gi.repository import GLib
+
 import appconsts
 import dialogutils
 import edit
@@ -31,6 +35,7 @@ from editorstate import current_sequence
 from editorstate import PLAYER
 from editorstate import EDIT_MODE
 import gui
+import producerpool
 import tlinewidgets
 import updater
 
@@ -74,6 +79,12 @@ submode = NOTHING_ON
 
 MAX_DELTA = 100000000
 
+# Number of clips on both sides of trimmed clip that have trim clips created in background.
+PREWARM_NEIGHBOURS = 2
+
+# Media paths that have trim clips being created in background.
+_prewarming_paths = set()
+
 # ------------------------------------ module functions       
 def _get_trim_edit(track, frame):
     """
@@ -383,6 +394,60 @@ def _slide_trim_right(delta):
 def _slide_enter_edit():
     _do_slide_edit()
     
+# ------------------------------------- trim clips prewarm
+def _prewarm_neighbour_trim_clips(track, clip):
+    """
+    Creates trim clips for clips next to trimmed clip in background so that
+    trims on neighbouring cuts start without opening media files.
+    """
+    try:
+        clip_index = current_sequence().get_clip_position(track, clip)
+    except ValueError:
+        return
+
+    prewarm_clips = []
+    first = max(0, clip_index - PREWARM_NEIGHBOURS)
+    last = min(len(track.clips), clip_index + PREWARM_NEIGHBOURS + 1)
+    for i in range(first, last):
+        neighbour = track.clips[i]
+        if neighbour.is_blanck_clip == True or neighbour.media_type == appconsts.PATTERN_PRODUCER:
+            continue
+        if editorstate.trim_clip_is_cached(neighbour.path) or neighbour.path in _prewarming_paths:
+            continue
+        _prewarming_paths.add(neighbour.path)
+        prewarm_clips.append((neighbour.path, neighbour.ttl))
+
+    if len(prewarm_clips) > 0:
+        TrimClipsPrewarmThread(current_sequence(), prewarm_clips).start()
+
+def _prewarmed_producer_ready(seq, producer, path, ttl):
+    _prewarming_paths.discard(path)
+    if seq is not current_sequence() or editorstate.trim_clip_is_cached(path) or producer.is_valid() == False:
+        return False
+
+    clip = seq.init_file_producer_clip(producer, path, None, ttl)
+    if clip != None:
+        editorstate.add_cached_trim_clip(clip)
+    return False
+
+
+class TrimClipsPrewarmThread(threading.Thread):
+    
+    def __init__(self, seq, prewarm_clips):
+        threading.Thread.__init__(self)
+        self.seq = seq
+        self.prewarm_clips = prewarm_clips # list of (path, ttl) tuples
+
+    def run(self):
+        for path, ttl in self.prewarm_clips:
+            producer = producerpool.get_producer(self.seq.profile, path, ttl)
+            if producer.is_valid() == True:
+                producer.get_frame() # Opens media file for decoding.
+
+            # Clip attributes are added in the thread that edits sequence.
+            GLib.idle_add(_prewarmed_producer_ready, self.seq, producer, path, ttl)
+
+
 # ------------------------------------- ONE ROLL TRIM EVENTS
 def set_oneroll_mode(track, current_frame=-1, editing_to_clip=None):
     """
@@ -497,6 +562,7 @@ def set_oneroll_mode(track, current_frame=-1, editing_to_clip=None):
     # Set interactive trimview on hidden track
     if clip.media_type != appconsts.PATTERN_PRODUCER:
         current_sequence().display_trim_clip(clip.path, clip_start, None, clip.ttl) # file producer
+        _prewarm_neighbour_trim_clips(track, clip)
     else:
         current_sequence().display_trim_clip(None, clip_start, clip.create_data, None) # pattern producer
 
@@ -1000,6 +1066,7 @@ def set_tworoll_mode(track, current_frame = -1):
     # Set interactive trim view clip on hidden track
     if clip.media_type != appconsts.PATTERN_PRODUCER:
         current_sequence().display_trim_clip(clip.path, clip_start, None, clip.ttl) # File producer
+        _prewarm_neighbour_trim_clips(track, clip)
     else:
         current_sequence().display_trim_clip(None, clip_start, clip.create_data, None) # pattern producer
         
@@ -1282,6 +1349,7 @@ def set_slide_mode(track, current_frame):
     # Set interactive trim view clip on hidden track
     if clip.media_type != appconsts.PATTERN_PRODUCER:
         current_sequence().display_trim_clip(clip.path, clip_start, None, clip.ttl) # File producer
+        _prewarm_neighbour_trim_clips(track, clip)
     else:
         current_sequence().display_trim_clip(None, clip_start, clip.create_data, None) # pattern producer
         
@@ -21,15 +21,40 @@
 """
 Module manages undo and redo stacks and executes edit actions from them
 on user requests.
+
+Undo stack size is limited by estimated memory use of clips that edit actions
+keep after they have been removed from timeline. Edit actions further then FULL_UNDOS
+from stack pointer have their removed clips replaced with ClipDescription objects that
+do not hold MLT producers, and clips are rebuilt from them when edits are undone or redone.
 """
+import os
 import time
+import types
+import weakref
+
+import appconsts
+import autosave
+import editorpersistance
 import editorstate
+import mltfilters
+import mltrefhold
+import tlinerender
 
 set_post_undo_redo_edit_mode = None # This is set at startup to avoid circular imports.
 repaint_tline = None
 
-# Max stack size.
-MAX_UNDOS = 35
+# Max stack size, stack is also limited by estimated memory use.
+MAX_UNDOS = 1000
+
+# Edit actions this close to stack pointer keep removed clips as MLT producers.
+FULL_UNDOS = 35
+
+# Memory use estimates for undo stack data.
+CLIP_BASE_BYTES = 2000000 # decoder context and buffers
+CLIP_FRAME_BUFFERS = 4 # RGBA frames kept by producer
+FILTER_BYTES = 50000
+CLIP_DESCRIPTION_BYTES = 5000
+EDIT_ACTION_BYTES = 2000
 
 # EditActions are placed in this stack after their do_edit()
 # method has been called.
@@ -41,15 +66,33 @@ undo_stack = []
 # no redos.
 index = 0
 
+# Clips and clip descriptions referred by each edit in undo_stack, id -> object, in stack order.
+edits_clips = []
+
+# Clips and clip descriptions referred by edits in stack, id -> [object, referring edits count, estimated bytes]
+stack_clips = {}
+stack_clips_bytes = 0
+
+# Clips in undo stack are in use.
+mltrefhold.add_roots_provider(lambda: [undo_stack])
+
 # Some menu items are set active/deactive based on undo stack state.
 save_item = None
 undo_item = None 
 redo_item = None
 
 def clear_undos():
-    global undo_stack, index
+    global undo_stack, index, edits_clips, stack_clips, stack_clips_bytes
     undo_stack = []
     index = 0
+    edits_clips = []
+    stack_clips = {}
+    stack_clips_bytes = 0
+    
+    # Objects from previous project and removed edits can now be released.
+    mltrefhold.collect()
+
+    autosave.undo_stack_changed()
 
 def set_post_undo_redo_callback(undo_redo_callback):
     global set_post_undo_redo_edit_mode
@@ -69,17 +112,18 @@ def register_edit(undo_edit):
     
     # New edit action clears all redos(== undos after index)
     if index != len(undo_stack) and (len(undo_stack) != 0):
-        del undo_stack[index:]
+        _delete_edits(index, len(undo_stack))
  
-    # Keep stack in size, if too big remove undo at 0
-    if len(undo_stack) > MAX_UNDOS:
-        del undo_stack[0]
-        index = index - 1
-        
     # Add to stack and grow index
     undo_stack.append(undo_edit);
+    edits_clips.append({})
+    _set_edit_clips(len(undo_stack) - 1)
     index = index + 1
-    
+
+    # Keep stack in size and memory budget, this may remove undos from start of stack
+    _enforce_memory_budget()
+    mltrefhold.collect_if_needed()
+
     save_item.set_sensitive(True) # Disabled at load and save, first edit enables
     undo_item.set_sensitive(True)
     redo_item.set_sensitive(False)
@@ -109,7 +153,17 @@ def do_undo():
     # Move stack pointer down and do undo
     index = index - 1
     undo_edit = undo_stack[index]
+    if _restore_clips(index) == False:
+        # Edit can't be undone, so it and all edits before it are dropped.
+        _delete_edits(0, index + 1)
+        index = 0
+        undo_item.set_sensitive(False)
+        autosave.undo_stack_changed()
+        return
+
     undo_edit.undo()
+    _set_edit_clips(index) # Undo may have created new clips in edit.
+    autosave.undo_done()
     
     if index == 0:
         undo_item.set_sensitive(False)
@@ -134,8 +188,20 @@ def do_redo():
 
     # Do redo and move stack pointer up
     redo_edit = undo_stack[index]
+    if _restore_clips(index) == False:
+        # Edit can't be redone, so it and all edits after it are dropped.
+        _delete_edits(index, len(undo_stack))
+        redo_item.set_sensitive(False)
+        autosave.undo_stack_changed()
+        return
+
     redo_edit.redo()
+    _set_edit_clips(index) # Redo may have created new clips in edit.
     index = index + 1
+    autosave.redo_done()
+    
+    # Edit that left full undos range in stack now keeps only clips that are still needed.
+    _describe_edit_clips(index - FULL_UNDOS - 1)
 
     if index == len(undo_stack):
         redo_item.set_sensitive(False)
@@ -146,6 +212,410 @@ def _set_post_edit_mode():
     if editorstate.edit_mode != editorstate.INSERT_MOVE:
         set_post_undo_redo_edit_mode()
 
+
+# ------------------------------------------------------- memory budget
+class ClipDescription:
+    """
+    Replaces a clip removed from timeline in older edit actions.
+    
+    Python attributes, non-internal MLT properties and filter objects of the clip are kept
+    so that a clip that can be used in place of the original can be created when needed.
+    If path is given, created clip uses that media file and MLT properties come from it.
+
+    Filters are not detached from described clip as it may still be used elsewhere, e.g. in
+    clipboard. If described clip is still alive when clip is needed it is used again. If path has
+    changed, created clip gets filters and still alive described clip gets copies of them.
+    """
+    def __init__(self, clip, path=None):
+        self.clip_dict = dict(clip.__dict__)
+        # SWIG pointer and length function are specific to MLT object.
+        self.clip_dict.pop("this", None)
+        self.clip_dict.pop("clip_length", None)
+
+        try:
+            self.clip_ref = weakref.ref(clip)
+        except TypeError:
+            self.clip_ref = None # Described clip may be alive, created clips get copies of filters.
+
+        self.path_changed = False
+        self.properties = []
+        if path != None:
+            self.set_path(path)
+        else:
+            for i in range(0, clip.count()):
+                name = clip.get_name(i)
+                if name.startswith("_"):
+                    continue
+                value = clip.get(name)
+                if value != None:
+                    self.properties.append((name, value))
+
+    def create_clip(self):
+        """
+        Returns clip or None if media file is no longer available.
+        """
+        described_clip = None
+        if self.clip_ref != None:
+            described_clip = self.clip_ref()
+        if described_clip != None and self.path_changed == False:
+            mltrefhold.hold_ref(described_clip)
+            return described_clip
+
+        seq = editorstate.current_sequence()
+        if "speed" in self.clip_dict:
+            clip = seq.create_slowmotion_producer(self.clip_dict["path"], self.clip_dict["speed"])
+        else:
+            clip = seq.create_file_producer_clip(self.clip_dict["path"], None, False, self.clip_dict["ttl"])
+        if clip == None:
+            return None
+
+        for name, value in self.properties:
+            clip.set(name, value)
+        clip.__dict__.update(self.clip_dict)
+
+        if self.clip_ref == None:
+            _attach_filter_clones(clip, self.clip_dict["filters"], self.clip_dict["mute_filter"])
+            return clip
+
+        if described_clip != None:
+            # Filters are moved to created clip that replaces described clip in timeline and stack.
+            filters = described_clip.filters
+            mute_filter = described_clip.mute_filter
+            mltfilters.detach_all_filters(described_clip)
+            if mute_filter != None:
+                described_clip.detach(mute_filter.mlt_filter)
+            _attach_filter_clones(described_clip, filters, mute_filter)
+
+        clip.filters = self.clip_dict["filters"]
+        clip.mute_filter = self.clip_dict["mute_filter"]
+        mltfilters.attach_all_filters(clip)
+        if clip.mute_filter != None:
+            clip.attach(clip.mute_filter.mlt_filter)
+        tlinerender.clip_filters_changed(clip)
+
+        return clip
+
+    def set_path(self, path):
+        self.clip_dict["path"] = path
+        self.path_changed = True
+        self.properties = []
+
+    def get_estimated_bytes(self):
+        return CLIP_DESCRIPTION_BYTES + len(self.clip_dict["filters"]) * FILTER_BYTES
+
+
+def _attach_filter_clones(clip, filters, mute_filter):
+    seq = editorstate.current_sequence()
+    clip.filters = []
+    for f in filters:
+        if isinstance(f, mltfilters.FilterObject):
+            clone_filter = mltfilters.clone_filter_object(f, seq.profile)
+        else:
+            clone_filter = mltfilters.clone_multipart_filter_object(f, seq.profile, clip)
+        clone_filter.active = f.active
+        clone_filter.update_mlt_disabled_value()
+        clip.filters.append(clone_filter)
+    mltfilters.attach_all_filters(clip)
+
+    clip.mute_filter = None
+    if mute_filter != None:
+        mltfilters.do_clip_mute(clip, mltfilters.create_mute_volume_filter(seq))
+    tlinerender.clip_filters_changed(clip)
+
+def media_paths_changed(replaced_clips, path_map):
+    """
+    Called after clips in timeline have been replaced with clips using changed media paths.
+    replaced_clips is dict id(old clip) -> new clip and path_map is dict old path -> new path.
+
+    Replaced clips are also replaced in stack. Clips that are only in stack and use
+    changed paths are replaced with descriptions using new paths, or with new clips
+    if they are sync parent clips. Returns dict id(old clip) -> new clip for the latter.
+
+    Stack clips are found from clips kept for memory budget, stack is only walked
+    for edits that refer to replaced clips.
+    """
+    replacements = dict(replaced_clips)
+    changed_clips = []
+    for value_id, (value, refs, value_bytes) in stack_clips.items():
+        if value_id in replacements:
+            continue
+        if isinstance(value, ClipDescription):
+            if value.clip_dict["path"] in path_map:
+                value.set_path(path_map[value.clip_dict["path"]])
+            continue
+        if value.is_blanck_clip == True or value.media_type == appconsts.PATTERN_PRODUCER:
+            continue
+        if value.path in path_map:
+            changed_clips.append((value_id, value))
+
+    if len(changed_clips) > 0:
+        master_clips = _get_timeline_and_master_clips()[1]
+    new_clips = {}
+    released_clips = []
+    for value_id, value in changed_clips:
+        description = ClipDescription(value, path_map[value.path])
+        if value_id in master_clips:
+            new_clip = description.create_clip()
+            if new_clip == None:
+                continue
+            new_clips[value_id] = new_clip
+            replacements[value_id] = new_clip
+        else:
+            replacements[value_id] = description
+        released_clips.append(value)
+
+    for i in range(0, len(undo_stack)):
+        if len(replacements.keys() & edits_clips[i].keys()) == 0:
+            continue
+        _replace_clips(undo_stack[i], lambda value: replacements.get(id(value), value), {})
+        _set_edit_clips(i)
+    for value, refs, value_bytes in stack_clips.values():
+        replace_sync_master_clip(value, replacements)
+    
+    for clip in released_clips:
+        mltrefhold.release_ref(clip)
+
+    return new_clips
+
+def replace_sync_master_clip(clip, replacements):
+    # replacements is dict id(old clip) -> new clip
+    if isinstance(clip, ClipDescription):
+        sync_data = clip.clip_dict.get("sync_data")
+    else:
+        sync_data = getattr(clip, "sync_data", None)
+    if sync_data == None or isinstance(sync_data.master_clip, int):
+        return
+    try:
+        sync_data.master_clip = replacements[id(sync_data.master_clip)]
+    except KeyError:
+        pass
+
+def _enforce_memory_budget():
+    global index
+
+    while len(undo_stack) > MAX_UNDOS:
+        _delete_edits(0, 1)
+        index = index - 1
+
+    # Edit that left full undos range in stack now keeps only clips that are still needed.
+    _describe_edit_clips(index - FULL_UNDOS - 1)
+
+    # Stack clips that are also in timeline are not counted, they are only looked up
+    # when total size of stack clips is over budget.
+    budget = editorpersistance.prefs.undo_memory_budget * 1000000
+    if stack_clips_bytes + len(undo_stack) * EDIT_ACTION_BYTES <= budget:
+        return
+
+    timeline_clips, master_clips = _get_timeline_and_master_clips()
+    used = stack_clips_bytes + len(undo_stack) * EDIT_ACTION_BYTES
+    for clip_id in timeline_clips:
+        if clip_id in stack_clips:
+            used -= stack_clips[clip_id][2]
+
+    # Drop oldest edits until estimated memory use is within budget.
+    while used > budget and index > 1:
+        dropped_clips = _delete_edits(0, 1)
+        index = index - 1
+        used -= EDIT_ACTION_BYTES
+        for clip_id, clip, clip_bytes in dropped_clips:
+            if clip_id in timeline_clips:
+                continue
+            used -= clip_bytes
+            if not isinstance(clip, ClipDescription):
+                mltrefhold.release_ref(clip)
+
+def _describe_edit_clips(edit_index):
+    """
+    Replaces clips referred by edit that are not in timeline or in edits
+    in full undos range with descriptions in the whole stack.
+    """
+    if edit_index < 0 or edit_index >= len(undo_stack):
+        return
+
+    full_clips = set()
+    for edit_clips in edits_clips[edit_index + 1:index + FULL_UNDOS]:
+        full_clips.update(edit_clips.keys())
+
+    candidates = []
+    for clip_id, clip in edits_clips[edit_index].items():
+        if not(clip_id in full_clips) and _can_describe(clip):
+            candidates.append((clip_id, clip))
+    if len(candidates) == 0:
+        return
+
+    timeline_clips, master_clips = _get_timeline_and_master_clips()
+    descriptions = {}
+    described_clips = []
+    for clip_id, clip in candidates:
+        if clip_id in timeline_clips or clip_id in master_clips:
+            continue
+        descriptions[clip_id] = ClipDescription(clip)
+        described_clips.append(clip)
+    if len(descriptions) == 0:
+        return
+
+    for i in range(0, len(undo_stack)):
+        if len(descriptions.keys() & edits_clips[i].keys()) == 0:
+            continue
+        _replace_clips(undo_stack[i], lambda value: descriptions.get(id(value), value), {})
+        _set_edit_clips(i)
+    for clip in described_clips:
+        mltrefhold.release_ref(clip)
+
+def _get_timeline_and_master_clips():
+    timeline_clips = set()
+    master_clips = set()
+    for seq in editorstate.PROJECT().sequences:
+        for track in seq.tracks:
+            for clip in track.clips:
+                timeline_clips.add(id(clip))
+                _add_master_clip(clip, master_clips)
+    for clip, refs, clip_bytes in stack_clips.values():
+        _add_master_clip(clip, master_clips)
+    return (timeline_clips, master_clips)
+
+def _set_edit_clips(edit_index):
+    # Updates clips referred by edit after clips in it have been added or replaced.
+    global stack_clips_bytes
+    _remove_stack_clips(edits_clips[edit_index])
+    edits_clips[edit_index] = _get_clips(undo_stack[edit_index])
+    for clip_id, clip in edits_clips[edit_index].items():
+        try:
+            stack_clips[clip_id][1] += 1
+        except KeyError:
+            clip_bytes = _get_estimated_bytes(clip)
+            stack_clips[clip_id] = [clip, 1, clip_bytes]
+            stack_clips_bytes += clip_bytes
+
+def _delete_edits(start, end):
+    """
+    Deletes edits from stack, returns list of (id, object, estimated bytes) tuples
+    for clips and clip descriptions that are no longer referred from stack.
+    """
+    removed = []
+    for edit_clips in edits_clips[start:end]:
+        removed.extend(_remove_stack_clips(edit_clips))
+    del undo_stack[start:end]
+    del edits_clips[start:end]
+    return removed
+
+def _remove_stack_clips(edit_clips):
+    global stack_clips_bytes
+    removed = []
+    for clip_id in edit_clips:
+        stack_clip = stack_clips[clip_id]
+        stack_clip[1] -= 1
+        if stack_clip[1] == 0:
+            del stack_clips[clip_id]
+            stack_clips_bytes -= stack_clip[2]
+            removed.append((clip_id, stack_clip[0], stack_clip[2]))
+    return removed
+
+def _restore_clips(edit_index):
+    """
+    Replaces clip descriptions referred by edit in given stack index with created clips in the whole stack.
+    Returns False if some clip could not be created.
+    """
+    descriptions = {}
+    for value_id, value in edits_clips[edit_index].items():
+        if isinstance(value, ClipDescription):
+            descriptions[value_id] = value
+    if len(descriptions) == 0:
+        return True
+
+    clips = {}
+    for value_id, description in descriptions.items():
+        clip = description.create_clip()
+        if clip == None:
+            print("undo: could not create clip for", description.clip_dict["path"])
+            return False
+        clips[value_id] = clip
+
+    for i in range(0, len(undo_stack)):
+        if len(clips.keys() & edits_clips[i].keys()) == 0:
+            continue
+        _replace_clips(undo_stack[i], lambda value: clips.get(id(value), value), {})
+        _set_edit_clips(i)
+
+    return True
+
+def _get_clips(edit):
+    found = {}
+    def collect(value):
+        found[id(value)] = value
+        return value
+    _replace_clips(edit, collect, {})
+    return found
+
+def _replace_clips(value, replace_func, memo):
+    """
+    Returns value with clips and clip descriptions reachable from it replaced with
+    replace_func() return values. Lists, dicts and objects are changed in place, tuples are recreated.
+    MLT objects other then clips are not walked into.
+    """
+    if _is_clip(value) or isinstance(value, ClipDescription):
+        return replace_func(value)
+
+    try:
+        return memo[id(value)]
+    except KeyError:
+        pass
+
+    if isinstance(value, list):
+        memo[id(value)] = value
+        for i in range(0, len(value)):
+            value[i] = _replace_clips(value[i], replace_func, memo)
+    elif isinstance(value, dict):
+        memo[id(value)] = value
+        for key in value:
+            value[key] = _replace_clips(value[key], replace_func, memo)
+    elif isinstance(value, tuple):
+        memo[id(value)] = value
+        replaced = tuple([_replace_clips(item, replace_func, memo) for item in value])
+        memo[id(value)] = replaced
+        return replaced
+    elif _is_walkable_object(value):
+        memo[id(value)] = value
+        for name in list(value.__dict__.keys()):
+            value.__dict__[name] = _replace_clips(value.__dict__[name], replace_func, memo)
+
+    return value
+
+def _is_clip(value):
+    # Clips are MLT producers with attributes added by Sequence.add_clip_attr(), blanks included.
+    return hasattr(value, "this") and hasattr(value, "is_blanck_clip")
+
+def _is_walkable_object(value):
+    if not hasattr(value, "__dict__") or hasattr(value, "this"):
+        return False
+    if isinstance(value, (type, types.ModuleType)) or callable(value):
+        return False
+    return not type(value).__module__.startswith("gi.")
+
+def _can_describe(clip):
+    if isinstance(clip, ClipDescription) or clip.is_blanck_clip == True:
+        return False
+    if clip.media_type == appconsts.PATTERN_PRODUCER:
+        return False
+    return os.path.isfile(clip.path)
+
+def _add_master_clip(clip, master_clips):
+    # Sync parent clips are referred from child clips and can't be replaced.
+    if isinstance(clip, ClipDescription):
+        sync_data = clip.clip_dict.get("sync_data")
+    else:
+        sync_data = getattr(clip, "sync_data", None)
+    if sync_data != None and not isinstance(sync_data.master_clip, int):
+        master_clips.add(id(sync_data.master_clip))
+
+def _get_estimated_bytes(value):
+    if isinstance(value, ClipDescription):
+        return value.get_estimated_bytes()
+    if value.is_blanck_clip == True:
+        return 0
+    frame_bytes = value.get_int("width") * value.get_int("height") * 4
+    return CLIP_BASE_BYTES + frame_bytes * CLIP_FRAME_BUFFERS + len(value.filters) * FILTER_BYTES
+
 def undo_redo_stress_test():
     global undo_stack, index
     times = 10
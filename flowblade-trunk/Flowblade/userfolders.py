@@ -171,6 +171,8 @@ def _maybe_create_xdg_dirs():
         os.mkdir(get_render_dir())
     if not os.path.exists(get_data_dir() + appconsts.TLINE_RENDERS_DIR):
         os.mkdir(get_data_dir() + appconsts.TLINE_RENDERS_DIR)
+    if not os.path.exists(get_data_dir() + appconsts.TLINE_RENDERS_CACHE_DIR):
+        os.mkdir(get_data_dir() + appconsts.TLINE_RENDERS_CACHE_DIR)
     if not os.path.exists(get_data_dir() + appconsts.CONTAINER_CLIPS_DIR):
         os.mkdir(get_data_dir() + appconsts.CONTAINER_CLIPS_DIR)
     if not os.path.exists(get_data_dir() + appconsts.CONTAINER_CLIPS_UNRENDERED):
@@ -190,6 +192,8 @@ def _maybe_create_xdg_dirs():
         os.mkdir(get_cache_dir() + appconsts.AUTOSAVE_DIR)
     if not os.path.exists(get_cache_dir() + appconsts.THUMBNAILS_DIR):
         os.mkdir(get_cache_dir() + appconsts.THUMBNAILS_DIR)
+    if not os.path.exists(get_cache_dir() + appconsts.MEDIA_METADATA_DIR):
+        os.mkdir(get_cache_dir() + appconsts.MEDIA_METADATA_DIR)
     if not os.path.exists(get_cache_dir() + appconsts.GMIC_DIR):
         os.mkdir(get_cache_dir() + appconsts.GMIC_DIR)
     if not os.path.exists(get_cache_dir() + appconsts.MATCH_FRAME_DIR):